@@ -1,22 +1,34 @@
 import streamlit as st
+import csv
+import io
 import json
 from datetime import datetime
 import pandas as pd
 import report  # Thêm import này
+import db_metrics
+import single_flight
+import submission_spool
+# Tải song song các dữ liệu độc lập (xem db_async.py)
+from db_async import fetch_concurrently, get_all_questions_async, get_submission_statistics_async, get_user_submissions_async
 
 # Import từ các module khác
-from database_helper import get_all_questions, get_user_submissions, get_submission_statistics, check_answer_correctness
+from database_helper import get_all_questions, get_all_submissions, get_submission_statistics, iter_submissions
+from models import decode_answers, decode_correct, decode_json_object, normalize_question, question_result
 # Thêm các import từ report.py
 from report import get_download_link_docx, get_download_link_pdf, create_student_report_docx, create_student_report_pdf_fpdf
 # Import từ các module khác
-from database_helper import get_all_questions, get_user_submissions, get_submission_statistics
+from database_helper import get_all_questions, get_submission_statistics
 
 def admin_dashboard():
     """Bảng điều khiển quản trị viên"""
     st.title("Bảng điều khiển quản trị")
     
-    # Lấy dữ liệu thống kê
-    stats = get_submission_statistics()
+    # Lấy dữ liệu thống kê - các chỉ số đầu trang không cần responses
+    data = fetch_concurrently(
+        questions=get_all_questions_async(),
+        stats=get_submission_statistics_async(include_question_stats=False),
+    )
+    stats = data["stats"]
     
     if not stats:
         st.error("Không thể lấy dữ liệu thống kê. Vui lòng thử lại sau.")
@@ -24,13 +36,13 @@ def admin_dashboard():
     
     # Hiển thị các chỉ số quan trọng
     col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Tổng số câu hỏi", len(get_all_questions()))
+    col1.metric("Tổng số câu hỏi", len(data["questions"]))
     col2.metric("Tổng số bài nộp", stats["total_submissions"])
     col3.metric("Số học viên", stats["student_count"])
     col4.metric("Điểm trung bình", f"{stats['avg_score']:.1f}/{stats['total_possible_score']}")
     
     # Các tab chức năng
-    tab1, tab2, tab3 = st.tabs(["Tổng quan hệ thống", "Danh sách học viên", "Xuất dữ liệu"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Tổng quan hệ thống", "Danh sách học viên", "Xuất dữ liệu", "Hiệu năng database"])
     
     with tab1:
         system_overview()
@@ -40,14 +52,125 @@ def admin_dashboard():
     
     with tab3:
         export_data()
+    
+    with tab4:
+        database_metrics()
+
+def database_metrics():
+    """Số lần gọi / độ trễ database theo từng trang (xem db_metrics.py)"""
+    st.subheader("Hiệu năng truy cập database")
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        enabled = st.toggle("Đo truy cập database", value=db_metrics.is_enabled(),
+                            help="Áp dụng cho mọi phiên đang mở; có hiệu lực từ lần tải trang tiếp theo")
+        if enabled != db_metrics.is_enabled():
+            db_metrics.set_enabled(enabled)
+    with col2:
+        if st.button("Xóa số liệu đã ghi"):
+            db_metrics.reset()
+            single_flight.reset_stats()
+    
+    # Gộp truy vấn giống nhau giữa các phiên luôn được đếm, kể cả khi tắt đo
+    st.write("**Truy vấn đồng thời được gộp**")
+    flights = pd.DataFrame(single_flight.all_stats()).rename(columns={
+        "name": "Dữ liệu",
+        "calls": "Số lần gọi",
+        "executions": "Truy vấn thật",
+        "collapsed": "Được gộp",
+        "max_waiters": "Số phiên chờ tối đa",
+        "errors": "Lỗi",
+        "in_flight": "Đang chạy",
+    })
+    st.dataframe(flights, hide_index=True, use_container_width=True)
+    if not single_flight.is_enabled():
+        st.caption("Đang tắt gộp truy vấn (SINGLE_FLIGHT=0).")
+    
+    submission_spool_status()
+    
+    reruns = db_metrics.recent_reruns()
+    if not reruns:
+        if enabled:
+            st.info("Chưa có số liệu. Hãy dùng ứng dụng một lúc rồi quay lại trang này.")
+        else:
+            st.info("Đang tắt. Bật đo (hoặc đặt biến môi trường DB_METRICS=1) để bắt đầu ghi.")
+        return
+    
+    st.caption(f"Tổng hợp từ {len(reruns)} lần tải trang gần nhất (tối đa {db_metrics.RERUN_HISTORY}).")
+    
+    st.write("**Trang chờ database lâu nhất**")
+    pages = pd.DataFrame(db_metrics.page_summary(reruns))
+    pages = pages.rename(columns={
+        "page": "Trang",
+        "reruns": "Số lần tải",
+        "avg_calls": "Lần gọi TB",
+        "avg_rows": "Số dòng TB",
+        "avg_bytes": "Byte TB",
+        "avg_db_seconds": "Chờ DB TB (s)",
+        "max_db_seconds": "Chờ DB tối đa (s)",
+        "avg_wall_seconds": "Tổng thời gian TB (s)",
+    })
+    st.dataframe(pages, hide_index=True, use_container_width=True)
+    
+    st.write("**Hàm bị gọi lặp lại trong một lần tải trang (nghi N+1)**")
+    threshold = st.number_input("Ngưỡng số lần gọi / lần tải", min_value=2,
+                                value=db_metrics.N_PLUS_ONE_THRESHOLD, step=1)
+    offenders = db_metrics.repeated_calls(threshold, reruns)
+    if offenders:
+        offenders = pd.DataFrame(offenders).rename(columns={
+            "page": "Trang",
+            "function": "Hàm",
+            "reruns": "Số lần tải bị lặp",
+            "max_calls_per_rerun": "Số lần gọi tối đa",
+            "avg_calls_per_rerun": "Số lần gọi TB",
+            "avg_seconds_per_rerun": "Thời gian TB (s)",
+        })
+        st.dataframe(offenders, hide_index=True, use_container_width=True)
+    else:
+        st.success(f"Không có hàm nào bị gọi từ {threshold} lần trở lên trong một lần tải trang.")
+    
+    st.write("**Theo từng hàm**")
+    functions = pd.DataFrame(db_metrics.function_summary(reruns)).rename(columns={
+        "function": "Hàm",
+        "calls": "Số lần gọi",
+        "rows": "Số dòng",
+        "bytes": "Byte",
+        "seconds": "Tổng thời gian (s)",
+        "avg_ms": "TB / lần (ms)",
+    })
+    st.dataframe(functions, hide_index=True, use_container_width=True)
+
+def submission_spool_status():
+    """Số bài nộp đang chờ ghi vào database trong spool (xem submission_spool.py)"""
+    st.write("**Hàng đợi bài nộp (spool)**")
+    spool = submission_spool.get_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Đang chờ ghi", spool["pending"])
+    col2.metric("Đang chờ thử lại", spool["retrying"])
+    col3.metric("Bài chờ lâu nhất (s)", spool["oldest_age_seconds"])
+    col4.metric("Đã ghi (tiến trình này)", spool["written"])
+    if spool["last_error"]:
+        st.warning(f"Lỗi ghi gần nhất: {spool['last_error']}")
+    if spool["dead"]:
+        st.error(f"{spool['dead']} bài nộp ghi lỗi {submission_spool.SPOOL_MAX_ATTEMPTS} lần, đã ngừng ghi tự động "
+                 f"(vẫn nằm trong file spool {submission_spool.get_spool_path()}).")
+        if st.button("Ghi lại các bài nộp bị lỗi", key="requeue_dead_submissions"):
+            st.success(f"Đã đưa {submission_spool.requeue_dead()} bài nộp trở lại hàng chờ.")
+    if not submission_spool.is_enabled():
+        st.caption("Đang tắt spool (SUBMISSION_SPOOL=0): bài nộp được ghi trực tiếp vào database.")
 
 def system_overview():
     """Hiển thị tổng quan về hệ thống khảo sát"""
     st.subheader("Tổng quan hệ thống")
     
-    # Lấy dữ liệu
-    questions = get_all_questions()
-    stats = get_submission_statistics()
+    # Lấy dữ liệu (song song)
+    data = fetch_concurrently(
+        questions=get_all_questions_async(),
+        # Chỉ dùng số bài nộp và số bài theo ngày, không cần responses
+        stats=get_submission_statistics_async(include_question_stats=False),
+    )
+    questions = data["questions"]
+    stats = data["stats"]
     
     if not questions or not stats:
         st.warning("Không thể lấy đầy đủ dữ liệu hệ thống.")
@@ -114,11 +237,8 @@ def students_list():
     """Hiển thị danh sách học viên đã làm bài"""
     st.subheader("Danh sách học viên")
     
-    # Lấy dữ liệu từ Supabase
-    # Đây là hàm giả định - trong triển khai thực tế cần lấy dữ liệu từ table submissions
-    stats = get_submission_statistics()
-    
-    if not stats or stats["total_submissions"] == 0:
+    # Chỉ cần biết đã có bài nộp hay chưa - đếm trên database, không tải dữ liệu
+    if get_all_submissions(count_only=True) == 0:
         st.info("Chưa có học viên nào làm bài.")
         return
     
@@ -128,14 +248,17 @@ def students_list():
         search_button = st.form_submit_button("Tìm kiếm")
     
     if search_button and search_email:
-        # Tìm kiếm học viên cụ thể
-        student_submissions = get_user_submissions(search_email)
+        # Tìm kiếm học viên cụ thể; danh sách câu hỏi (để tính điểm tối đa) tải cùng lúc
+        data = fetch_concurrently(
+            student_submissions=get_user_submissions_async(search_email),
+            questions=get_all_questions_async(),
+        )
+        student_submissions = data["student_submissions"]
         
         if student_submissions:
             st.success(f"Đã tìm thấy {len(student_submissions)} bài làm của học viên {search_email}")
             
-            # Lấy danh sách câu hỏi để tính điểm tối đa
-            questions = get_all_questions()
+            questions = data["questions"]
             max_score = sum([q["score"] for q in questions])
             
             # Hiển thị thông tin tổng quan
@@ -186,26 +309,13 @@ def students_list():
                         q_id = str(q["id"])
                         
                         # Đảm bảo định dạng dữ liệu đúng
-                        if isinstance(q["answers"], str):
-                            try:
-                                q["answers"] = json.loads(q["answers"])
-                            except:
-                                q["answers"] = [q["answers"]]
-                        
-                        if isinstance(q["correct"], str):
-                            try:
-                                q["correct"] = json.loads(q["correct"])
-                            except:
-                                try:
-                                    q["correct"] = [int(x.strip()) for x in q["correct"].split(",")]
-                                except:
-                                    q["correct"] = []
+                        q = normalize_question(q)
                         
                         # Lấy câu trả lời của học viên
                         student_answers = s["responses"].get(q_id, [])
                         
-                        # Kiểm tra đáp án
-                        is_correct = check_answer_correctness(student_answers, q)
+                        # Kiểm tra đáp án (kết quả đã lưu lúc nộp bài nếu câu hỏi chưa sửa)
+                        is_correct = question_result(s, q, student_answers).correct
                         
                         # Hiển thị thông tin câu hỏi
                         st.write(f"**Câu {q['id']}:** {q['question']}")
@@ -235,7 +345,10 @@ def students_list():
     else:
         st.info("Nhập email học viên và nhấn Tìm kiếm để xem chi tiết.")
         
-        # Hiển thị số liệu tổng quan về học viên
+        # Hiển thị số liệu tổng quan về học viên (chỉ cần số đếm, không tải responses)
+        stats = get_submission_statistics(include_question_stats=False)
+        if not stats or not stats["student_count"]:
+            return
         st.write(f"**Tổng số học viên đã làm bài:** {stats['student_count']}")
         st.write(f"**Tổng số bài nộp:** {stats['total_submissions']}")
         st.write(f"**Trung bình số lần làm bài/học viên:** {stats['total_submissions'] / stats['student_count']:.1f}")
@@ -269,24 +382,8 @@ def export_questions():
     data = []
     for q in questions:
         # Đảm bảo định dạng dữ liệu đúng
-        if isinstance(q["answers"], str):
-            try:
-                answers = json.loads(q["answers"])
-            except:
-                answers = [q["answers"]]
-        else:
-            answers = q["answers"]
-        
-        if isinstance(q["correct"], str):
-            try:
-                correct = json.loads(q["correct"])
-            except:
-                try:
-                    correct = [int(x.strip()) for x in q["correct"].split(",")]
-                except:
-                    correct = []
-        else:
-            correct = q["correct"]
+        answers = decode_answers(q["answers"])
+        correct = decode_correct(q["correct"])
         
         # Chuyển đáp án và đáp án đúng thành chuỗi dễ đọc
         answers_str = ", ".join(answers)
@@ -322,20 +419,48 @@ def export_questions():
 
 def export_submissions():
     """Xuất dữ liệu bài nộp ra CSV"""
-    # Lấy dữ liệu bài nộp
-    # Đây là hàm giả định, cần truy vấn từ database
-    stats = get_submission_statistics()
+    # Đọc bài nộp theo trang và ghi thẳng ra CSV, không giữ danh sách bài nộp
+    # trong bộ nhớ (responses giữ nguyên dạng JSON như trong database)
+    columns = ["id", "user_email", "timestamp", "score", "responses"]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["ID", "Email", "Thời gian nộp", "Điểm", "Câu trả lời (JSON)"])
+    
+    preview = []
+    row_count = 0
+    try:
+        for s in iter_submissions(columns=columns, decode=False):
+            responses = s.get("responses")
+            if not isinstance(responses, str):
+                responses = json.dumps(responses or {}, ensure_ascii=False)
+            row = [s.get("id"), s.get("user_email"), s.get("timestamp"), s.get("score"), responses]
+            writer.writerow(row)
+            if len(preview) < 20:
+                preview.append(row)
+            row_count += 1
+    except Exception as e:
+        st.error(f"Lỗi khi xuất dữ liệu bài nộp: {e}")
+        return
     
-    if not stats or stats["total_submissions"] == 0:
+    if row_count == 0:
         st.info("Chưa có bài nộp nào trong hệ thống.")
         return
     
-    st.info("Tính năng xuất dữ liệu bài nộp đang được phát triển.")
-    st.info("Trong triển khai thực tế, tính năng này sẽ cho phép xuất toàn bộ dữ liệu bài nộp ra file CSV.")
+    # Hiển thị preview
+    st.write(f"### Xem trước dữ liệu ({len(preview)}/{row_count} bài nộp)")
+    st.dataframe(pd.DataFrame(preview, columns=["ID", "Email", "Thời gian nộp", "Điểm", "Câu trả lời (JSON)"]))
+    
+    file_name = f"danh_sach_bai_nop_{datetime.now().strftime('%Y%m%d')}.csv"
+    st.download_button(
+        label="Tải xuống CSV",
+        data=buffer.getvalue(),
+        file_name=file_name,
+        mime="text/csv",
+    )
 
 def export_statistics():
     """Xuất dữ liệu thống kê tổng hợp"""
-    stats = get_submission_statistics()
+    stats = get_submission_statistics(include_question_stats=False)
     
     if not stats:
         st.info("Chưa có dữ liệu thống kê.")
@@ -344,34 +469,6 @@ def export_statistics():
     st.info("Tính năng xuất thống kê tổng hợp đang được phát triển.")
     st.info("Trong triển khai thực tế, tính năng này sẽ cho phép xuất báo cáo tổng hợp bao gồm các biểu đồ và phân tích.")
 
-def check_answer_correctness(student_answers, question):
-    """Kiểm tra đáp án có đúng không, hỗ trợ chọn nhiều đáp án."""
-    # Nếu câu trả lời trống, không đúng
-    if not student_answers:
-        return False
-        
-    # Đối với câu hỏi combobox (chỉ chọn một)
-    if question["type"] == "Combobox":
-        # Nếu có một đáp án và đáp án đó ở vị trí nằm trong danh sách đáp án đúng
-        if len(student_answers) == 1:
-            answer_text = student_answers[0]
-            answer_index = question["answers"].index(answer_text) + 1 if answer_text in question["answers"] else -1
-            return answer_index in question["correct"]
-        return False
-    
-    # Đối với câu hỏi checkbox (nhiều lựa chọn)
-    elif question["type"] == "Checkbox":
-        # Tìm index (vị trí) của các đáp án học viên đã chọn
-        selected_indices = []
-        for ans in student_answers:
-            if ans in question["answers"]:
-                selected_indices.append(question["answers"].index(ans) + 1)
-        
-        # So sánh với danh sách đáp án đúng
-        return set(selected_indices) == set(question["correct"])
-    
-    return False
-
 def display_student_tab(submissions=None, students=None, questions=None, max_possible=0):
     """Hiển thị tab theo học viên"""
     if submissions is None:
@@ -472,12 +569,7 @@ def display_student_tab(submissions=None, students=None, questions=None, max_pos
                     student_detail_data = []
                     
                     # Đảm bảo responses đúng định dạng
-                    responses = submission.get("responses", {})
-                    if isinstance(responses, str):
-                        try:
-                            responses = json.loads(responses)
-                        except:
-                            responses = {}
+                    responses = decode_json_object(submission.get("responses"))
                     
                     # Hiển thị câu trả lời chi tiết
                     for q in questions:
@@ -487,8 +579,8 @@ def display_student_tab(submissions=None, students=None, questions=None, max_pos
                         # Đáp án người dùng
                         user_ans = responses.get(q_id, [])
                         
-                        # Kiểm tra đúng/sai
-                        is_correct = check_answer_correctness(user_ans, q)
+                        # Kiểm tra đúng/sai (kết quả đã lưu lúc nộp bài nếu câu hỏi chưa sửa)
+                        is_correct = question_result(submission, q, user_ans).correct
                         if is_correct:
                             total_correct += 1
                         
@@ -516,23 +608,8 @@ def display_student_tab(submissions=None, students=None, questions=None, max_pos
                         else:
                             # Đối với câu hỏi trắc nghiệm
                             # Chuẩn bị dữ liệu đáp án đúng
-                            q_correct = q.get("correct", [])
-                            q_answers = q.get("answers", [])
-                            
-                            if isinstance(q_correct, str):
-                                try:
-                                    q_correct = json.loads(q_correct)
-                                except:
-                                    try:
-                                        q_correct = [int(x.strip()) for x in q_correct.split(",")]
-                                    except:
-                                        q_correct = []
-                            
-                            if isinstance(q_answers, str):
-                                try:
-                                    q_answers = json.loads(q_answers)
-                                except:
-                                    q_answers = [q_answers]
+                            q_correct = decode_correct(q.get("correct"))
+                            q_answers = decode_answers(q.get("answers"))
                             
                             try:
                                 expected = [q_answers[i - 1] for i in q_correct]
@@ -14,8 +14,9 @@ except ImportError:
 from question_manager import manage_questions
 from surveyhandler import survey_form
 from stats_dashboard import stats_dashboard
-from admin_dashboard import admin_dashboard
-from database_helper import get_supabase_client, check_supabase_config, get_user
+from admin_dashboard import admin_dashboard, database_metrics
+import db_metrics
+from database_helper import get_supabase_client, check_supabase_config, get_user, reset_supabase_client, get_storage_backend, get_sqlite_path
 
 # Import với fallback cho create_user_if_not_exists
 try:
@@ -201,14 +202,19 @@ def main():
     # Sidebar - Menu điều hướng
     with st.sidebar:
         st.title("📝 Hệ thống kiểm tra học viên sau Đào tạo Đánh giá viên nội bộ ISO 50001:2018")
-        st.success("Đã kết nối thành công đến Supabase!")
-        
-        # Hiển thị thông tin dự án (ẩn key)
-        with st.expander("Thông tin kết nối"):
-            st.write(f"**URL:** {os.environ.get('SUPABASE_URL')}")
-            api_key = os.environ.get('SUPABASE_KEY', '')
-            masked_key = f"{api_key[:6]}...{api_key[-4:]}" if len(api_key) > 10 else "Chưa thiết lập"
-            st.write(f"**API Key:** {masked_key}")
+        if get_storage_backend() == "sqlite":
+            st.success("Đang dùng database SQLite cục bộ!")
+            with st.expander("Thông tin kết nối"):
+                st.write(f"**SQLite:** {get_sqlite_path()}")
+        else:
+            st.success("Đã kết nối thành công đến Supabase!")
+            
+            # Hiển thị thông tin dự án (ẩn key)
+            with st.expander("Thông tin kết nối"):
+                st.write(f"**URL:** {os.environ.get('SUPABASE_URL')}")
+                api_key = os.environ.get('SUPABASE_KEY', '')
+                masked_key = f"{api_key[:6]}...{api_key[-4:]}" if len(api_key) > 10 else "Chưa thiết lập"
+                st.write(f"**API Key:** {masked_key}")
         
         # Kiểm tra đăng nhập
         if "user_role" not in st.session_state:
@@ -332,6 +338,7 @@ def main():
     
     # Hiển thị nội dung tương ứng
     if "user_role" in st.session_state and st.session_state.user_role:
+        db_metrics.set_page(page)
         if st.session_state.user_role == "admin":
             if page == "Quản lý câu hỏi":
                 manage_questions()
@@ -339,6 +346,8 @@ def main():
                 stats_dashboard()
             elif page == "Quản trị hệ thống":
                 report.view_statistics()
+                with st.expander("⏱️ Hiệu năng truy cập database"):
+                    database_metrics()
         else:
             if page == "Làm bài khảo sát":
                 survey_form(
@@ -423,6 +432,8 @@ def setup_environment_variables():
                 else:
                     os.environ["SUPABASE_URL"] = supabase_url
                     os.environ["SUPABASE_KEY"] = supabase_key
+                    # Bỏ client cũ để lần kết nối sau dùng cấu hình mới
+                    reset_supabase_client()
                     st.success("Đã thiết lập biến môi trường thành công!")
                     st.button("Tiếp tục", on_click=lambda: st.rerun())
     
@@ -436,5 +447,13 @@ def setup_environment_variables():
         
         st.info("Sau khi thiết lập biến môi trường bằng một trong các phương pháp trên, hãy khởi động lại ứng dụng.")
 
+def run():
+    """Chạy một lần (rerun) của ứng dụng, ghi lại các truy cập database nếu đang đo"""
+    db_metrics.start_rerun()
+    try:
+        main()
+    finally:
+        db_metrics.finish_rerun()
+
 if __name__ == "__main__":
-    main()
+    run()
@@ -0,0 +1,42 @@
+"""Bổ sung bảng submission_answers cho các bài nộp cũ (sql/004_submission_answers.sql).
+
+Chạy một lần sau khi áp dụng migration 004, với cùng cấu hình kết nối như ứng
+dụng (SUPABASE_URL / SUPABASE_KEY, hoặc STORAGE_BACKEND=sqlite + SQLITE_PATH)::
+
+    python backfill_submission_answers.py
+    python backfill_submission_answers.py --batch-size 100
+
+Chỉ xử lý bài nộp chưa được đánh dấu ``answers_indexed`` nên có thể dừng và
+chạy lại bất cứ lúc nào. Khi không còn bài nộp nào chưa có dòng, thống kê theo
+câu hỏi chuyển sang view question_answer_stats.
+"""
+import argparse
+import sys
+import time
+
+from database_helper import ANSWERS_BACKFILL_BATCH_SIZE, backfill_submission_answers, check_supabase_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=ANSWERS_BACKFILL_BATCH_SIZE,
+                        help="Số bài nộp mỗi lần ghi")
+    args = parser.parse_args()
+
+    valid, message = check_supabase_config()
+    if not valid:
+        raise SystemExit(message)
+
+    start = time.perf_counter()
+
+    def progress(processed, total):
+        print(f"{processed}/{total} bài nộp ({time.perf_counter() - start:.1f}s)", flush=True)
+
+    result = backfill_submission_answers(batch_size=args.batch_size, progress=progress)
+    if result is None:
+        sys.exit(1)
+    print(f"Xong: {result['scanned']} bài nộp, {result['answers']} dòng submission_answers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Số lệnh ghi database của việc lưu nháp: ghi ngay mỗi lần lưu so với write-behind (drafts.py).
+
+Mô phỏng --students học viên làm bài --questions câu, mỗi học viên lưu nháp
+sau mỗi --answers-per-save câu trả lời (trong giờ thi thật: mỗi lần chuyển
+trang / bấm "Lưu nháp"), các học viên lưu xen kẽ nhau trong --duration giây.
+Database là SQLite tạm (synthetic_data.py).
+
+- direct: mỗi lần lưu gọi write_submission_drafts với một bản nháp
+- write_behind: drafts.save_draft, luồng nền ghi theo lô mỗi --flush-interval giây
+
+In số lần lưu, số lệnh ghi database, số bản nháp đã ghi, thời gian phía phiên
+(tổng thời gian các lần gọi lưu) và kiểm tra bản nháp cuối cùng trong database
+khớp với câu trả lời cuối của mỗi học viên.
+
+Cách chạy::
+
+    python benchmarks/bench_draft_autosave.py --students 500 --questions 40 --duration 10
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from synthetic_data import make_questions  # noqa: E402
+
+
+def make_saves(args):
+    """Các lần lưu theo thứ tự thời gian: (thời điểm, email, câu trả lời đến lúc đó)"""
+    rng = random.Random(args.seed)
+    questions = make_questions(args.questions, rng)
+    saves = []
+    for student in range(args.students):
+        email = f"draft{student}@example.com"
+        answers = {}
+        for index, q in enumerate(questions, start=1):
+            answers[str(q["id"])] = [rng.choice(q["answers"])] if q["answers"] else ["Trả lời tự luận"]
+            if index % args.answers_per_save == 0 or index == len(questions):
+                saves.append((rng.uniform(0, args.duration) * index / len(questions), email, dict(answers)))
+    saves.sort(key=lambda save: save[0])
+    return saves
+
+
+def run(saves, save, args):
+    start = time.perf_counter()
+    session_seconds = 0.0
+    for at, email, answers in saves:
+        delay = at - (time.perf_counter() - start)
+        if delay > 0:
+            time.sleep(delay)
+        call_start = time.perf_counter()
+        save(email, answers)
+        session_seconds += time.perf_counter() - call_start
+    return session_seconds
+
+
+def measure(database_helper, mode, saves, args):
+    import drafts
+
+    calls = {"count": 0}
+    write = database_helper.write_submission_drafts
+
+    def counted_write(*a, **kw):
+        calls["count"] += 1
+        return write(*a, **kw)
+
+    database_helper.write_submission_drafts = counted_write
+    try:
+        if mode == "direct":
+            session_seconds = run(saves, lambda email, answers: counted_write(
+                [{"user_email": email, "attempt_index": 1, "page": 0, "responses": answers}]), args)
+        else:
+            drafts.reset_stats()
+            session_seconds = run(saves, lambda email, answers: drafts.save_draft(email, 1, answers), args)
+            drafts.flush()
+    finally:
+        database_helper.write_submission_drafts = write
+
+    final = {}
+    for _, email, answers in saves:
+        final[email] = answers
+    matches = sum(1 for email, answers in final.items()
+                  if (database_helper.get_submission_draft(email) or {}).get("responses") == answers)
+    result = {
+        "saves": len(saves),
+        "db_writes": calls["count"],
+        "session_ms_total": round(session_seconds * 1000, 1),
+        "final_drafts_match": f"{matches}/{len(final)}",
+    }
+    if mode == "write_behind":
+        result["stats"] = drafts.get_stats()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--answers-per-save", type=int, default=5)
+    parser.add_argument("--duration", type=float, default=10.0, help="Thời gian làm bài mô phỏng (giây)")
+    parser.add_argument("--flush-interval", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=50001)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_drafts_")
+    try:
+        os.environ["STORAGE_BACKEND"] = "sqlite"
+        os.environ["DRAFT_FLUSH_INTERVAL"] = str(args.flush_interval)
+        import database_helper
+
+        saves = make_saves(args)
+        output = {"students": args.students, "questions": args.questions,
+                  "flush_interval": args.flush_interval, "results": {}}
+        for mode in ("direct", "write_behind"):
+            database_helper.reset_supabase_client()
+            os.environ["SQLITE_PATH"] = os.path.join(workdir, f"{mode}.db")
+            output["results"][mode] = measure(database_helper, mode, saves, args)
+        database_helper.reset_supabase_client()
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Benchmark đầu-cuối các đường xử lý nặng trên dữ liệu giả lập.
+
+Sinh câu hỏi/học viên/bài nộp (synthetic_data.py), nạp vào database SQLite
+tạm (STORAGE_BACKEND=sqlite) rồi đo thời gian qua đúng code của ứng dụng:
+
+- calculate_score: chấm lại mọi bài nộp
+- get_submission_statistics: qua view thống kê và tổng hợp phía ứng dụng
+- backfill_submission_answers / get_submission_statistics_answers_table: ghi
+  bảng submission_answers cho dữ liệu đã nạp, rồi thống kê theo câu hỏi từ bảng đó
+- report_load / report_submissions_dataframe: phần chuẩn bị dữ liệu của
+  report.view_statistics (tải dữ liệu, dựng bảng tất cả bài nộp)
+- export_to_excel, dataframe_to_pdf_reportlab, create_student_report_docx
+
+Kết quả in ra dạng JSON (ghi thêm vào --output nếu có). Truyền --baseline là
+file kết quả của lần chạy trước để xem thay đổi (%) của từng mục.
+
+Cách chạy::
+
+    python benchmarks/bench_end_to_end.py --students 2000 --questions 100 --output e2e.json
+    python benchmarks/bench_end_to_end.py --students 2000 --questions 100 --baseline e2e.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from synthetic_data import make_dataset, parse_mix, seed_database  # noqa: E402
+
+
+def measure(results, name, func, repeat, **extra):
+    """Chạy func repeat lần, lưu thời gian (giây) vào results[name], trả về kết quả lần cuối"""
+    runs = []
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        runs.append(time.perf_counter() - start)
+    results[name] = dict(
+        median_seconds=round(statistics.median(runs), 4),
+        min_seconds=round(min(runs), 4),
+        runs=len(runs),
+        **extra,
+    )
+    return value
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare_with_baseline(results, baseline_path):
+    """Thêm thời gian của lần chạy trước và % thay đổi (dương = chậm hơn)"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f).get("results", {})
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get("median_seconds"):
+            continue
+        result["baseline_median_seconds"] = previous["median_seconds"]
+        result["change_percent"] = round((result["median_seconds"] / previous["median_seconds"] - 1) * 100, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--attempts", type=int, default=3)
+    parser.add_argument("--mix", default="Checkbox=2,Combobox=2,Essay=1")
+    parser.add_argument("--seed", type=int, default=50001)
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần đo mỗi mục (lấy trung vị)")
+    parser.add_argument("--pdf-rows", type=int, default=200, help="Số dòng đầu của bảng bài nộp khi xuất PDF")
+    parser.add_argument("--reports", type=int, default=10, help="Số báo cáo DOCX từng học viên")
+    parser.add_argument("--output", help="Ghi kết quả JSON vào file này")
+    parser.add_argument("--baseline", help="File kết quả lần chạy trước để so sánh")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = os.path.join(workdir, "bench.db")
+
+    import database_helper
+    import report
+
+    try:
+        output = run(args, database_helper, report)
+    finally:
+        database_helper.reset_supabase_client()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(output, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+def run(args, database_helper, report):
+    """Sinh và nạp dữ liệu, đo từng mục; trả về dict kết quả (meta + results)"""
+    start = time.perf_counter()
+    questions, users, submissions = make_dataset(args.students, args.questions, args.attempts,
+                                                 args.seed, parse_mix(args.mix))
+    seed_database(database_helper.get_supabase_client(), questions, users, submissions)
+    setup_seconds = time.perf_counter() - start
+
+    results = {}
+    repeat = args.repeat
+
+    catalog = database_helper.get_all_questions()
+    decoded = [json.loads(s["responses"]) for s in submissions]
+    measure(results, "calculate_score",
+            lambda: [database_helper.calculate_score(r, catalog) for r in decoded],
+            repeat, rows=len(decoded))
+
+    measure(results, "get_submission_statistics", database_helper.get_submission_statistics, repeat)
+
+    def app_side_statistics():
+        database_helper._statistics_views["available"] = False
+        try:
+            return database_helper.get_submission_statistics()
+        finally:
+            database_helper._statistics_views["available"] = True
+
+    measure(results, "get_submission_statistics_app_side", app_side_statistics, repeat)
+
+    # Dữ liệu nạp thẳng vào bảng nên chưa có submission_answers: bổ sung một lần
+    backfill = measure(results, "backfill_submission_answers", database_helper.backfill_submission_answers, 1)
+    results["backfill_submission_answers"]["answers"] = backfill["answers"]
+    measure(results, "get_submission_statistics_answers_table", database_helper.get_submission_statistics, repeat)
+
+    def report_load():
+        return (
+            database_helper.get_all_questions(),
+            database_helper.get_all_students(),
+            database_helper.get_all_submissions(columns=database_helper.SUBMISSION_REPORT_COLUMNS),
+        )
+
+    report_questions, students, report_submissions = measure(results, "report_load", report_load, repeat)
+    max_possible = sum(q.get("score", 0) for q in report_questions)
+    df_all_submissions = measure(
+        results, "report_submissions_dataframe",
+        lambda: report.build_submissions_dataframe(report_submissions, students, report_questions, max_possible),
+        repeat, rows=len(report_submissions),
+    )
+
+    measure(results, "export_to_excel",
+            lambda: report.export_to_excel([df_all_submissions], ["Tất cả bài nộp"], "bench.xlsx",
+                                           include_summary=True, questions=report_questions,
+                                           submissions=report_submissions),
+            repeat, rows=len(df_all_submissions))
+
+    pdf_frame = df_all_submissions.head(args.pdf_rows)
+    measure(results, "dataframe_to_pdf_reportlab",
+            lambda: report.dataframe_to_pdf_reportlab(pdf_frame, "Báo cáo tất cả bài nộp", "bench.pdf"),
+            repeat, rows=len(pdf_frame))
+
+    students_by_email = {s["email"]: s for s in students}
+    sample = report_submissions[:args.reports]
+
+    def student_reports():
+        for submission in sample:
+            student = students_by_email.get(submission["user_email"], {})
+            report.create_student_report_docx(student.get("full_name", ""), submission["user_email"],
+                                              student.get("class", ""), submission, report_questions, max_possible)
+
+    measure(results, "create_student_report_docx", student_reports, repeat, reports=len(sample))
+
+    if args.baseline:
+        compare_with_baseline(results, args.baseline)
+
+    return {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "students": args.students,
+            "questions": args.questions,
+            "attempts": args.attempts,
+            "submissions": len(submissions),
+            "mix": args.mix,
+            "seed": args.seed,
+            "repeat": repeat,
+            "setup_seconds": round(setup_seconds, 2),
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Microbenchmark chấm điểm: cách cũ (answers.index + set) vs khóa đáp án biên dịch.
+
+Sinh ngẫu nhiên một bộ câu hỏi (Checkbox/Combobox/Essay) và các bài làm,
+kiểm tra các cách cho cùng kết quả rồi đo thời gian chấm cả lớp:
+
+- legacy: vòng lặp cũ với answers.index + set
+- compiled: score_responses với khóa đáp án biên dịch
+- cohort: mã hóa cả lớp thành ma trận NumPy rồi chấm (grade_cohort)
+- regrade: chấm lại ma trận đã mã hóa sau khi sửa đáp án đúng (grade_matrix)
+
+Cách chạy::
+
+    python benchmarks/bench_grading.py --students 5000 --questions 100
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from grading import compile_answer_keys, encode_responses, grade_matrix, score_responses  # noqa: E402
+from synthetic_data import make_questions, make_responses  # noqa: E402
+
+
+def legacy_check_answer_correctness(student_answers, question):
+    """Bản sao hàm chấm trước khi có khóa đáp án biên dịch (để so sánh)"""
+    if not student_answers:
+        return False
+
+    q_type = question.get("type")
+
+    if q_type == "Essay":
+        return bool(student_answers) and isinstance(student_answers[0], str) and student_answers[0].strip() != ""
+
+    if q_type == "Combobox":
+        if len(student_answers) == 1:
+            answer_text = student_answers[0]
+            answers = question.get("answers", [])
+            correct = question.get("correct", [])
+            answer_index = answers.index(answer_text) + 1 if answer_text in answers else -1
+            return answer_index in correct
+        return False
+
+    if q_type == "Checkbox":
+        answers = question.get("answers", [])
+        correct = set(question.get("correct", []))
+        selected_indices = []
+        for ans in student_answers:
+            if ans in answers:
+                selected_indices.append(answers.index(ans) + 1)
+        return set(selected_indices) == correct
+
+    return False
+
+
+def legacy_calculate_score(responses, questions):
+    total_score = 0
+    for q in questions:
+        if legacy_check_answer_correctness(responses.get(str(q["id"]), []), q):
+            total_score += q["score"]
+    return total_score
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=50001)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    questions = make_questions(args.questions, rng)
+    cohort = make_responses(questions, args.students, rng)
+
+    start = time.perf_counter()
+    legacy_scores = [legacy_calculate_score(r, questions) for r in cohort]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    answer_keys = compile_answer_keys(questions)
+    compiled_scores = [score_responses(r, answer_keys) for r in cohort]
+    compiled_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matrix = encode_responses(cohort, questions)
+    cohort_scores = grade_matrix(matrix).scores.tolist()
+    cohort_seconds = time.perf_counter() - start
+
+    # Sửa đáp án đúng (giữ nguyên danh sách đáp án) rồi chấm lại
+    fixed_questions = [dict(q, correct=q["correct"][:1]) for q in questions]
+    start = time.perf_counter()
+    regrade_scores = grade_matrix(matrix, fixed_questions).scores.tolist()
+    regrade_seconds = time.perf_counter() - start
+
+    if legacy_scores != compiled_scores or legacy_scores != cohort_scores:
+        raise SystemExit("Kết quả chấm khác nhau giữa các cách!")
+    if regrade_scores != [legacy_calculate_score(r, fixed_questions) for r in cohort]:
+        raise SystemExit("Kết quả chấm lại khác cách cũ!")
+
+    print(json.dumps({
+        "students": args.students,
+        "questions": args.questions,
+        "legacy_seconds": round(legacy_seconds, 4),
+        "compiled_seconds": round(compiled_seconds, 4),
+        "speedup": round(legacy_seconds / compiled_seconds, 2),
+        "cohort_seconds": round(cohort_seconds, 4),
+        "regrade_seconds": round(regrade_seconds, 4),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
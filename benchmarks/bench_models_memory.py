@@ -0,0 +1,132 @@
+"""Bộ nhớ của danh sách bài nộp: dict đã giải mã (trước đây) so với models.Submission.
+
+Sinh --submissions bài nộp (synthetic_data.py) và chia thành các trang JSON
+như dữ liệu PostgREST trả về cho iter_submissions. Với mỗi cách biểu diễn,
+script giải mã lại các trang rồi đo bằng tracemalloc phần bộ nhớ còn giữ sau
+khi dựng xong danh sách (chia cho số bài nộp), kèm thời gian dựng:
+
+- dict_decoded_responses: dict của dòng, responses đã json.loads (cách cũ của
+  iter_submissions / get_all_submissions)
+- dict_raw: dict của dòng, không giải mã gì (iter_submissions(decode=False))
+- submission_lazy: models.Submission, chưa đọc cột JSON nào
+- submission_read_responses: models.Submission sau khi mọi bài đã đọc responses
+- submission_read_all_json: models.Submission sau khi đọc cả responses,
+  essay_grades, essay_comments
+
+Cách chạy::
+
+    python benchmarks/bench_models_memory.py --submissions 100000 --questions 30
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from synthetic_data import make_questions, make_submissions  # noqa: E402
+
+
+def make_pages(args):
+    """Các trang JSON (bytes) của bảng submissions, mỗi trang --page-size dòng"""
+    rng = random.Random(args.seed)
+    questions = make_questions(args.questions, rng)
+    rows = make_submissions(questions, args.submissions, 1, rng)
+    return [json.dumps(rows[start:start + args.page_size], ensure_ascii=False).encode("utf-8")
+            for start in range(0, len(rows), args.page_size)]
+
+
+def build_dict_decoded(pages):
+    from models import decode_json_object
+
+    result = []
+    for page in pages:
+        for row in json.loads(page):
+            row["responses"] = decode_json_object(row["responses"])
+            result.append(row)
+    return result
+
+
+def build_dict_raw(pages):
+    result = []
+    for page in pages:
+        result.extend(json.loads(page))
+    return result
+
+
+def build_submissions(pages, read=()):
+    from models import Submission
+
+    result = []
+    for page in pages:
+        for row in json.loads(page):
+            submission = Submission.from_row(row)
+            for field in read:
+                submission[field]
+            result.append(submission)
+    return result
+
+
+MODES = {
+    "dict_decoded_responses": build_dict_decoded,
+    "dict_raw": build_dict_raw,
+    "submission_lazy": build_submissions,
+    "submission_read_responses": lambda pages: build_submissions(pages, read=("responses",)),
+    "submission_read_all_json": lambda pages: build_submissions(
+        pages, read=("responses", "essay_grades", "essay_comments")),
+}
+
+
+def measure(build, pages, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = build(pages)
+    seconds = time.perf_counter() - start
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    assert len(result) == count
+    del result
+    return {
+        "bytes_per_row": round(retained / count),
+        "total_mb": round(retained / 1024 / 1024, 1),
+        "build_seconds_traced": round(seconds, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=100000)
+    parser.add_argument("--questions", type=int, default=30)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=50001)
+    parser.add_argument("--modes", default=",".join(MODES), help="Các cách biểu diễn cần đo, cách nhau bởi dấu phẩy")
+    args = parser.parse_args()
+
+    pages = make_pages(args)
+    output = {
+        "submissions": args.submissions,
+        "questions": args.questions,
+        "payload_mb": round(sum(len(page) for page in pages) / 1024 / 1024, 1),
+        "results": {},
+    }
+    for name in args.modes.split(","):
+        output["results"][name] = measure(MODES[name], pages, args.submissions)
+
+    baseline = output["results"].get("dict_decoded_responses")
+    if baseline:
+        for result in output["results"].values():
+            result["vs_dict_decoded"] = round(result["bytes_per_row"] / baseline["bytes_per_row"], 3)
+
+    print(json.dumps(output, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
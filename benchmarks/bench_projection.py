@@ -0,0 +1,79 @@
+"""Đo kích thước dữ liệu trả về: select("*") vs chỉ lấy các cột cần dùng.
+
+Sinh ngẫu nhiên câu hỏi, học viên và bài nộp (kèm essay_grades/essay_comments),
+rồi tính số byte JSON mà PostgREST trả về cho từng màn hình theo hai cách:
+
+- chỉ số đầu trang của admin_dashboard (số bài, số học viên, điểm trung bình)
+- kiểm tra số lần làm bài trong surveyhandler (đếm so với tải mọi bài nộp)
+- tổng quan báo cáo (bài nộp + danh sách học viên)
+
+Cách chạy::
+
+    python benchmarks/bench_projection.py --students 500 --attempts 3 --questions 60
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from synthetic_data import make_questions, make_submissions, make_users  # noqa: E402
+
+
+def payload_bytes(rows, columns="*"):
+    """Số byte JSON (UTF-8) của phản hồi PostgREST với tập cột đã cho"""
+    if columns != "*":
+        rows = [{c: row.get(c) for c in columns} for row in rows]
+    return len(json.dumps(rows, ensure_ascii=False).encode("utf-8"))
+
+
+def _row(screen, before, after):
+    return {
+        "screen": screen,
+        "select_all_bytes": before,
+        "projected_bytes": after,
+        "reduction_percent": round((1 - after / before) * 100, 1) if before else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--attempts", type=int, default=3)
+    parser.add_argument("--questions", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=50001)
+    args = parser.parse_args()
+
+    from database_helper import SUBMISSION_REPORT_COLUMNS, USER_LIST_COLUMNS
+
+    rng = random.Random(args.seed)
+    questions = make_questions(args.questions, rng)
+    submissions = make_submissions(questions, args.students, args.attempts, rng)
+    users = make_users(args.students)
+    one_student = [s for s in submissions if s["user_email"] == "hocvien1@example.com"]
+
+    results = [
+        _row("admin_dashboard: chỉ số đầu trang",
+             payload_bytes(submissions),
+             payload_bytes(submissions, ("user_email", "score", "timestamp", "id"))),
+        # count=exact với limit(1): chỉ một dòng {"id": ...}, tổng số nằm trong header
+        _row("surveyhandler: kiểm tra số lần làm bài",
+             payload_bytes(one_student),
+             payload_bytes(one_student[:1], ("id",))),
+        _row("report: tổng quan (bài nộp + học viên)",
+             payload_bytes(submissions) + payload_bytes(users),
+             payload_bytes(submissions, SUBMISSION_REPORT_COLUMNS) + payload_bytes(users, USER_LIST_COLUMNS)),
+    ]
+
+    print(json.dumps({
+        "students": args.students,
+        "submissions": len(submissions),
+        "questions": args.questions,
+        "results": results,
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
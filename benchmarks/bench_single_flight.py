@@ -0,0 +1,137 @@
+"""Mô phỏng đầu giờ thi: nhiều phiên cùng tải câu hỏi và danh sách học viên.
+
+Mỗi phiên Streamlit là một luồng. Script tạo --sessions luồng, cho tất cả bắt
+đầu cùng lúc (bộ đệm câu hỏi vừa bị bỏ, giống lúc vừa sửa đề hoặc vừa khởi
+động) và gọi get_all_questions + get_all_students qua đúng code của
+database_helper. Database là SQLite tạm (synthetic_data.py) bọc thêm độ trễ
+--latency-ms cho mỗi truy vấn để giống một backend ở xa.
+
+Chạy hai lần - có và không gộp truy vấn (single_flight.py) - rồi in số truy
+vấn thật đã gửi, số lần gọi được gộp, thời gian chờ của từng phiên, và kiểm
+tra mọi phiên nhận cùng dữ liệu.
+
+Cách chạy::
+
+    python benchmarks/bench_single_flight.py --sessions 300 --latency-ms 80
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from synthetic_data import make_dataset, seed_database  # noqa: E402
+
+
+def make_slow_client(path, latency):
+    """SqliteClient chậm đi latency giây mỗi truy vấn, đếm số truy vấn đã chạy"""
+    from sqlite_backend import SqliteClient
+
+    class SlowClient(SqliteClient):
+        def __init__(self, path):
+            super().__init__(path)
+            self.requests = 0
+            self._requests_lock = threading.Lock()
+
+        def run(self, request):
+            with self._requests_lock:
+                self.requests += 1
+            time.sleep(latency)
+            return super().run(request)
+
+    return SlowClient(path)
+
+
+def run_wave(database_helper, sessions):
+    """Mọi phiên cùng bắt đầu; trả về (thời gian chờ từng phiên, kết quả từng phiên)"""
+    barrier = threading.Barrier(sessions + 1)
+    waits = [None] * sessions
+    results = [None] * sessions
+
+    def session(index):
+        barrier.wait()
+        start = time.perf_counter()
+        questions = database_helper.get_all_questions()
+        students = database_helper.get_all_students()
+        waits[index] = time.perf_counter() - start
+        results[index] = ([q["id"] for q in questions], sorted(s["email"] for s in students))
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    database_helper.invalidate_question_cache()
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    return waits, results
+
+
+def measure(database_helper, single_flight, client, args, enabled):
+    single_flight.set_enabled(enabled)
+    single_flight.reset_stats()
+    client.requests = 0
+    waits = []
+    consistent = True
+    for _ in range(args.waves):
+        wave_waits, results = run_wave(database_helper, args.sessions)
+        waits.extend(wave_waits)
+        consistent = consistent and all(result == results[0] for result in results) and bool(results[0][0])
+    waits.sort()
+    return {
+        "backend_requests": client.requests,
+        "requests_per_wave": client.requests / args.waves,
+        "collapsed": {s["name"]: s["collapsed"] for s in single_flight.all_stats()},
+        "median_wait_seconds": round(statistics.median(waits), 4),
+        "p95_wait_seconds": round(waits[int(len(waits) * 0.95) - 1], 4),
+        "max_wait_seconds": round(waits[-1], 4),
+        "consistent_results": consistent,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200, help="Số phiên đồng thời")
+    parser.add_argument("--waves", type=int, default=3, help="Số đợt đăng nhập đồng loạt")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Độ trễ thêm cho mỗi truy vấn")
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=50001)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_single_flight_")
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = os.path.join(workdir, "bench.db")
+
+    import database_helper
+    import single_flight
+
+    client = make_slow_client(os.environ["SQLITE_PATH"], args.latency_ms / 1000)
+    try:
+        questions, users, _ = make_dataset(args.students, args.questions, 0, args.seed)
+        seed_database(client, questions, users, [])
+        # Mọi phiên dùng client chậm thay cho client của backend
+        database_helper.get_supabase_client = lambda: client
+
+        output = {
+            "sessions": args.sessions,
+            "waves": args.waves,
+            "latency_ms": args.latency_ms,
+            "without_single_flight": measure(database_helper, single_flight, client, args, False),
+            "with_single_flight": measure(database_helper, single_flight, client, args, True),
+        }
+    finally:
+        client.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(output, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Thống kê bài nộp: tổng hợp phía ứng dụng vs view thống kê trên database.
+
+Dùng SQLite trong bộ nhớ làm database thay thế (sql/sqlite/*.sql): nạp dữ
+liệu ngẫu nhiên, so sánh kết quả của ``aggregate_submission_statistics`` (tải
+mọi bài nộp về rồi tổng hợp) với các view ``submission_summary``,
+``submission_daily_counts``, ``question_correct_stats`` (chỉ tải dòng tổng hợp),
+rồi in thời gian và số byte phải truyền của hai cách.
+
+Cách chạy::
+
+    python benchmarks/bench_statistics_views.py --students 2000 --attempts 3 --questions 60
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from synthetic_data import make_questions, make_submissions  # noqa: E402
+from submission_stats import aggregate_submission_statistics, statistics_from_aggregates  # noqa: E402
+
+# Dữ liệu lệch chuẩn mà bộ chấm phải xử lý giống nhau ở cả hai phía
+EDGE_RESPONSES = [
+    "không phải JSON",
+    json.dumps([1, 2, 3]),
+    json.dumps({"1": None}),
+    json.dumps({"1": []}),
+    json.dumps({"2": ["   "]}),
+    json.dumps({"1": ["đáp án không có trong danh sách"]}),
+]
+
+
+def load_database(questions, submissions):
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    for name in ("001_schema.sql", "002_submission_statistics_views.sql"):
+        with open(os.path.join(ROOT, "sql", "sqlite", name), encoding="utf-8") as f:
+            conn.executescript(f.read())
+    conn.executemany(
+        "INSERT INTO questions (id, question, type, answers, correct, score) VALUES (?, ?, ?, ?, ?, ?)",
+        [(q["id"], q["question"], q["type"], json.dumps(q["answers"], ensure_ascii=False),
+          json.dumps(q["correct"]), q["score"]) for q in questions],
+    )
+    conn.executemany(
+        "INSERT INTO submissions (id, user_email, responses, score, timestamp, essay_grades, essay_comments) "
+        "VALUES (:id, :user_email, :responses, :score, :timestamp, :essay_grades, :essay_comments)",
+        submissions,
+    )
+    return conn
+
+
+def rows(conn, sql):
+    return [dict(row) for row in conn.execute(sql)]
+
+
+def same_statistics(left, right):
+    if left.keys() != right.keys():
+        return False
+    for key, value in left.items():
+        other = right[key]
+        if isinstance(value, float) or isinstance(other, float):
+            if not math.isclose(value, other, rel_tol=1e-9, abs_tol=1e-9):
+                return False
+        elif isinstance(value, dict):
+            if value.keys() != other.keys() or any(
+                not same_statistics(v, other[k]) if isinstance(v, dict) else v != other[k]
+                for k, v in value.items()
+            ):
+                return False
+        elif value != other:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--attempts", type=int, default=3)
+    parser.add_argument("--questions", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=50001)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    questions = make_questions(args.questions, rng)
+    submissions = make_submissions(questions, args.students, args.attempts, rng)
+    for responses in EDGE_RESPONSES:
+        edge = dict(submissions[0], id=len(submissions) + 1, responses=responses)
+        submissions.append(edge)
+    conn = load_database(questions, submissions)
+
+    start = time.perf_counter()
+    fetched = rows(conn, "SELECT user_email, score, timestamp, responses FROM submissions")
+    app_side = aggregate_submission_statistics(fetched, questions)
+    app_seconds = time.perf_counter() - start
+    app_bytes = len(json.dumps(fetched, ensure_ascii=False).encode("utf-8"))
+
+    start = time.perf_counter()
+    summary = rows(conn, "SELECT * FROM submission_summary")
+    daily_rows = rows(conn, "SELECT day, submission_count FROM submission_daily_counts")
+    question_rows = rows(conn, "SELECT * FROM question_correct_stats")
+    db_side = statistics_from_aggregates(questions, summary[0], daily_rows, question_rows)
+    db_seconds = time.perf_counter() - start
+    db_bytes = len(json.dumps([summary, daily_rows, question_rows], ensure_ascii=False).encode("utf-8"))
+
+    if not same_statistics(app_side, db_side):
+        raise SystemExit("Kết quả thống kê khác nhau giữa hai cách!")
+
+    print(json.dumps({
+        "submissions": len(submissions),
+        "questions": args.questions,
+        "app_side_seconds": round(app_seconds, 4),
+        "app_side_bytes": app_bytes,
+        "views_seconds": round(db_seconds, 4),
+        "views_bytes": db_bytes,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Cuối giờ thi: nhiều học viên nộp bài cùng lúc khi backend chậm - ghi trực tiếp so với spool.
+
+--students luồng (mỗi luồng một phiên) cùng nộp bài một lúc. Database là
+SQLite tạm (synthetic_data.py) bọc thêm độ trễ --latency-ms cho mỗi truy vấn
+(make_slow_client của bench_single_flight.py); --outage-seconds đầu tiên mọi
+truy vấn ghi đều lỗi như backend tạm thời không truy cập được.
+
+- direct: save_submission (học viên chờ database ghi xong; lỗi => phải nộp lại)
+- spool: submission_spool.enqueue_submission (ghi xuống file spool rồi xác
+  nhận ngay), luồng nền ghi theo lô có thử lại
+
+In thời gian chờ xác nhận của học viên (trung vị / p95 / tối đa), số bài bị
+lỗi khi nộp, số lệnh INSERT đã gửi, thời gian đến khi mọi bài đã vào database
+và kiểm tra số bài trong database.
+
+Cách chạy::
+
+    python benchmarks/bench_submission_spool.py --students 300 --latency-ms 80 --outage-seconds 3
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from bench_single_flight import make_slow_client  # noqa: E402
+from synthetic_data import make_dataset, make_submissions, seed_database  # noqa: E402
+
+
+def run_close_out(submit, responses):
+    """Mọi học viên cùng nộp; trả về (thời gian chờ từng học viên, số bài lỗi)"""
+    barrier = threading.Barrier(len(responses) + 1)
+    waits = [None] * len(responses)
+    failed = [False] * len(responses)
+
+    def student(index):
+        barrier.wait()
+        start = time.perf_counter()
+        failed[index] = submit(f"close{index}@example.com", responses[index]) is None
+        waits[index] = time.perf_counter() - start
+
+    threads = [threading.Thread(target=student, args=(i,)) for i in range(len(responses))]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    return waits, sum(failed)
+
+
+def measure(mode, args, workdir, questions, users, responses):
+    import database_helper
+    import submission_spool
+
+    path = os.path.join(workdir, f"{mode}.db")
+    client = make_slow_client(path, args.latency_ms / 1000)
+    seed_database(client, questions, users, [])
+    database_helper.get_supabase_client = lambda: client
+    database_helper.invalidate_question_cache()
+    database_helper.get_all_questions()
+
+    inserts = {"count": 0}
+    outage_until = time.monotonic() + args.outage_seconds
+    real_insert = database_helper.insert_submissions
+
+    def insert_submissions(submissions, questions=None):
+        inserts["count"] += 1
+        if time.monotonic() < outage_until:
+            time.sleep(args.latency_ms / 1000)
+            raise ConnectionError("backend tạm thời không truy cập được")
+        return real_insert(submissions, questions)
+
+    database_helper.insert_submissions = insert_submissions
+    try:
+        start = time.perf_counter()
+        if mode == "spool":
+            os.environ["SUBMISSION_SPOOL_PATH"] = os.path.join(workdir, "spool.db")
+            submission_spool.set_enabled(True)
+            waits, failed = run_close_out(submission_spool.enqueue_submission, responses)
+            while submission_spool.get_stats()["pending"]:
+                time.sleep(0.05)
+        else:
+            waits, failed = run_close_out(database_helper.save_submission, responses)
+        drained = time.perf_counter() - start
+        stored = client.table("submissions").select("id", count="exact").execute().count
+    finally:
+        database_helper.insert_submissions = real_insert
+        client.close()
+
+    waits.sort()
+    return {
+        "median_ack_seconds": round(statistics.median(waits), 4),
+        "p95_ack_seconds": round(waits[int(len(waits) * 0.95) - 1], 4),
+        "max_ack_seconds": round(waits[-1], 4),
+        "failed_submits": failed,
+        "insert_statements": inserts["count"],
+        "seconds_until_all_stored": round(drained, 2),
+        "stored_submissions": stored,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=80, help="Độ trễ thêm cho mỗi truy vấn")
+    parser.add_argument("--outage-seconds", type=float, default=3, help="Số giây đầu backend lỗi khi ghi")
+    parser.add_argument("--seed", type=int, default=50001)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_spool_")
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = os.path.join(workdir, "unused.db")
+    os.environ["SUBMISSION_SPOOL_MAX_BACKOFF"] = "2"
+    try:
+        questions, users, _ = make_dataset(args.students, args.questions, 0, args.seed)
+        rows = make_submissions(questions, args.students, 1, random.Random(args.seed))
+        responses = [json.loads(r["responses"]) if isinstance(r["responses"], str) else r["responses"] for r in rows]
+
+        output = {"students": args.students, "latency_ms": args.latency_ms,
+                  "outage_seconds": args.outage_seconds, "results": {}}
+        for mode in ("direct", "spool"):
+            output["results"][mode] = measure(mode, args, workdir, questions, users, responses)
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
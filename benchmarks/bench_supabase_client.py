@@ -0,0 +1,114 @@
+"""So sánh độ trễ truy vấn: tạo client mới mỗi lần vs client dùng chung.
+
+Chạy một HTTP server giả lập PostgREST trên máy cục bộ (không cần Supabase
+thật), sau đó đo thời gian cho N truy vấn ``questions`` theo hai cách:
+
+- ``create_client`` cho mỗi truy vấn (cách cũ của database_helper)
+- ``get_supabase_client`` dùng chung (registry trong database_helper)
+
+Server giả lập dùng HTTP thuần nên chênh lệch đo được chưa gồm chi phí bắt
+tay TLS - trên Supabase thật mức tiết kiệm còn lớn hơn.
+
+Cách chạy::
+
+    python benchmarks/bench_supabase_client.py --requests 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Trả về một danh sách câu hỏi cố định cho mọi truy vấn GET"""
+    protocol_version = "HTTP/1.1"
+    body = json.dumps([
+        {"id": 1, "question": "Câu hỏi mẫu", "type": "Checkbox",
+         "answers": "[\"A\", \"B\", \"C\"]", "correct": "[1]", "score": 1}
+    ]).encode("utf-8")
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with _StandInHandler.lock:
+            _StandInHandler.connections += 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _measure(fetch, requests):
+    """Đo thời gian (ms) của từng lần gọi ``fetch``"""
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        fetch()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _summary(name, timings, connections):
+    return {
+        "mode": name,
+        "requests": len(timings),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(sorted(timings)[int(len(timings) * 0.95) - 1], 3),
+        "connections_opened": connections,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    key = "bench-anon-key"
+
+    from supabase import create_client
+    import database_helper
+
+    os.environ["SUPABASE_URL"] = url
+    os.environ["SUPABASE_KEY"] = key
+
+    results = []
+
+    _StandInHandler.connections = 0
+    timings = _measure(
+        lambda: create_client(url, key).table("questions").select("*").order("id").execute(),
+        args.requests,
+    )
+    results.append(_summary("create_client mỗi lần", timings, _StandInHandler.connections))
+
+    database_helper.reset_supabase_client()
+    _StandInHandler.connections = 0
+    timings = _measure(
+        lambda: database_helper.get_supabase_client().table("questions").select("*").order("id").execute(),
+        args.requests,
+    )
+    results.append(_summary("client dùng chung", timings, _StandInHandler.connections))
+
+    database_helper.reset_supabase_client()
+    server.shutdown()
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Thời gian rerun của form làm bài: một form (mặc định) so với chế độ chia trang.
+
+Chạy survey_form thật bằng streamlit.testing (AppTest, không cần trình duyệt)
+trên một database SQLite tạm (synthetic_data.py) cho từng cỡ đề trong
+--sizes. Với mỗi cỡ đề và mỗi chế độ (SURVEY_PAGE_SIZE = 0 và
+--page-size), đo:
+
+- first_run_ms: lần chạy đầu của phiên
+- rerun_ms: trung vị --reruns lần rerun (vd. tương tác ở phần khác của trang)
+- widgets: số widget câu hỏi được vẽ mỗi lần rerun
+- next_page_ms: (chế độ chia trang) trung vị thời gian bấm "Trang sau"
+
+Thời gian là phía server (dựng cây phần tử), chưa gồm gửi/vẽ ở trình duyệt -
+phần này cũng tỉ lệ với số widget.
+
+Cách chạy::
+
+    python benchmarks/bench_survey_paging.py --sizes 50,200,500 --page-size 20
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from synthetic_data import make_questions, seed_database  # noqa: E402
+
+
+def survey_app():
+    """Trang làm bài của một học viên (chạy trong AppTest)"""
+    import os
+
+    import surveyhandler
+
+    surveyhandler.SURVEY_PAGE_SIZE = int(os.environ["BENCH_SURVEY_PAGE_SIZE"])
+    surveyhandler.survey_form("bench@example.com", "Học viên benchmark", "Lớp benchmark")
+
+
+def timed_run(app):
+    start = time.perf_counter()
+    app.run(timeout=600)
+    elapsed = (time.perf_counter() - start) * 1000
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    return elapsed
+
+
+def question_widgets(app):
+    return len(app.multiselect) + len(app.selectbox) + len(app.text_area)
+
+
+def measure(page_size, args):
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["BENCH_SURVEY_PAGE_SIZE"] = str(page_size)
+    app = AppTest.from_function(survey_app, default_timeout=600)
+    result = {"first_run_ms": round(timed_run(app), 1)}
+    result["rerun_ms"] = round(statistics.median(timed_run(app) for _ in range(args.reruns)), 1)
+    result["widgets"] = question_widgets(app)
+
+    if page_size:
+        times = []
+        for _ in range(args.reruns):
+            buttons = [b for b in app.button if b.label.startswith("Trang sau") and not b.disabled]
+            if not buttons:
+                break
+            buttons[0].click()
+            times.append(timed_run(app))
+        result["next_page_ms"] = round(statistics.median(times), 1) if times else None
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="50,200,500", help="Các cỡ đề (số câu hỏi), cách nhau bởi dấu phẩy")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=50001)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_paging_")
+    try:
+        os.environ["STORAGE_BACKEND"] = "sqlite"
+        import database_helper
+
+        output = {"page_size": args.page_size, "reruns": args.reruns, "results": {}}
+        for size in (int(s) for s in args.sizes.split(",")):
+            database_helper.reset_supabase_client()
+            os.environ["SQLITE_PATH"] = os.path.join(workdir, f"bench_{size}.db")
+            database_helper.invalidate_question_cache()
+            seed_database(database_helper.get_supabase_client(), make_questions(size, random.Random(args.seed)), [], [])
+            output["results"][size] = {
+                "single_form": measure(0, args),
+                "paged": measure(args.page_size, args),
+            }
+        database_helper.reset_supabase_client()
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
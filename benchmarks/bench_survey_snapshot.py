@@ -0,0 +1,97 @@
+"""Chi phí chuẩn bị form làm bài cho mỗi phiên: dựng lại mỗi lần so với SurveySnapshot dùng chung.
+
+Nạp --questions câu hỏi vào một database SQLite tạm (synthetic_data.py) rồi mô
+phỏng --sessions phiên, mỗi phiên --reruns lần rerun của survey_form. Mỗi lần
+rerun chỉ chuẩn bị dữ liệu cho form (không vẽ widget):
+
+- per_session: cách cũ - get_all_questions, normalize_question từng câu, tính
+  điểm tối đa, dựng tiêu đề và lựa chọn của từng câu
+- shared_snapshot: get_survey_snapshot (dựng một lần cho phiên bản danh mục)
+
+In tổng thời gian, thời gian trung bình mỗi lần rerun và số lần dựng snapshot.
+
+Cách chạy::
+
+    python benchmarks/bench_survey_snapshot.py --sessions 500 --questions 200
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from synthetic_data import make_questions, seed_database  # noqa: E402
+
+
+def prepare_per_session(database_helper):
+    from models import normalize_question
+
+    questions = [normalize_question(q) for q in database_helper.get_all_questions()]
+    max_score = sum([q["score"] for q in questions])
+    form = []
+    for q in questions:
+        options = [""] + list(q["answers"]) if q["type"] == "Combobox" else q["answers"]
+        form.append((f"**Câu {q['id']}: {q['question']}** *(Điểm: {q['score']})*", options))
+    return len(form), max_score
+
+
+def prepare_shared_snapshot(database_helper):
+    survey = database_helper.get_survey_snapshot()
+    return len(survey.items), survey.max_score
+
+
+MODES = {
+    "per_session": prepare_per_session,
+    "shared_snapshot": prepare_shared_snapshot,
+}
+
+
+def measure(database_helper, prepare, args):
+    database_helper.invalidate_question_cache()
+    builds_before = database_helper.get_question_cache_stats()["survey_builds"]
+    start = time.perf_counter()
+    for _ in range(args.sessions * args.reruns):
+        count, _ = prepare(database_helper)
+        assert count == args.questions
+    seconds = time.perf_counter() - start
+    return {
+        "total_seconds": round(seconds, 3),
+        "per_rerun_ms": round(seconds / (args.sessions * args.reruns) * 1000, 3),
+        "survey_builds": database_helper.get_question_cache_stats()["survey_builds"] - builds_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--reruns", type=int, default=3, help="Số lần rerun của mỗi phiên")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=50001)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_survey_")
+    try:
+        os.environ["STORAGE_BACKEND"] = "sqlite"
+        os.environ["SQLITE_PATH"] = os.path.join(workdir, "bench.db")
+        import database_helper
+
+        questions = make_questions(args.questions, random.Random(args.seed))
+        seed_database(database_helper.get_supabase_client(), questions, [], [])
+
+        output = {"sessions": args.sessions, "reruns": args.reruns, "questions": args.questions, "results": {}}
+        for name, prepare in MODES.items():
+            output["results"][name] = measure(database_helper, prepare, args)
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+        database_helper.reset_supabase_client()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
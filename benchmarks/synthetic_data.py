@@ -0,0 +1,162 @@
+"""Sinh dữ liệu giả lập (câu hỏi, học viên, bài nộp) cho benchmark và chạy thử offline.
+
+Mọi hàm nhận một ``random.Random`` nên cùng seed cho cùng dữ liệu giữa các lần chạy.
+Tỷ lệ loại câu hỏi chỉnh bằng ``mix`` (vd. ``"Checkbox=2,Combobox=2,Essay=1"``).
+
+Chạy trực tiếp để tạo database SQLite dùng với ``STORAGE_BACKEND=sqlite``::
+
+    python benchmarks/synthetic_data.py --students 10000 --questions 200 --attempts 3 --sqlite-path bench.db
+    STORAGE_BACKEND=sqlite SQLITE_PATH=bench.db streamlit run app.py
+
+(đăng nhập quản trị: admin@example.com / mật khẩu ``--admin-password``)
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+# Mặc định: 2 Checkbox : 2 Combobox : 1 Essay
+DEFAULT_MIX = ("Checkbox", "Checkbox", "Combobox", "Combobox", "Essay")
+ADMIN_EMAIL = "admin@example.com"
+
+
+def parse_mix(text):
+    """"Checkbox=2,Combobox=2,Essay=1" -> ("Checkbox", "Checkbox", "Combobox", "Combobox", "Essay")"""
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("Checkbox", "Combobox", "Essay"):
+            raise ValueError(f"Loại câu hỏi không hợp lệ: {name}")
+        mix.extend([name] * int(weight or 1))
+    if not mix:
+        raise ValueError("Cần ít nhất một loại câu hỏi")
+    return tuple(mix)
+
+
+def make_questions(count, rng, mix=DEFAULT_MIX):
+    questions = []
+    for q_id in range(1, count + 1):
+        q_type = rng.choice(mix)
+        if q_type == "Essay":
+            answers, correct = [], []
+        else:
+            answers = [f"Đáp án {q_id}.{i} - nội dung lựa chọn" for i in range(1, rng.randint(3, 6) + 1)]
+            k = rng.randint(1, 2) if q_type == "Checkbox" else 1
+            correct = sorted(rng.sample(range(1, len(answers) + 1), k))
+        questions.append({"id": q_id, "question": f"Câu hỏi {q_id}", "type": q_type,
+                          "answers": answers, "correct": correct, "score": rng.randint(1, 3)})
+    return questions
+
+
+def make_responses(questions, count, rng):
+    cohort = []
+    for _ in range(count):
+        responses = {}
+        for q in questions:
+            if rng.random() < 0.05:
+                continue
+            if q["type"] == "Essay":
+                responses[str(q["id"])] = [rng.choice(["", "Câu trả lời tự luận"])]
+            elif q["type"] == "Combobox":
+                responses[str(q["id"])] = [rng.choice(q["answers"])]
+            else:
+                responses[str(q["id"])] = rng.sample(q["answers"], rng.randint(1, 2))
+        cohort.append(responses)
+    return cohort
+
+
+def make_users(students, classes=10):
+    return [{
+        "email": f"hocvien{i}@example.com",
+        "password": "mat-khau-mac-dinh",
+        "role": "Học viên",
+        "full_name": f"Học viên số {i}",
+        "class": f"Lớp {i % classes}",
+        "registration_date": "2025-03-01T08:00:00",
+        "first_login": False,
+    } for i in range(students)]
+
+
+def make_submissions(questions, students, attempts, rng):
+    submissions = []
+    essay_ids = [str(q["id"]) for q in questions if q["type"] == "Essay"]
+    for index, responses in enumerate(make_responses(questions, students * attempts, rng), start=1):
+        submissions.append({
+            "id": index,
+            "user_email": f"hocvien{index % students}@example.com",
+            "responses": json.dumps(responses, ensure_ascii=False),
+            "score": rng.randint(0, 100),
+            "timestamp": f"2025-03-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00",
+            "essay_grades": json.dumps({q_id: rng.randint(0, 3) for q_id in essay_ids}),
+            "essay_comments": json.dumps({q_id: "Nhận xét của giảng viên cho câu tự luận" for q_id in essay_ids},
+                                         ensure_ascii=False),
+        })
+    return submissions
+
+
+def make_dataset(students, questions, attempts, seed, mix=DEFAULT_MIX):
+    """Bộ dữ liệu đầy đủ; điểm bài nộp được chấm thật theo đáp án (không ngẫu nhiên)"""
+    from grading import calculate_score
+
+    rng = random.Random(seed)
+    question_rows = make_questions(questions, rng, mix)
+    submission_rows = make_submissions(question_rows, students, attempts, rng)
+    for s in submission_rows:
+        s["score"] = calculate_score(json.loads(s["responses"]), question_rows)
+    return question_rows, make_users(students), submission_rows
+
+
+def seed_database(client, questions, users, submissions, chunk_size=1000):
+    """Nạp dữ liệu vào backend (client trả về từ get_supabase_client) theo từng lô"""
+    question_rows = [dict(q, answers=json.dumps(q["answers"], ensure_ascii=False), correct=json.dumps(q["correct"]))
+                     for q in questions]
+    for table, rows in (("questions", question_rows), ("users", users), ("submissions", submissions)):
+        for start in range(0, len(rows), chunk_size):
+            client.table(table).insert(rows[start:start + chunk_size]).execute()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--attempts", type=int, default=3)
+    parser.add_argument("--mix", default="Checkbox=2,Combobox=2,Essay=1")
+    parser.add_argument("--seed", type=int, default=50001)
+    parser.add_argument("--sqlite-path", required=True, help="File database SQLite (tạo mới, không được tồn tại)")
+    parser.add_argument("--admin-password", default="admin123")
+    args = parser.parse_args()
+
+    if os.path.exists(args.sqlite_path):
+        raise SystemExit(f"{args.sqlite_path} đã tồn tại - chọn file khác để tránh ghi đè dữ liệu")
+
+    from sqlite_backend import SqliteClient
+
+    start = time.perf_counter()
+    questions, users, submissions = make_dataset(args.students, args.questions, args.attempts,
+                                                 args.seed, parse_mix(args.mix))
+    users.append({"email": ADMIN_EMAIL, "password": args.admin_password, "role": "admin",
+                  "full_name": "Quản trị viên", "class": "", "registration_date": "2025-03-01T08:00:00",
+                  "first_login": False})
+    client = SqliteClient(args.sqlite_path)
+    try:
+        seed_database(client, questions, users, submissions)
+    finally:
+        client.close()
+
+    print(json.dumps({
+        "sqlite_path": args.sqlite_path,
+        "questions": len(questions),
+        "users": len(users),
+        "submissions": len(submissions),
+        "seconds": round(time.perf_counter() - start, 2),
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
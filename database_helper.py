@@ -1,14 +1,49 @@
 import os
 import json
 import uuid
+import time
+import threading
 import streamlit as st
 from datetime import datetime
 from supabase import create_client
 import supabase
 import traceback
 
+# Chấm điểm dùng khóa đáp án đã biên dịch (xem grading.py)
+from grading import calculate_score, compile_answer_key, grade_question, question_results, submission_answer_rows
+from submission_stats import aggregate_submission_statistics, statistics_from_aggregates
+# Câu hỏi / bài nộp và cách giải mã cột JSON dùng chung (xem models.py)
+from models import Question, Submission, SurveySnapshot, decode_json_object, normalize_question
+from sqlite_backend import SqliteClient
+# Đo số lần gọi / độ trễ theo từng rerun (xem db_metrics.py)
+from db_metrics import instrument
+# Gộp các lần đọc giống nhau đang chạy đồng thời giữa các phiên (xem single_flight.py)
+from single_flight import SingleFlight
+
+# Backend lưu trữ chọn qua biến môi trường STORAGE_BACKEND:
+# - "supabase" (mặc định): project Supabase theo SUPABASE_URL / SUPABASE_KEY
+# - "sqlite": database SQLite cục bộ tại SQLITE_PATH (xem sqlite_backend.py),
+#   chạy ứng dụng, benchmark và kiểm thử tải mà không cần Supabase
+# Các hàm bên dưới chỉ dùng client trả về từ get_supabase_client() nên không
+# phụ thuộc backend đang chọn.
+STORAGE_BACKENDS = ("supabase", "sqlite")
+
+def get_storage_backend():
+    """Tên backend lưu trữ đang chọn ("supabase" hoặc "sqlite")"""
+    return os.environ.get("STORAGE_BACKEND", "").strip().lower() or "supabase"
+
+def get_sqlite_path():
+    """Đường dẫn file database khi dùng backend SQLite"""
+    return os.environ.get("SQLITE_PATH", "audit_app.db")
+
 def check_supabase_config():
-    """Kiểm tra cấu hình Supabase"""
+    """Kiểm tra cấu hình Supabase (hoặc backend lưu trữ đang chọn)"""
+    backend = get_storage_backend()
+    if backend not in STORAGE_BACKENDS:
+        return False, f"STORAGE_BACKEND không hợp lệ: {backend} (chọn {' hoặc '.join(STORAGE_BACKENDS)})."
+    if backend == "sqlite":
+        return True, f"Dùng database SQLite cục bộ: {get_sqlite_path()}"
+    
     supabase_url = os.environ.get("SUPABASE_URL")
     supabase_key = os.environ.get("SUPABASE_KEY")
     
@@ -20,24 +55,104 @@ def check_supabase_config():
     
     return True, "Cấu hình Supabase hợp lệ."
 
+# Registry client dùng chung cho toàn bộ tiến trình (mọi phiên Streamlit).
+# Mỗi client giữ một HTTP session (keep-alive) nên các truy vấn liên tiếp
+# tái sử dụng kết nối TLS thay vì mở kết nối mới cho mỗi lần gọi.
+_client_registry = {}
+_client_registry_lock = threading.Lock()
+
 def get_supabase_client():
-    """Tạo và trả về Supabase client"""
-    supabase_url = os.environ.get("SUPABASE_URL")
-    supabase_key = os.environ.get("SUPABASE_KEY")
+    """Trả về client dùng chung của backend lưu trữ đang chọn (khởi tạo lười, an toàn đa luồng)
     
-    # Kiểm tra biến môi trường đã được thiết lập
-    if not supabase_url or not supabase_key:
-        st.error("Biến môi trường SUPABASE_URL và SUPABASE_KEY chưa được thiết lập.")
-        return None
+    Với STORAGE_BACKEND=sqlite, client là SqliteClient có cùng giao diện table()/rpc().
+    """
+    if get_storage_backend() == "sqlite":
+        sqlite_path = get_sqlite_path()
+        registry_key = ("sqlite", os.path.abspath(sqlite_path))
+        create = lambda: SqliteClient(sqlite_path)
+        error_message = "Không thể mở database SQLite"
+    else:
+        supabase_url = os.environ.get("SUPABASE_URL")
+        supabase_key = os.environ.get("SUPABASE_KEY")
+        
+        # Kiểm tra biến môi trường đã được thiết lập
+        if not supabase_url or not supabase_key:
+            st.error("Biến môi trường SUPABASE_URL và SUPABASE_KEY chưa được thiết lập.")
+            return None
+        
+        registry_key = (supabase_url, supabase_key)
+        create = lambda: create_client(supabase_url, supabase_key)
+        error_message = "Không thể kết nối đến Supabase"
+    
+    client = _client_registry.get(registry_key)
+    if client is not None:
+        return client
+    
+    with _client_registry_lock:
+        # Kiểm tra lại sau khi lấy khóa - luồng khác có thể đã tạo client
+        client = _client_registry.get(registry_key)
+        if client is not None:
+            return client
+        try:
+            # Tạo client (Supabase hoặc SQLite)
+            client = create()
+        except Exception as e:
+            st.error(f"{error_message}: {e}")
+            return None
+        
+        # URL/KEY (hoặc backend) đã đổi thì client cũ không còn dùng nữa
+        stale_clients = list(_client_registry.values())
+        _client_registry.clear()
+        _client_registry[registry_key] = client
+    
+    for stale in stale_clients:
+        _close_supabase_client(stale)
+    return client
+
+def reset_supabase_client():
+    """Hủy các client đang dùng chung, lần gọi sau sẽ tạo client mới.
     
+    Gọi khi SUPABASE_URL/SUPABASE_KEY thay đổi trong lúc ứng dụng đang chạy.
+    """
+    with _client_registry_lock:
+        stale_clients = list(_client_registry.values())
+        _client_registry.clear()
+    
+    for stale in stale_clients:
+        _close_supabase_client(stale)
+    
+    # Database mới có thể đã có view thống kê / hàm RPC => thử lại
+    _statistics_views["available"] = True
+    _score_updates_rpc["available"] = True
+    _result_updates_rpc["available"] = True
+    _submission_answers["available"] = True
+    _question_results_column["available"] = True
+    _submission_drafts["available"] = True
+    _submit_tokens["available"] = True
+
+# Thông báo lỗi khi database chưa có bảng / view / cột / hàm (PostgREST,
+# PostgreSQL, SQLite). Chỉ những lỗi này mới tắt một tính năng tùy chọn; lỗi
+# mạng, hết thời gian chờ... chỉ ảnh hưởng lần gọi đó.
+_MISSING_OBJECT_MARKERS = ("does not exist", "Could not find", "no such table", "no such column",
+                           "has no column", "Không có hàm RPC")
+
+def _is_missing_object(error, *names):
+    """True nếu lỗi là do database chưa có một trong các đối tượng names"""
+    message = str(error)
+    return (any(name in message for name in names)
+            and any(marker in message for marker in _MISSING_OBJECT_MARKERS))
+
+def _close_supabase_client(client):
+    """Đóng HTTP session của client (bỏ qua lỗi nếu phiên bản thư viện khác)"""
     try:
-        # Tạo Supabase client
-        supabase = create_client(supabase_url, supabase_key)
-        return supabase
-    except Exception as e:
-        st.error(f"Không thể kết nối đến Supabase: {e}")
-        return None
+        if isinstance(client, SqliteClient):
+            client.close()
+        else:
+            client.postgrest.session.close()
+    except Exception:
+        pass
 
+@instrument
 def test_supabase_connection():
     """Kiểm tra kết nối với Supabase"""
     supabase = get_supabase_client()
@@ -51,39 +166,129 @@ def test_supabase_connection():
     except Exception as e:
         return False, f"Lỗi khi truy vấn: {str(e)}"
 
+# Bộ đệm danh mục câu hỏi dùng chung cho toàn bộ tiến trình.
+# - "version" tăng mỗi khi câu hỏi được thêm/sửa/xóa qua ứng dụng
+#   (save_question, update_question, delete_question), bản đệm cũ bị bỏ.
+# - Sau QUESTION_CACHE_TTL giây bản đệm được tải lại để nhận các thay đổi
+#   làm trực tiếp trên database (ngoài ứng dụng).
+# - Câu hỏi trả về là models.Question (chỉ đọc), answers/correct là tuple,
+#   nên không phiên nào có thể làm hỏng bản dùng chung.
+# - "survey" giữ form làm bài dựng sẵn (models.SurveySnapshot) của phiên bản
+#   đang đệm, xem get_survey_snapshot.
+QUESTION_CACHE_TTL = float(os.environ.get("QUESTION_CACHE_TTL", "60"))
+
+_question_catalog_lock = threading.Lock()
+_question_catalog = {
+    "version": 0,
+    "loaded_version": None,
+    "loaded_at": 0.0,
+    "questions": (),
+    "survey": None,
+}
+_question_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0, "survey_builds": 0}
+# Nhiều phiên cùng gặp bộ đệm hết hạn (vd. đầu giờ thi) chỉ tải danh mục một lần
+_questions_flight = SingleFlight("questions")
+_survey_flight = SingleFlight("survey")
+
+def get_catalog_version():
+    """Phiên bản hiện tại của danh mục câu hỏi"""
+    return _question_catalog["version"]
+
+def invalidate_question_cache():
+    """Tăng phiên bản danh mục và bỏ bản đệm (gọi sau mỗi lần ghi câu hỏi)"""
+    with _question_catalog_lock:
+        _question_catalog["version"] += 1
+        _question_catalog["loaded_version"] = None
+        _question_catalog["questions"] = ()
+        _question_catalog["survey"] = None
+        _question_cache_stats["invalidations"] += 1
+
+def get_question_cache_stats():
+    """Thống kê bộ đệm câu hỏi: số lần hit/miss, phiên bản, số câu hỏi"""
+    with _question_catalog_lock:
+        stats = dict(_question_cache_stats)
+        stats["version"] = _question_catalog["version"]
+        stats["size"] = len(_question_catalog["questions"])
+    return stats
+
+@instrument
 def get_all_questions():
-    """Lấy tất cả câu hỏi từ database"""
+    """Lấy tất cả câu hỏi (qua bộ đệm danh mục dùng chung)"""
+    with _question_catalog_lock:
+        cache_fresh = (
+            _question_catalog["loaded_version"] == _question_catalog["version"]
+            and time.monotonic() - _question_catalog["loaded_at"] < QUESTION_CACHE_TTL
+        )
+        if cache_fresh:
+            _question_cache_stats["hits"] += 1
+            return list(_question_catalog["questions"])
+        _question_cache_stats["misses"] += 1
+        version_at_load = _question_catalog["version"]
+    
     try:
         supabase = get_supabase_client()
         if not supabase:
             return []
-            
-        result = supabase.table("questions").select("*").order("id").execute()
-        if result.data:
+        
+        def load():
+            result = supabase.table("questions").select("*").order("id").execute()
             # Đảm bảo dữ liệu được trả về đúng định dạng
-            for q in result.data:
-                # Kiểm tra và chuyển đổi dữ liệu answers
-                if isinstance(q["answers"], str):
-                    try:
-                        q["answers"] = json.loads(q["answers"])
-                    except:
-                        q["answers"] = [q["answers"]]
-                
-                # Kiểm tra và chuyển đổi dữ liệu correct
-                if isinstance(q["correct"], str):
-                    try:
-                        q["correct"] = json.loads(q["correct"])
-                    except:
-                        try:
-                            q["correct"] = [int(x.strip()) for x in q["correct"].split(",")]
-                        except:
-                            q["correct"] = []
-            return result.data
-        return []
+            return tuple(Question.from_row(q) for q in (result.data or []))
+        
+        # Dùng chung kết quả (tuple Question, chỉ đọc) với các phiên đang tải cùng phiên bản
+        questions = _questions_flight.do(version_at_load, load)
     except Exception as e:
         st.error(f"Lỗi khi lấy danh sách câu hỏi: {e}")
         return []
+    
+    with _question_catalog_lock:
+        # Chỉ lưu nếu không có lần ghi nào xảy ra trong lúc đang tải
+        if _question_catalog["version"] == version_at_load:
+            # Tải lại do hết TTL mà nội dung khác đi => thay đổi từ bên ngoài
+            if (_question_catalog["loaded_version"] == version_at_load
+                    and _question_catalog["questions"] != questions):
+                _question_catalog["version"] += 1
+            _question_catalog["questions"] = questions
+            _question_catalog["loaded_version"] = _question_catalog["version"]
+            _question_catalog["loaded_at"] = time.monotonic()
+    return list(questions)
 
+def get_survey_snapshot():
+    """Form làm bài dựng sẵn (models.SurveySnapshot) của danh mục hiện tại
+    
+    Dựng một lần cho mỗi phiên bản danh mục rồi dùng chung (chỉ đọc) cho mọi
+    phiên; chỉ dựng lại khi danh mục đổi phiên bản. Trả về None nếu chưa có
+    câu hỏi nào (hoặc không tải được danh mục - lỗi đã được báo).
+    """
+    # Tải lại danh mục nếu hết TTL / đã bị ghi
+    questions = get_all_questions()
+    if not questions:
+        return None
+    
+    with _question_catalog_lock:
+        version = _question_catalog["loaded_version"]
+        if version != _question_catalog["version"]:
+            # Danh mục vừa bị ghi trong lúc tải: dựng riêng, không lưu đệm
+            version = None
+        snapshot = _question_catalog["survey"]
+        if version is not None and snapshot is not None and snapshot.version == version:
+            return snapshot
+    
+    def build():
+        with _question_catalog_lock:
+            _question_cache_stats["survey_builds"] += 1
+        return SurveySnapshot.build(questions, version)
+    
+    if version is None:
+        return build()
+    # Các phiên cùng gặp phiên bản mới chỉ dựng một lần
+    snapshot = _survey_flight.do(version, build)
+    with _question_catalog_lock:
+        if _question_catalog["version"] == version:
+            _question_catalog["survey"] = snapshot
+    return snapshot
+
+@instrument
 def get_question_by_id(question_id):
     """Lấy thông tin câu hỏi theo ID"""
     try:
@@ -93,29 +298,13 @@ def get_question_by_id(question_id):
             
         result = supabase.table("questions").select("*").eq("id", question_id).execute()
         if result.data:
-            q = result.data[0]
-            # Kiểm tra và chuyển đổi dữ liệu answers
-            if isinstance(q["answers"], str):
-                try:
-                    q["answers"] = json.loads(q["answers"])
-                except:
-                    q["answers"] = [q["answers"]]
-            
-            # Kiểm tra và chuyển đổi dữ liệu correct
-            if isinstance(q["correct"], str):
-                try:
-                    q["correct"] = json.loads(q["correct"])
-                except:
-                    try:
-                        q["correct"] = [int(x.strip()) for x in q["correct"].split(",")]
-                    except:
-                        q["correct"] = []
-            return q
+            return normalize_question(result.data[0])
         return None
     except Exception as e:
         st.error(f"Lỗi khi lấy câu hỏi: {e}")
         return None
 
+@instrument
 def save_question(question_data):
     """Lưu câu hỏi mới vào database"""
     try:
@@ -128,20 +317,22 @@ def save_question(question_data):
         data_to_save = question_data.copy()
         
         # Chuyển đổi answers thành JSON nếu cần
-        if isinstance(data_to_save["answers"], list):
-            data_to_save["answers"] = json.dumps(data_to_save["answers"])
+        if isinstance(data_to_save["answers"], (list, tuple)):
+            data_to_save["answers"] = json.dumps(list(data_to_save["answers"]))
         
         # Chuyển đổi correct thành JSON nếu cần
-        if isinstance(data_to_save["correct"], list):
-            data_to_save["correct"] = json.dumps(data_to_save["correct"])
+        if isinstance(data_to_save["correct"], (list, tuple)):
+            data_to_save["correct"] = json.dumps(list(data_to_save["correct"]))
         
         # Thêm vào database
         result = supabase.table("questions").insert(data_to_save).execute()
+        invalidate_question_cache()
         return True if result.data else False
     except Exception as e:
         st.error(f"Lỗi khi lưu câu hỏi: {e}")
         return False
 
+@instrument
 def update_question(question_id, updated_data):
     """Cập nhật thông tin câu hỏi theo ID"""
     try:
@@ -154,20 +345,22 @@ def update_question(question_id, updated_data):
         data_to_save = updated_data.copy()
         
         # Chuyển đổi answers thành JSON nếu cần
-        if isinstance(data_to_save["answers"], list):
-            data_to_save["answers"] = json.dumps(data_to_save["answers"])
+        if isinstance(data_to_save["answers"], (list, tuple)):
+            data_to_save["answers"] = json.dumps(list(data_to_save["answers"]))
         
         # Chuyển đổi correct thành JSON nếu cần
-        if isinstance(data_to_save["correct"], list):
-            data_to_save["correct"] = json.dumps(data_to_save["correct"])
+        if isinstance(data_to_save["correct"], (list, tuple)):
+            data_to_save["correct"] = json.dumps(list(data_to_save["correct"]))
         
         # Cập nhật vào database
         result = supabase.table("questions").update(data_to_save).eq("id", question_id).execute()
+        invalidate_question_cache()
         return True if result.data else False
     except Exception as e:
         st.error(f"Lỗi khi cập nhật câu hỏi: {e}")
         return False
 
+@instrument
 def delete_question(question_id):
     """Xóa câu hỏi theo ID"""
     try:
@@ -177,120 +370,211 @@ def delete_question(question_id):
             return False
             
         result = supabase.table("questions").delete().eq("id", question_id).execute()
+        invalidate_question_cache()
         return True if result.data else False
     except Exception as e:
         st.error(f"Lỗi khi xóa câu hỏi: {e}")
         return False
 
-def save_submission(email, responses):
-    """Lưu bài làm của học viên và tính điểm"""
-    try:
-        supabase = get_supabase_client()
-        if not supabase:
-            st.error("Không thể kết nối đến Supabase.")
-            return None
-            
-        # Lấy danh sách câu hỏi
+def build_submission(email, responses, questions=None, submit_token=None):
+    """Dòng bài nộp (chưa có id) với điểm và kết quả từng câu hỏi đã chấm
+    
+    Args:
+        submit_token: mã nộp bài của lượt làm bài (xem insert_submissions)
+    
+    Returns:
+        dict user_email, responses, score, timestamp, question_results,
+        submit_token (responses và question_results ở dạng dict, được chuyển
+        thành JSON khi ghi)
+    """
+    if questions is None:
         questions = get_all_questions()
-        
-        # Tính điểm dựa trên câu trả lời
-        score = calculate_score(responses, questions)
-        
-        # Tìm id lớn nhất hiện tại
+    return {
+        "user_email": email,
+        "responses": responses,
+        # Tính điểm và kết quả từng câu hỏi dựa trên câu trả lời
+        "score": calculate_score(responses, questions),
+        # Tạo timestamp đúng định dạng ISO cho PostgreSQL
+        "timestamp": datetime.now().isoformat(),
+        "question_results": question_results(responses, questions),
+        "submit_token": submit_token,
+    }
+
+# Mã nộp bài (sql/007_submit_tokens.sql): mỗi mã chỉ có một bài nộp, nộp lại
+# cùng mã trả về bài đã có. Database chưa có hàm insert_submissions / cột
+# submit_token thì ghi như trước (không chống trùng) cho đến khi client được tạo lại.
+_submit_tokens = {"available": True}
+
+def _drop_submit_tokens(error):
+    """True (và không dùng mã nộp bài nữa) nếu lỗi do database chưa có hàm/cột"""
+    if not _is_missing_object(error, "insert_submissions", "submit_token"):
+        return False
+    _submit_tokens["available"] = False
+    print(f"Database chưa có mã nộp bài (chạy sql/007_submit_tokens.sql?): {error}")
+    return True
+
+def _insert_submission_rows(supabase, rows):
+    """Ghi các dòng bài nộp (đã chuyển JSON), trả về dòng trong database theo thứ tự"""
+    if _submit_tokens["available"] and any(row.get("submit_token") for row in rows):
         try:
-            max_id_result = supabase.table("submissions").select("id").order("id", desc=True).limit(1).execute()
-            if max_id_result.data:
-                new_id = max_id_result.data[0]["id"] + 1
-            else:
-                new_id = 1
+            # Mã đã có => không ghi, trả về dòng đã có (không cần đọc thêm)
+            return supabase.rpc("insert_submissions", {"submissions": rows}).execute().data or []
         except Exception as e:
-            st.error(f"Lỗi khi tìm id lớn nhất: {e}")
-            new_id = 1
-        
-        # Tạo timestamp đúng định dạng ISO cho PostgreSQL
-        current_time = datetime.now().isoformat()
-        
-        # Dữ liệu cần lưu
-        submission_data = {
-            "id": new_id,
-            "user_email": email,
-            "responses": json.dumps(responses),
-            "score": score,
-            "timestamp": current_time  # Sử dụng ISO format thay vì Unix timestamp
-        }
-        
-        # Lưu vào database
-        result = supabase.table("submissions").insert(submission_data).execute()
-        
-        if result.data:
-            # Trả về kết quả bài làm
-            return {
-                "id": new_id,
-                "email": email,
-                "responses": responses,
-                "score": score,
-                "timestamp": current_time
-            }
-        
-        return None
+            if not _drop_submit_tokens(e):
+                raise
+    
+    rows = [{key: value for key, value in row.items() if key != "submit_token"} for row in rows]
+    # INSERT trả về các dòng vừa tạo (kèm id) trong cùng một lượt
+    try:
+        return supabase.table("submissions").insert(rows).execute().data or []
     except Exception as e:
-        st.error(f"Lỗi khi lưu bài làm: {e}")
-        return None
+        if "question_results" not in rows[0] or not _drop_question_results_column(e):
+            raise
+        for row in rows:
+            del row["question_results"]
+        return supabase.table("submissions").insert(rows).execute().data or []
+
+def _submission_content_key(row):
+    """Khóa ghép bài nộp không có submit_token: (email, câu trả lời)"""
+    return row.get("user_email"), json.dumps(decode_json_object(row.get("responses")), sort_keys=True)
 
-def calculate_score(responses, questions):
-    """Tính điểm dựa trên đáp án và câu trả lời"""
-    total_score = 0
+def _match_stored_submissions(submissions, stored):
+    """Ghép các dòng database trả về với bài nộp đã gửi
     
-    for q in questions:
-        q_id = str(q["id"])
-        
-        # Lấy câu trả lời của học viên
-        student_answers = responses.get(q_id, [])
-        
-        # Kiểm tra đáp án
-        if check_answer_correctness(student_answers, q):
-            total_score += q["score"]
+    RETURNING không bảo đảm thứ tự nên ghép theo submit_token; bài không có mã
+    (hoặc database chưa có cột submit_token) ghép theo (email, câu trả lời).
+    """
+    by_token = {}
+    by_content = {}
+    for row in stored:
+        if row.get("submit_token"):
+            by_token[row["submit_token"]] = row
+        else:
+            by_content.setdefault(_submission_content_key(row), []).append(row)
     
-    return total_score
+    matched = []
+    for submission in submissions:
+        row = by_token.get(submission.get("submit_token"))
+        if row is None:
+            candidates = by_content.get(_submission_content_key(submission))
+            if not candidates:
+                raise RuntimeError("Database không trả về các bài nộp vừa lưu.")
+            row = candidates.pop(0)
+        matched.append(row)
+    return matched
 
-def check_answer_correctness(student_answers, question):
-    """Kiểm tra đáp án có đúng không.
-    - Checkbox: so khớp tập chỉ số đáp án
-    - Combobox: so khớp một đáp án
-    - Essay: tính là đúng nếu có nội dung (không rỗng)
+@instrument
+def insert_submissions(submissions, questions=None):
+    """Ghi một lô bài nộp (dòng từ build_submission) trong một lệnh
+    
+    Bài nộp cùng submit_token với một bài đã có (bấm gửi hai lần, rerun, lô
+    spool ghi lại sau khi mất phản hồi) không tạo dòng mới: kết quả là dòng đã
+    có. Ghi thêm submission_answers của các bài vừa tạo. Ném lỗi nếu không ghi
+    được (bên gọi quyết định báo lỗi hay thử lại).
+    
+    Returns:
+        list dòng bài nộp trong database (kèm id), theo thứ tự của submissions
     """
-    if not student_answers:
-        return False
-
-    q_type = question.get("type")
-
-    # Tự luận: chỉ cần có nội dung
-    if q_type == "Essay":
-        return bool(student_answers) and isinstance(student_answers[0], str) and student_answers[0].strip() != ""
+    if not submissions:
+        return []
+    supabase = get_supabase_client()
+    if not supabase:
+        raise RuntimeError("Không thể kết nối đến Supabase.")
+    if questions is None:
+        questions = get_all_questions()
+    
+    # id do database sinh (identity, xem sql/001_submissions_identity.sql).
+    # Cùng một mã nộp bài trong lô (vd. spool nhận hai lần bấm gửi) chỉ ghi một lần.
+    keys = [submission.get("submit_token") or index for index, submission in enumerate(submissions)]
+    unique = {}
+    for key, submission in zip(keys, submissions):
+        unique.setdefault(key, submission)
+    rows = []
+    for submission in unique.values():
+        row = dict(submission, responses=json.dumps(submission["responses"]))
+        if _question_results_column["available"]:
+            row["question_results"] = json.dumps(submission["question_results"])
+        else:
+            row.pop("question_results", None)
+        rows.append(row)
+    
+    stored = _insert_submission_rows(supabase, rows)
+    if len(stored) != len(rows):
+        raise RuntimeError("Database không trả về các bài nộp vừa lưu.")
+    stored_by_key = dict(zip(unique, _match_stored_submissions(unique.values(), stored)))
+    
+    # Ghi từng câu trả lời vào submission_answers (lỗi không ảnh hưởng bài đã lưu);
+    # bài đã có từ trước (answers_indexed) không cần ghi lại
+    answers = []
+    indexed_ids = []
+    for key, row in stored_by_key.items():
+        if row.get("answers_indexed"):
+            continue
+        answers.extend(submission_answer_rows(row["id"], unique[key]["responses"], questions))
+        indexed_ids.append(row["id"])
+    _index_submission_answers(supabase, answers, indexed_ids)
+    return [stored_by_key[key] for key in keys]
 
-    # Combobox: chọn một
-    if q_type == "Combobox":
-        if len(student_answers) == 1:
-            answer_text = student_answers[0]
-            answers = question.get("answers", [])
-            correct = question.get("correct", [])
-            answer_index = answers.index(answer_text) + 1 if answer_text in answers else -1
-            return answer_index in correct
-        return False
+@instrument
+def save_submission(email, responses, submit_token=None):
+    """Lưu bài làm của học viên và tính điểm
+    
+    submit_token: mã nộp bài của lượt làm bài; gửi lại cùng mã trả về bài đã
+    lưu lần trước thay vì tạo bài mới.
+    """
+    try:
+        # Lấy danh sách câu hỏi
+        questions = get_all_questions()
+        submission = build_submission(email, responses, questions, submit_token)
+        
+        stored = insert_submissions([submission], questions)[0]
+        # Trả về kết quả bài làm (của bài đã lưu, kể cả khi đây là lần gửi lại)
+        return _submission_result(email, stored, submission)
+    except Exception as e:
+        st.error(f"Lỗi khi lưu bài làm: {e}")
+        return None
 
-    # Checkbox: nhiều lựa chọn
-    if q_type == "Checkbox":
-        answers = question.get("answers", [])
-        correct = set(question.get("correct", []))
-        selected_indices = []
-        for ans in student_answers:
-            if ans in answers:
-                selected_indices.append(answers.index(ans) + 1)
-        return set(selected_indices) == correct
+def _submission_result(email, stored, submission):
+    """Kết quả bài làm (như save_submission trả về) từ dòng trong database"""
+    return {
+        "id": stored["id"],
+        "email": email,
+        "responses": decode_json_object(stored["responses"]) if "responses" in stored else submission["responses"],
+        "score": stored.get("score", submission["score"]),
+        "timestamp": stored.get("timestamp", submission["timestamp"]),
+        "question_results": (decode_json_object(stored["question_results"]) if stored.get("question_results")
+                             else submission["question_results"]),
+        "submit_token": submission["submit_token"],
+    }
 
-    return False
+@instrument
+def get_submission_by_token(email, submit_token):
+    """Bài nộp đã lưu với mã nộp bài này (kết quả như save_submission), None nếu chưa có
+    
+    Dùng khi gửi lại một lượt mà lần gửi trước không nhận được kết quả: bài có
+    thể đã được lưu. Database chưa có cột submit_token thì luôn là None.
+    """
+    if not submit_token or not _submit_tokens["available"]:
+        return None
+    supabase = get_supabase_client()
+    if not supabase:
+        return None
+    try:
+        response = supabase.table("submissions").select(
+            _select_columns(("id", "responses", "score", "timestamp", "question_results"))
+        ).eq("user_email", email).eq("submit_token", submit_token).limit(1).execute()
+    except Exception as e:
+        # Cột chưa có: coi như chưa lưu (ghi lại cùng mã vẫn không tạo bài trùng nếu database hỗ trợ)
+        if not _drop_submit_tokens(e) and not _drop_question_results_column(e):
+            st.error(f"Lỗi khi kiểm tra bài đã nộp: {e}")
+        return None
+    if not response.data:
+        return None
+    stored = response.data[0]
+    return _submission_result(email, stored, dict(stored, question_results=None, submit_token=submit_token))
 
 # mới thêm code here
+@instrument
 def get_user(email, password):
     """Kiểm tra đăng nhập và trả về thông tin người dùng"""
     try:
@@ -316,191 +600,629 @@ def get_user(email, password):
         print(f"Lỗi khi đăng nhập: {type(e).__name__}: {str(e)}")
         return None
     
-def get_user_submissions(email):
-    """Lấy tất cả bài làm của một học viên theo email"""
+# Các tập cột thường dùng: chỉ lấy những cột màn hình cần, tránh tải các cột
+# lớn (responses, essay_grades, essay_comments) hoặc mật khẩu khi không dùng đến.
+SUBMISSION_SUMMARY_COLUMNS = ("id", "user_email", "score", "timestamp")
+SUBMISSION_REPORT_COLUMNS = ("id", "user_email", "score", "timestamp", "responses", "question_results")
+USER_LIST_COLUMNS = ("email", "role", "full_name", "class", "registration_date")
+
+# Cột submissions.question_results (sql/005_question_results.sql): kết quả từng
+# câu hỏi lưu lúc nộp bài. Database chưa có cột này thì không ghi / select cột
+# đó (kết quả được chấm lại khi hiển thị) cho đến khi client được tạo lại.
+_question_results_column = {"available": True}
+
+def _drop_question_results_column(error):
+    """True (và bỏ cột question_results khỏi các truy vấn sau) nếu lỗi do database chưa có cột này"""
+    if not _question_results_column["available"] or not _is_missing_object(error, "question_results"):
+        return False
+    _question_results_column["available"] = False
+    print(f"Database chưa có cột submissions.question_results (chạy sql/005_question_results.sql?): {error}")
+    return True
+
+def _select_columns(columns, required=()):
+    """Chuỗi cột cho select() từ "*", chuỗi "a,b" hoặc danh sách cột"""
+    if columns is None or columns == "*":
+        return "*"
+    if isinstance(columns, str):
+        columns = [c.strip() for c in columns.split(",") if c.strip()]
+    if "*" in columns:
+        return "*"
+    columns = list(columns) + list(required)
+    if not _question_results_column["available"]:
+        columns = [c for c in columns if c != "question_results"]
+    return ",".join(dict.fromkeys(columns))
+
+def _apply_filters(query, filters, like=None):
+    """Thêm điều kiện lọc: list/tuple/set dùng in_, giá trị đơn dùng eq; like là dict {cột: mẫu}"""
+    for column, value in (filters or {}).items():
+        if isinstance(value, (list, tuple, set, frozenset)):
+            query = query.in_(column, list(value))
+        else:
+            query = query.eq(column, value)
+    for column, pattern in (like or {}).items():
+        query = query.like(column, pattern)
+    return query
+
+@instrument
+def _count_submissions(supabase, filters=None, like=None):
+    """Đếm số bài nộp (count=exact) mà không tải nội dung các dòng"""
+    query = _apply_filters(supabase.table("submissions").select("id", count="exact"), filters, like)
+    result = query.limit(1).execute()
+    return result.count or 0
+
+@instrument
+def get_user_submissions(email, columns="*", count_only=False):
+    """Lấy tất cả bài làm của một học viên theo email
+    
+    Args:
+        columns: "*" hoặc danh sách cột cần lấy (vd. SUBMISSION_SUMMARY_COLUMNS)
+        count_only: True để chỉ trả về số bài làm (int), không tải dữ liệu
+    """
     try:
         supabase = get_supabase_client()
         if not supabase:
             st.error("Không thể kết nối đến Supabase.")
-            return []
+            return 0 if count_only else []
+        
+        if count_only:
+            return _count_submissions(supabase, {"user_email": email})
             
         # Sửa từ "email" thành "user_email"
-        result = supabase.table("submissions").select("*").eq("user_email", email).order("timestamp", desc=True).execute()
+        def query():
+            return supabase.table("submissions").select(_select_columns(columns)).eq("user_email", email).order("timestamp", desc=True).execute()
         
-        if result.data:
-            submissions = []
-            for s in result.data:
-                # Chuyển đổi responses từ JSON string thành dict
-                if isinstance(s["responses"], str):
-                    try:
-                        s["responses"] = json.loads(s["responses"])
-                    except:
-                        s["responses"] = {}
-                
-                submissions.append(s)
-            
-            return submissions
+        try:
+            result = query()
+        except Exception as e:
+            if not _drop_question_results_column(e):
+                raise
+            result = query()
         
-        return []
+        # responses được giải mã khi đọc lần đầu (models.Submission)
+        return [Submission.from_row(s) for s in result.data or []]
     except Exception as e:
         st.error(f"Lỗi khi lấy bài làm của học viên: {e}")
-        return []
+        return 0 if count_only else []
 
-def get_all_submissions():
-    """Lấy tất cả bài làm từ tất cả học viên"""
+@instrument
+def get_attempt_summary(email):
+    """Số lần làm bài và điểm cao nhất của học viên trong một truy vấn
+    
+    Chỉ tải một dòng (cột score, điểm cao nhất) kèm tổng số dòng (count=exact),
+    không tải lịch sử bài làm.
+    
+    Returns:
+        dict {"count": int, "best_score": số hoặc None nếu chưa làm bài}; None nếu lỗi
+    """
     try:
         supabase = get_supabase_client()
         if not supabase:
             st.error("Không thể kết nối đến Supabase.")
-            return []
+            return None
+        
+        result = (supabase.table("submissions").select("score", count="exact")
+                  .eq("user_email", email).order("score", desc=True).limit(1).execute())
+        rows = result.data or []
+        return {
+            "count": result.count or 0,
+            "best_score": rows[0]["score"] if rows else None,
+        }
+    except Exception as e:
+        st.error(f"Lỗi khi lấy số lần làm bài: {e}")
+        return None
+
+# Đọc bảng submissions theo trang với khóa id giảm dần (id tự tăng nên bài
+# mới nhất đứng trước). Mỗi trang bắt đầu ngay sau id cuối của trang trước
+# (keyset, lt("id", ...) trên khóa chính), nên không bị giới hạn số dòng tối
+# đa của PostgREST cắt mất dữ liệu và chi phí mỗi trang không tăng theo độ
+# sâu như phân trang bằng offset. Chỉ dùng bộ lọc AND (postgrest 0.10 không
+# có or_()) và không phụ thuộc cách sắp xếp dòng có timestamp NULL.
+SUBMISSIONS_PAGE_SIZE = int(os.environ.get("SUBMISSIONS_PAGE_SIZE", "500"))
+
+@instrument
+def iter_submissions(filters=None, columns="*", page_size=None, decode=True, like=None):
+    """Duyệt bài nộp theo từng trang (mới nhất trước), không tải cả bảng vào bộ nhớ
+    
+    Args:
+        filters: dict {cột: giá trị}; giá trị list/tuple/set lọc bằng in_, còn lại bằng eq
+        like: dict {cột: mẫu} lọc bằng like (ký tự đại diện *)
+        columns: "*" hoặc danh sách cột cần lấy
+        page_size: số dòng mỗi trang (mặc định SUBMISSIONS_PAGE_SIZE)
+        decode: True để trả về models.Submission (cột JSON giải mã lười khi đọc),
+            False để trả về dict thô của dòng
+    
+    Lỗi truy vấn được ném ra cho nơi gọi xử lý (giống các hàm get_* bọc try/except).
+    """
+    supabase = get_supabase_client()
+    if not supabase:
+        st.error("Không thể kết nối đến Supabase.")
+        return
+    
+    page_size = page_size or SUBMISSIONS_PAGE_SIZE
+    # Luôn kèm id (cần cho keyset)
+    select_columns = _select_columns(columns, required=("id",))
+    last_row = None
+    
+    while True:
+        query = _apply_filters(supabase.table("submissions").select(select_columns), filters, like)
+        if last_row is not None:
+            query = query.lt("id", last_row["id"])
         
-        # Lấy tất cả bài nộp
-        result = supabase.table("submissions").select("*").order("timestamp", desc=True).execute()
+        try:
+            result = query.order("id", desc=True).limit(page_size).execute()
+        except Exception as e:
+            if not _drop_question_results_column(e):
+                raise
+            # Đọc lại trang này không có cột question_results
+            select_columns = _select_columns(columns, required=("id",))
+            continue
+        rows = result.data or []
+        # Dừng khi trang rỗng (không dựa vào len(rows) < page_size vì
+        # server có thể giới hạn số dòng mỗi trang nhỏ hơn page_size)
+        if not rows:
+            return
         
-        if result.data:
-            submissions = []
-            for s in result.data:
-                # Chuyển đổi responses từ JSON string thành dict
-                if isinstance(s["responses"], str):
-                    try:
-                        s["responses"] = json.loads(s["responses"])
-                    except:
-                        s["responses"] = {}
-                
-                submissions.append(s)
-            
-            return submissions
+        last_row = rows[-1]
+        for s in rows:
+            yield Submission.from_row(s) if decode else s
+
+@instrument
+def get_all_submissions(columns="*", count_only=False):
+    """Lấy tất cả bài làm từ tất cả học viên
+    
+    Args:
+        columns: "*" hoặc danh sách cột cần lấy (vd. SUBMISSION_REPORT_COLUMNS)
+        count_only: True để chỉ trả về tổng số bài làm (int), không tải dữ liệu
+    """
+    try:
+        if count_only:
+            supabase = get_supabase_client()
+            if not supabase:
+                st.error("Không thể kết nối đến Supabase.")
+                return 0
+            return _count_submissions(supabase)
         
-        return []
+        # Đọc theo trang để không bị giới hạn số dòng của PostgREST cắt bớt
+        return list(iter_submissions(columns=columns))
     except Exception as e:
         st.error(f"Lỗi khi lấy tất cả bài làm: {e}")
         print(f"Chi tiết lỗi: {type(e).__name__}: {str(e)}")
         traceback.print_exc()
-        return []
+        return 0 if count_only else []
+
+# Chấm lại bài nộp khi sửa đáp án / điểm của một câu hỏi. Chỉ đọc các bài nộp
+# có khóa của câu hỏi trong responses, chấm lại riêng câu đó theo từng lô và
+# ghi các điểm thay đổi bằng một lệnh RPC cho cả lô. Điểm mới = điểm đang lưu
+# - điểm câu đó lúc chấm (mục question_results) + điểm theo khóa mới; mục
+# question_results được ghi cùng lúc với tag mới nên chạy lại không cộng lần
+# nữa (sql/008_apply_submission_results.sql; database chưa có cột
+# question_results thì chỉ ghi điểm bằng sql/003_apply_submission_scores.sql).
+# Nếu database chưa có hàm RPC thì cập nhật từng bài cho đến khi client được
+# tạo lại.
+REGRADE_BATCH_SIZE = int(os.environ.get("REGRADE_BATCH_SIZE", "1000"))
+_score_updates_rpc = {"available": True}
+_result_updates_rpc = {"available": True}
+
+def _stored_score(value):
+    """Làm tròn điểm sau khi cộng chênh lệch; điểm nguyên lưu dạng int"""
+    value = round(value, 6)
+    return int(value) if float(value).is_integer() else value
+
+@instrument
+def _write_submission_scores(supabase, updates):
+    """Ghi điểm mới (và question_results nếu có) cho nhiều bài nộp, trả về số bài đã cập nhật
+    
+    updates: list {"id", "old_score", "score"[, "question_results"]}, các mục
+    cùng dạng; question_results là JSON text. Bài nộp chỉ được ghi nếu điểm
+    vẫn là old_score (không bị sửa trong lúc đang chấm lại).
+    """
+    with_results = "question_results" in updates[0]
+    function, rpc_state = (("apply_submission_results", _result_updates_rpc) if with_results
+                           else ("apply_submission_scores", _score_updates_rpc))
+    if rpc_state["available"]:
+        try:
+            result = supabase.rpc(function, {"updates": updates}).execute()
+            return int(result.data or 0)
+        except Exception as e:
+            # Chỉ tắt RPC khi database chưa có hàm; lỗi tạm thời thì cập nhật từng bài cho lần này
+            if _is_missing_object(e, function):
+                rpc_state["available"] = False
+            print(f"Không dùng được RPC {function}, cập nhật từng bài: {e}")
+    
+    updated = 0
+    for item in updates:
+        values = {"score": item["score"]}
+        if with_results:
+            values["question_results"] = item["question_results"]
+        query = supabase.table("submissions").update(values).eq("id", item["id"])
+        if item["old_score"] is None:
+            query = query.is_("score", "null")
+        else:
+            query = query.eq("score", item["old_score"])
+        if query.execute().data:
+            updated += 1
+    return updated
+
+def _regrade_batch(supabase, rows, question_key, old_key, new_key, new_question):
+    """Chấm lại một lô bài nộp, trả về (số bài đổi điểm, số bài đã ghi)
+    
+    Chỉ chấm lại bài nộp mà mục question_results của câu hỏi còn mang tag của
+    khóa đáp án cũ (bài nộp sau khi sửa câu hỏi đã được chấm theo khóa mới),
+    hoặc chưa có mục này (bài nộp cũ, coi như đã chấm theo khóa cũ).
+    """
+    with_results = _question_results_column["available"]
+    updates = []
+    regraded = []
+    for s in rows:
+        # Mẫu like có thể khớp nhầm (vd. trong nội dung tự luận) => kiểm tra lại khóa
+        if question_key not in s["responses"]:
+            continue
+        student_answers = s["responses"][question_key]
+        results = dict(s.get("question_results") or {})
+        stored = results.get(question_key)
+        if not (isinstance(stored, list) and len(stored) == 3):
+            old_points = grade_question(student_answers, old_key).points
+        elif stored[2] == old_key.tag:
+            old_points = stored[1]
+        else:
+            continue
+        regraded.append(s)
+        
+        new_result = grade_question(student_answers, new_key)
+        if new_result.points == old_points:
+            continue
+        old_score = s.get("score")
+        update = {"id": s["id"], "old_score": old_score,
+                  "score": _stored_score((old_score or 0) - old_points + new_result.points)}
+        if with_results:
+            results[question_key] = [new_result.status, new_result.points, new_key.tag]
+            update["question_results"] = json.dumps(results)
+        updates.append(update)
+    
+    # Bitmask / đúng-sai của câu hỏi này trong submission_answers cũng đổi theo
+    _index_submission_answers(supabase, [
+        answer for s in regraded for answer in submission_answer_rows(s["id"], s["responses"], [new_question])
+    ])
+    if not updates:
+        return 0, 0
+    return len(updates), _write_submission_scores(supabase, updates)
 
-def get_submission_statistics():
-    """Lấy thống kê về các bài nộp"""
+@instrument
+def regrade_question_submissions(old_question, new_question, progress=None, batch_size=None):
+    """Chấm lại các bài nộp có trả lời câu hỏi vừa được sửa
+    
+    Args:
+        old_question, new_question: câu hỏi (dict, cùng id) trước và sau khi sửa
+        progress: hàm progress(processed, total, updated) gọi sau mỗi lô
+        batch_size: số bài nộp mỗi lô (mặc định REGRADE_BATCH_SIZE)
+    
+    Returns:
+        dict {"scanned", "changed", "updated"} hoặc None nếu có lỗi
+    """
+    result = {"scanned": 0, "changed": 0, "updated": 0}
+    old_key = compile_answer_key(old_question)
+    new_key = compile_answer_key(new_question)
+    # Đáp án, đáp án đúng, loại câu hỏi và điểm không đổi => điểm không đổi
+    if old_key == new_key:
+        return result
+    
     try:
         supabase = get_supabase_client()
         if not supabase:
             st.error("Không thể kết nối đến Supabase.")
             return None
-            
-        # Lấy tất cả bài nộp
-        submissions_result = supabase.table("submissions").select("*").execute()
-        submissions = submissions_result.data if submissions_result.data else []
         
-        # Lấy danh sách câu hỏi
-        questions = get_all_questions()
+        question_key = str(new_question["id"])
+        # responses lưu dạng JSON text (json.dumps) => khóa câu hỏi xuất hiện dạng "id":
+        like = {"responses": f'*"{question_key}":*'}
+        try:
+            total = _count_submissions(supabase, like=like)
+        except Exception:
+            # Cột responses không lọc được bằng like (vd. jsonb) => duyệt cả bảng
+            like = None
+            total = _count_submissions(supabase)
+        if progress:
+            progress(0, total, 0)
         
-        # Tính số lượng bài nộp
-        total_submissions = len(submissions)
+        batch_size = batch_size or REGRADE_BATCH_SIZE
+        batch = []
+        rows = iter_submissions(columns=("id", "score", "responses", "question_results"),
+                                page_size=batch_size, like=like)
+        for s in rows:
+            batch.append(s)
+            if len(batch) < batch_size:
+                continue
+            changed, updated = _regrade_batch(supabase, batch, question_key, old_key, new_key, new_question)
+            result["scanned"] += len(batch)
+            result["changed"] += changed
+            result["updated"] += updated
+            batch = []
+            if progress:
+                progress(result["scanned"], total, result["updated"])
         
-        if total_submissions == 0:
-            return {
-                "total_submissions": 0,
-                "student_count": 0,
-                "avg_score": 0,
-                "avg_percentage": 0,
-                "total_possible_score": sum(q["score"] for q in questions),
-                "question_stats": {},
-                "daily_counts": {}
-            }
+        changed, updated = _regrade_batch(supabase, batch, question_key, old_key, new_key, new_question)
+        result["scanned"] += len(batch)
+        result["changed"] += changed
+        result["updated"] += updated
+        if progress:
+            progress(result["scanned"], total, result["updated"])
+        return result
+    except Exception as e:
+        st.error(f"Lỗi khi chấm lại bài nộp: {e}")
+        print(f"Chi tiết lỗi: {type(e).__name__}: {str(e)}")
+        traceback.print_exc()
+        return None
+
+# Từng câu trả lời lưu thành một dòng trong submission_answers
+# (sql/004_submission_answers.sql): ghi khi nộp bài, cập nhật khi chấm lại, bài
+# nộp cũ được bổ sung bằng backfill_submission_answers. Nếu database chưa có
+# bảng / hàm index_submission_answers, lần lỗi đầu tiên sẽ tắt việc ghi (và
+# thống kê dùng lại question_correct_stats) cho đến khi client được tạo lại.
+_submission_answers = {"available": True}
+# Số bài nộp mỗi lần ghi khi bổ sung dữ liệu cũ (mỗi bài ~ một dòng / câu hỏi)
+ANSWERS_BACKFILL_BATCH_SIZE = int(os.environ.get("ANSWERS_BACKFILL_BATCH_SIZE", "200"))
+
+@instrument
+def _write_submission_answers(supabase, answers, indexed_ids=()):
+    """Ghi đè các dòng submission_answers; indexed_ids: bài nộp đã được ghi đủ mọi câu trả lời"""
+    if not answers and not indexed_ids:
+        return 0
+    result = supabase.rpc("index_submission_answers",
+                          {"answers": answers, "indexed_ids": list(indexed_ids)}).execute()
+    return int(result.data or 0)
+
+def _index_submission_answers(supabase, answers, indexed_ids=()):
+    """Như _write_submission_answers nhưng không ném lỗi (dùng khi nộp bài / chấm lại)"""
+    if not _submission_answers["available"]:
+        return 0
+    try:
+        return _write_submission_answers(supabase, answers, indexed_ids)
+    except Exception as e:
+        if _is_missing_object(e, "submission_answers", "index_submission_answers"):
+            _submission_answers["available"] = False
+            print(f"Không ghi được submission_answers (đã chạy sql/004_submission_answers.sql?): {e}")
+        else:
+            # Bài nộp vẫn chưa được đánh dấu answers_indexed, backfill sẽ ghi lại
+            print(f"Lỗi khi ghi submission_answers: {type(e).__name__}: {e}")
+        return 0
+
+# Bản nháp bài đang làm (sql/006_submission_drafts.sql), ghi theo lô từ luồng
+# nền của drafts.py. Database chưa có bảng / hàm save_submission_drafts thì
+# tắt việc lưu nháp cho đến khi client được tạo lại.
+_submission_drafts = {"available": True}
+
+def submission_drafts_available():
+    """False nếu database chưa có bảng submission_drafts (đã gặp lỗi thiếu bảng/hàm)"""
+    return _submission_drafts["available"]
+
+def _drop_submission_drafts(error):
+    """Tắt lưu nháp nếu lỗi là do database chưa có bảng/hàm; trả về True nếu đúng vậy"""
+    if not _is_missing_object(error, "submission_drafts"):
+        return False
+    _submission_drafts["available"] = False
+    print(f"Database chưa có bảng submission_drafts (chạy sql/006_submission_drafts.sql?): {error}")
+    return True
+
+@instrument
+def write_submission_drafts(drafts, deleted_emails=()):
+    """Ghi một lô bản nháp (ghi đè theo user_email) và xóa bản nháp của deleted_emails
+    
+    Args:
+        drafts: [{"user_email", "attempt_index", "page", "responses"}, ...],
+            responses là dict câu trả lời
+    
+    Returns:
+        Số bản nháp đã ghi, hoặc None nếu có lỗi / database chưa có bảng
+    """
+    if not _submission_drafts["available"]:
+        return None
+    try:
+        supabase = get_supabase_client()
+        if not supabase:
+            return None
         
-        # Tính điểm trung bình
-        total_possible_score = sum(q["score"] for q in questions)
-        avg_score = sum(s["score"] for s in submissions) / total_submissions if total_submissions > 0 else 0
-        avg_percentage = (avg_score / total_possible_score * 100) if total_possible_score > 0 else 0
+        rows = [dict(d, responses=json.dumps(d["responses"], ensure_ascii=False)) for d in drafts]
+        result = supabase.rpc("save_submission_drafts", {"drafts": rows, "deleted": list(deleted_emails)}).execute()
+        return int(result.data or 0)
+    except Exception as e:
+        if not _drop_submission_drafts(e):
+            print(f"Lỗi khi ghi bản nháp: {type(e).__name__}: {e}")
+        return None
+
+@instrument
+def get_submission_draft(email):
+    """Bản nháp đã lưu của học viên: dict attempt_index, page, responses (dict), updated_at; hoặc None"""
+    if not _submission_drafts["available"]:
+        return None
+    try:
+        supabase = get_supabase_client()
+        if not supabase:
+            return None
         
-        # Tính số lượng học viên đã nộp bài
-        # Sửa từ "email" thành "user_email"
-        unique_students = set(s["user_email"] for s in submissions)
-        student_count = len(unique_students)
-        
-        # Tính tỷ lệ đúng sai cho từng câu hỏi
-        question_stats = {}
-        for q in questions:
-            q_id = str(q["id"])
-            correct_count = 0
-            total_answers = 0
-            
-            for s in submissions:
-                # Chuyển đổi responses từ JSON string thành dict nếu cần
-                if isinstance(s["responses"], str):
-                    try:
-                        responses = json.loads(s["responses"])
-                    except:
-                        responses = {}
-                else:
-                    responses = s["responses"]
-                
-                if q_id in responses:
-                    total_answers += 1
-                    student_answers = responses[q_id]
-                    if check_answer_correctness(student_answers, q):
-                        correct_count += 1
-            
-            correct_percentage = (correct_count / total_answers * 100) if total_answers > 0 else 0
+        result = supabase.table("submission_drafts").select("attempt_index,page,responses,updated_at").eq("user_email", email).execute()
+        if not result.data:
+            return None
+        draft = result.data[0]
+        draft["responses"] = decode_json_object(draft.get("responses"))
+        return draft
+    except Exception as e:
+        if not _drop_submission_drafts(e):
+            print(f"Lỗi khi đọc bản nháp: {type(e).__name__}: {e}")
+        return None
+
+def _question_stats_source(supabase):
+    """View thống kê theo câu hỏi: question_answer_stats (đọc index) khi mọi bài
+    nộp đã có dòng trong submission_answers, ngược lại question_correct_stats"""
+    if _submission_answers["available"]:
+        try:
+            coverage = supabase.table("submission_answers_coverage").select("pending_submissions").execute().data
+            if coverage and not coverage[0]["pending_submissions"]:
+                return "question_answer_stats"
+        except Exception as e:
+            if _is_missing_object(e, "submission_answers_coverage"):
+                _submission_answers["available"] = False
+            print(f"Không đọc được submission_answers_coverage: {e}")
+    return "question_correct_stats"
+
+@instrument
+def backfill_submission_answers(batch_size=None, progress=None):
+    """Ghi submission_answers cho các bài nộp chưa có (answers_indexed = false)
+    
+    Chấm theo danh mục câu hỏi hiện tại; có thể chạy lại hoặc dừng giữa chừng
+    an toàn (bài nộp chỉ được đánh dấu sau khi đã ghi đủ dòng).
+    
+    Args:
+        batch_size: số bài nộp mỗi lần ghi (mặc định ANSWERS_BACKFILL_BATCH_SIZE)
+        progress: hàm progress(processed, total) gọi sau mỗi lô
+    
+    Returns:
+        dict {"scanned", "answers"} hoặc None nếu có lỗi
+    """
+    result = {"scanned": 0, "answers": 0}
+    try:
+        supabase = get_supabase_client()
+        if not supabase:
+            st.error("Không thể kết nối đến Supabase.")
+            return None
+        
+        questions = get_all_questions()
+        pending = {"answers_indexed": False}
+        total = _count_submissions(supabase, pending)
+        if progress:
+            progress(0, total)
+        
+        batch_size = batch_size or ANSWERS_BACKFILL_BATCH_SIZE
+        answers = []
+        indexed_ids = []
+        for s in iter_submissions(filters=pending, columns=("id", "responses"), page_size=batch_size):
+            answers.extend(submission_answer_rows(s["id"], s["responses"], questions))
+            indexed_ids.append(s["id"])
+            if len(indexed_ids) < batch_size:
+                continue
+            result["answers"] += _write_submission_answers(supabase, answers, indexed_ids)
+            result["scanned"] += len(indexed_ids)
+            answers = []
+            indexed_ids = []
+            if progress:
+                progress(result["scanned"], total)
+        
+        result["answers"] += _write_submission_answers(supabase, answers, indexed_ids)
+        result["scanned"] += len(indexed_ids)
+        if progress:
+            progress(result["scanned"], total)
+        return result
+    except Exception as e:
+        st.error(f"Lỗi khi bổ sung submission_answers: {e}")
+        traceback.print_exc()
+        return None
+
+# Thống kê tính sẵn trên database (sql/002_submission_statistics_views.sql):
+# chỉ vài dòng tổng hợp được truyền về, không phụ thuộc số bài nộp.
+# Nếu database chưa có các view này, lần đầu truy vấn lỗi sẽ chuyển sang đọc
+# bài nộp theo trang và tổng hợp phía ứng dụng cho đến khi client được tạo lại.
+_statistics_views = {"available": True}
+_STATISTICS_VIEWS = ("submission_summary", "submission_daily_counts", "question_correct_stats", "question_answer_stats")
+
+@instrument
+def _fetch_statistics_from_views(supabase, questions, include_question_stats):
+    """Đọc thống kê từ các view submission_summary / submission_daily_counts / question_correct_stats"""
+    summary = supabase.table("submission_summary").select("*").execute().data
+    daily_rows = supabase.table("submission_daily_counts").select("day,submission_count").execute().data
+    question_rows = []
+    if include_question_stats:
+        question_rows = supabase.table(_question_stats_source(supabase)).select("*").execute().data
+    return statistics_from_aggregates(questions, summary[0] if summary else {}, daily_rows or [], question_rows or [])
+
+@instrument
+def get_submission_statistics(include_question_stats=True):
+    """Lấy thống kê về các bài nộp
+    
+    Args:
+        include_question_stats: False khi chỉ cần số bài, số học viên, điểm trung bình
+            và số bài theo ngày - khi đó không tải cột responses (question_stats rỗng)
+    """
+    try:
+        supabase = get_supabase_client()
+        if not supabase:
+            st.error("Không thể kết nối đến Supabase.")
+            return None
             
-            question_stats[q_id] = {
-                "question": q["question"],
-                "total_answers": total_answers,
-                "correct_count": correct_count,
-                "correct_percentage": correct_percentage
-            }
+        # Lấy danh sách câu hỏi
+        questions = get_all_questions()
         
-        # Thống kê theo thời gian
-        # Chuyển đổi timestamp sang datetime cho dễ đọc
-        for s in submissions:
-            # Nếu timestamp đã ở dạng datetime (từ PostgreSQL)
-            if isinstance(s["timestamp"], (str, datetime)):
-                if isinstance(s["timestamp"], str):
-                    try:
-                        s["datetime"] = datetime.fromisoformat(s["timestamp"].replace("Z", "+00:00"))
-                    except:
-                        s["datetime"] = datetime.now()  # Giá trị mặc định nếu không thể parse
-                else:
-                    s["datetime"] = s["timestamp"]
-            else:
-                # Nếu vẫn còn lưu dạng Unix timestamp (dữ liệu cũ)
-                try:
-                    s["datetime"] = datetime.fromtimestamp(s["timestamp"])
-                except:
-                    s["datetime"] = datetime.now()
-        
-        # Nhóm theo ngày
-        submissions_by_date = {}
-        for s in submissions:
-            date_str = s["datetime"].strftime("%Y-%m-%d")
-            if date_str not in submissions_by_date:
-                submissions_by_date[date_str] = []
-            submissions_by_date[date_str].append(s)
-        
-        # Tính số lượng bài nộp theo ngày
-        daily_counts = {date: len(subs) for date, subs in submissions_by_date.items()}
-        
-        # Kết quả thống kê
-        stats = {
-            "total_submissions": total_submissions,
-            "student_count": student_count,
-            "avg_score": avg_score,
-            "avg_percentage": avg_percentage,
-            "total_possible_score": total_possible_score,
-            "question_stats": question_stats,
-            "daily_counts": daily_counts
-        }
+        if _statistics_views["available"]:
+            try:
+                stats = _fetch_statistics_from_views(supabase, questions, include_question_stats)
+                if not include_question_stats:
+                    stats["question_stats"] = {}
+                return stats
+            except Exception as e:
+                # Database chưa có view => tắt hẳn; lỗi khác chỉ tổng hợp phía ứng dụng cho lần này
+                if _is_missing_object(e, *_STATISTICS_VIEWS):
+                    _statistics_views["available"] = False
+                print(f"Không dùng được view thống kê, chuyển sang tổng hợp phía ứng dụng: {e}")
         
+        # Đọc bài nộp theo trang (chỉ các cột cần thiết) và tổng hợp ngay khi đọc,
+        # bộ nhớ không tăng theo số bài nộp; responses được giải mã trong bộ tổng hợp
+        columns = ["user_email", "score", "timestamp"]
+        if include_question_stats:
+            columns.append("responses")
+        submissions = iter_submissions(columns=columns, decode=False)
+        stats = aggregate_submission_statistics(submissions, questions)
+        if not include_question_stats:
+            stats["question_stats"] = {}
         return stats
     except Exception as e:
         st.error(f"Lỗi khi lấy thống kê bài nộp: {e}")
         return None
     
-def get_all_users(role=None):
+# Nhiều phiên mở báo cáo cùng lúc chỉ gửi một truy vấn danh sách người dùng
+_users_flight = SingleFlight("users")
+
+def _query_users(supabase, role, select_columns):
+    """Truy vấn bảng users theo vai trò, trả về các dòng dữ liệu (lỗi truy vấn được ném ra)"""
+    if role is None:
+        # Lấy tất cả users
+        return supabase.table('users').select(select_columns).execute().data
+    if not isinstance(role, list):
+        # Lọc theo một role
+        return supabase.table('users').select(select_columns).eq('role', role).execute().data
+    # Lọc theo nhiều roles (OR condition)
+    if len(role) == 1:
+        return supabase.table('users').select(select_columns).eq('role', role[0]).execute().data
+    # Sử dụng .in_() nếu có nhiều roles, nếu không hỗ trợ thì query từng cái
+    query = supabase.table('users').select(select_columns)
+    # Thử dùng .in_() nếu có, nếu không thì query riêng rồi merge
+    try:
+        return query.in_('role', role).execute().data
+    except:
+        # Fallback: query từng role rồi merge
+        all_data = []
+        for r in role:
+            try:
+                result = supabase.table('users').select(select_columns).eq('role', r).execute()
+                if result.data:
+                    all_data.extend(result.data)
+            except:
+                pass
+        # Loại bỏ duplicate theo email
+        seen_emails = set()
+        unique_data = []
+        for item in all_data:
+            email = item.get('email')
+            if email and email not in seen_emails:
+                seen_emails.add(email)
+                unique_data.append(item)
+        return unique_data
+
+@instrument
+def get_all_users(role=None, columns="*"):
     """Lấy danh sách tất cả người dùng, có thể lọc theo vai trò
     
     Args:
         role: None để lấy tất cả, string cho một role, hoặc list cho nhiều roles
               Các role hợp lệ: "Học viên", "student", "admin", "admin"
+        columns: "*" hoặc danh sách cột cần lấy (vd. USER_LIST_COLUMNS)
     """
     try:
         supabase = get_supabase_client()
@@ -508,54 +1230,24 @@ def get_all_users(role=None):
             st.error("Không thể kết nối đến Supabase.")
             return []
         
-        # Lấy tất cả users từ database
+        select_columns = _select_columns(columns, required=("email",))
+        
+        # Lấy users từ database; các dòng trả về được dùng chung giữa các phiên
+        # đang truy vấn giống nhau nên chỉ đọc, không sửa
         try:
-            if role is None:
-                # Lấy tất cả users
-                response = supabase.table('users').select('*').execute()
-            elif isinstance(role, list):
-                # Lọc theo nhiều roles (OR condition)
-                if len(role) == 1:
-                    response = supabase.table('users').select('*').eq('role', role[0]).execute()
-                else:
-                    # Sử dụng .in_() nếu có nhiều roles, nếu không hỗ trợ thì query từng cái
-                    query = supabase.table('users').select('*')
-                    # Thử dùng .in_() nếu có, nếu không thì query riêng rồi merge
-                    try:
-                        response = query.in_('role', role).execute()
-                    except:
-                        # Fallback: query từng role rồi merge
-                        all_data = []
-                        for r in role:
-                            try:
-                                result = supabase.table('users').select('*').eq('role', r).execute()
-                                if result.data:
-                                    all_data.extend(result.data)
-                            except:
-                                pass
-                        # Loại bỏ duplicate theo email
-                        seen_emails = set()
-                        unique_data = []
-                        for item in all_data:
-                            email = item.get('email')
-                            if email and email not in seen_emails:
-                                seen_emails.add(email)
-                                unique_data.append(item)
-                        response = type('obj', (object,), {'data': unique_data})()
-            else:
-                # Lọc theo một role
-                response = supabase.table('users').select('*').eq('role', role).execute()
+            key = (tuple(role) if isinstance(role, list) else role, select_columns)
+            rows = _users_flight.do(key, lambda: _query_users(supabase, role, select_columns))
         except Exception as query_error:
             print(f"Lỗi query Supabase: {query_error}")
             st.error(f"Lỗi khi truy vấn bảng 'users': {str(query_error)}")
             return []
         
-        if not response.data:
+        if not rows:
             print(f"Không có dữ liệu users trong database (role={role})")
             return []
         
         users = []
-        for user in response.data:
+        for user in rows:
             try:
                 users.append({
                     "email": user.get("email", ""),
@@ -577,10 +1269,12 @@ def get_all_users(role=None):
         st.error(f"Lỗi khi lấy danh sách người dùng: {e}")
         return []
 
+@instrument
 def get_all_students():
     """Lấy tất cả users có role là "Học viên", "student", hoặc "admin" để hiển thị trong báo cáo"""
-    return get_all_users(role=["Học viên", "student", "admin"])
+    return get_all_users(role=["Học viên", "student", "admin"], columns=USER_LIST_COLUMNS)
 
+@instrument
 def create_user_if_not_exists(email, password, full_name="", role="Học viên", class_name=""):
     """Tạo người dùng mới nếu chưa tồn tại. Trả về True nếu tạo thành công, False nếu lỗi"""
     try:
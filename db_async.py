@@ -0,0 +1,94 @@
+"""Bản async của các hàm đọc dữ liệu trong database_helper và tải song song.
+
+Client Supabase/SQLite là đồng bộ nên mỗi hàm ``*_async`` chạy hàm gốc trong
+một luồng (``asyncio.to_thread``). Luồng đó được gắn ngữ cảnh của phiên
+Streamlit đang chạy (để ``st.error`` trong hàm gốc vẫn hiện đúng phiên) và
+rerun đang đo của db_metrics.
+
+Trang cần nhiều dữ liệu độc lập gọi ``fetch_concurrently`` để chờ tất cả
+cùng lúc: thời gian tải ≈ truy vấn chậm nhất thay vì tổng các truy vấn::
+
+    data = fetch_concurrently(
+        questions=get_all_questions_async(),
+        students=get_all_students_async(),
+    )
+    questions, students = data["questions"], data["students"]
+"""
+import asyncio
+import functools
+import threading
+
+import db_metrics
+import database_helper
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # Streamlit cũ hoặc chạy ngoài Streamlit (benchmark, script)
+    add_script_run_ctx = get_script_run_ctx = None
+
+
+def _script_run_ctx():
+    if get_script_run_ctx is None:
+        return None
+    try:
+        return get_script_run_ctx(suppress_warning=True)
+    except TypeError:  # Streamlit chưa có suppress_warning
+        return get_script_run_ctx()
+
+
+async def run_in_thread(func, *args, **kwargs):
+    """Chạy hàm đồng bộ func trong luồng riêng, giữ ngữ cảnh Streamlit và db_metrics của luồng gọi"""
+    ctx = _script_run_ctx()
+    rerun = db_metrics.current_rerun()
+
+    def call():
+        thread = threading.current_thread()
+        if ctx is not None:
+            add_script_run_ctx(thread, ctx)
+        db_metrics.bind_rerun(rerun)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Luồng của executor được dùng lại cho việc khác
+            db_metrics.bind_rerun(None)
+            if ctx is not None:
+                add_script_run_ctx(thread, None)
+
+    return await asyncio.to_thread(call)
+
+
+def _async_variant(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_in_thread(func, *args, **kwargs)
+
+    wrapper.__name__ = wrapper.__qualname__ = f"{func.__name__}_async"
+    return wrapper
+
+
+get_all_questions_async = _async_variant(database_helper.get_all_questions)
+get_question_by_id_async = _async_variant(database_helper.get_question_by_id)
+get_user_submissions_async = _async_variant(database_helper.get_user_submissions)
+get_all_submissions_async = _async_variant(database_helper.get_all_submissions)
+get_submission_statistics_async = _async_variant(database_helper.get_submission_statistics)
+get_all_users_async = _async_variant(database_helper.get_all_users)
+get_all_students_async = _async_variant(database_helper.get_all_students)
+
+
+async def _gather(names, awaitables):
+    # Chờ mọi lần tải xong (luồng không hủy được giữa chừng) rồi mới ném lỗi đầu tiên
+    results = await asyncio.gather(*awaitables, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return dict(zip(names, results))
+
+
+def fetch_concurrently(**awaitables):
+    """Chạy song song các lần tải (tên=coroutine) và chờ tất cả xong; trả về dict tên -> kết quả.
+
+    Gọi từ code đồng bộ (script Streamlit không có event loop đang chạy). Lỗi của
+    bất kỳ lần tải nào được ném lại sau khi các lần tải khác kết thúc.
+    """
+    names = list(awaitables)
+    return asyncio.run(_gather(names, [awaitables[name] for name in names]))
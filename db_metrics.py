@@ -0,0 +1,271 @@
+"""Đo truy cập database theo từng lần chạy lại (rerun) của Streamlit.
+
+Các hàm truy cập dữ liệu trong database_helper được bọc bằng ``@instrument``:
+mỗi lần gọi ghi lại số lần gọi, số dòng, số byte (ước lượng theo JSON) và
+thời gian. app.py đánh dấu đầu/cuối mỗi rerun (``start_rerun``/``finish_rerun``)
+và trang đang mở (``set_page``), nên có thể xem:
+
+- trang nào tốn nhiều thời gian chờ database nhất
+- hàm nào bị gọi lặp lại nhiều lần trong một rerun (dấu hiệu N+1)
+
+Thời gian chờ database của một rerun là tổng thời gian các lần gọi; khi tải
+song song (db_async.py) con số này có thể lớn hơn thời gian thực của rerun.
+
+Bật bằng biến môi trường ``DB_METRICS=1`` hoặc nút bật/tắt trong trang quản
+trị. Khi tắt, mỗi lần gọi chỉ tốn thêm một lần kiểm tra cờ.
+"""
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# Số rerun gần nhất được giữ lại để tổng hợp
+RERUN_HISTORY = int(os.environ.get("DB_METRICS_HISTORY", "500"))
+# Một hàm bị gọi từ ngần này lần trở lên trong một rerun được coi là nghi N+1
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("DB_METRICS_N_PLUS_ONE", "5"))
+DEFAULT_PAGE = "Trang chào / đăng nhập"
+
+_state = {"enabled": os.environ.get("DB_METRICS", "").strip().lower() in ("1", "true", "yes", "on")}
+# Rerun đang chạy và độ sâu lời gọi lồng nhau của từng luồng (mỗi phiên Streamlit một luồng)
+_local = threading.local()
+_history = deque(maxlen=RERUN_HISTORY)
+_history_lock = threading.Lock()
+# Các luồng tải song song (db_async.py) cùng ghi vào rerun của phiên
+_record_lock = threading.Lock()
+
+
+def is_enabled():
+    return _state["enabled"]
+
+
+def set_enabled(enabled):
+    """Bật/tắt đo (áp dụng cho toàn bộ tiến trình)"""
+    _state["enabled"] = bool(enabled)
+
+
+def reset():
+    """Xóa các rerun đã ghi"""
+    with _history_lock:
+        _history.clear()
+
+
+def start_rerun(page=DEFAULT_PAGE):
+    """Bắt đầu ghi cho một rerun trên luồng hiện tại"""
+    if not _state["enabled"]:
+        _local.rerun = None
+        return
+    _local.rerun = {
+        "page": page,
+        "started_at": time.time(),
+        "started": time.perf_counter(),
+        "calls": 0,
+        "rows": 0,
+        "bytes": 0,
+        "db_seconds": 0.0,
+        "functions": {},
+    }
+
+
+def set_page(page):
+    """Gán tên trang cho rerun đang chạy"""
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        rerun["page"] = page
+
+
+def current_rerun():
+    """Rerun đang ghi trên luồng hiện tại (None nếu không đo)"""
+    return getattr(_local, "rerun", None)
+
+
+def bind_rerun(rerun):
+    """Ghi các lần gọi trên luồng hiện tại vào rerun (của luồng khác); None để bỏ gắn"""
+    _local.rerun = rerun
+
+
+def finish_rerun():
+    """Kết thúc rerun hiện tại và lưu vào lịch sử"""
+    rerun = getattr(_local, "rerun", None)
+    _local.rerun = None
+    if rerun is None:
+        return
+    rerun["wall_seconds"] = time.perf_counter() - rerun.pop("started")
+    with _history_lock:
+        _history.append(rerun)
+
+
+def _json_default(value):
+    # models.Submission: kích thước theo dữ liệu thô của dòng, không giải mã cột JSON
+    to_row = getattr(value, "to_row", None)
+    return to_row() if to_row is not None else str(value)
+
+
+def _result_size(result):
+    """(số dòng, số byte JSON) của giá trị trả về"""
+    if result is None or isinstance(result, bool):
+        return 0, 0
+    # Danh sách: số phần tử; dict/số (vd. count_only): một dòng
+    rows = len(result) if isinstance(result, (list, tuple)) else 1
+    try:
+        size = len(json.dumps(result, ensure_ascii=False, default=_json_default).encode("utf-8"))
+    except (TypeError, ValueError):
+        size = 0
+    return rows, size
+
+
+def _record(name, seconds, rows, size, depth):
+    rerun = getattr(_local, "rerun", None)
+    if rerun is None:
+        return
+    with _record_lock:
+        stats = rerun["functions"].get(name)
+        if stats is None:
+            stats = rerun["functions"][name] = {"calls": 0, "rows": 0, "bytes": 0, "seconds": 0.0}
+        stats["calls"] += 1
+        stats["rows"] += rows
+        stats["bytes"] += size
+        stats["seconds"] += seconds
+        # Lời gọi lồng nhau (vd. get_all_submissions -> iter_submissions) chỉ tính
+        # một lần vào tổng của rerun
+        if depth == 0:
+            rerun["calls"] += 1
+            rerun["rows"] += rows
+            rerun["bytes"] += size
+            rerun["db_seconds"] += seconds
+
+
+def _track_generator(name, generator, depth):
+    """Bọc generator (vd. iter_submissions): tính thời gian trong từng bước và số dòng đã trả về"""
+    seconds = 0.0
+    rows = 0
+    size = 0
+    try:
+        while True:
+            _local.depth = depth + 1
+            start = time.perf_counter()
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+            finally:
+                seconds += time.perf_counter() - start
+                _local.depth = depth
+            rows += 1
+            size += _result_size(item)[1]
+            yield item
+    finally:
+        generator.close()
+        _record(name, seconds, rows, size, depth)
+
+
+def instrument(func):
+    """Decorator đo một hàm truy cập database (không làm gì thêm khi đang tắt)"""
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _state["enabled"]:
+            return func(*args, **kwargs)
+        depth = getattr(_local, "depth", 0)
+        _local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            _local.depth = depth
+        if inspect.isgenerator(result):
+            return _track_generator(name, result, depth)
+        rows, size = _result_size(result)
+        _record(name, seconds, rows, size, depth)
+        return result
+
+    return wrapper
+
+
+def recent_reruns():
+    """Bản sao các rerun đã ghi (cũ trước, mới sau)"""
+    with _history_lock:
+        return list(_history)
+
+
+def page_summary(reruns=None):
+    """Mỗi trang một dòng, trang chờ database lâu nhất trước"""
+    pages = {}
+    for rerun in recent_reruns() if reruns is None else reruns:
+        page = pages.setdefault(rerun["page"], {
+            "page": rerun["page"], "reruns": 0, "calls": 0, "rows": 0, "bytes": 0,
+            "db_seconds": 0.0, "max_db_seconds": 0.0, "wall_seconds": 0.0,
+        })
+        page["reruns"] += 1
+        page["calls"] += rerun["calls"]
+        page["rows"] += rerun["rows"]
+        page["bytes"] += rerun["bytes"]
+        page["db_seconds"] += rerun["db_seconds"]
+        page["wall_seconds"] += rerun["wall_seconds"]
+        page["max_db_seconds"] = max(page["max_db_seconds"], rerun["db_seconds"])
+    summary = []
+    for page in pages.values():
+        n = page["reruns"]
+        summary.append({
+            "page": page["page"],
+            "reruns": n,
+            "avg_calls": page["calls"] / n,
+            "avg_rows": page["rows"] / n,
+            "avg_bytes": page["bytes"] / n,
+            "avg_db_seconds": page["db_seconds"] / n,
+            "max_db_seconds": page["max_db_seconds"],
+            "avg_wall_seconds": page["wall_seconds"] / n,
+        })
+    summary.sort(key=lambda row: row["avg_db_seconds"], reverse=True)
+    return summary
+
+
+def repeated_calls(threshold=None, reruns=None):
+    """Các hàm bị gọi từ threshold lần trở lên trong một rerun (nghi N+1), nhiều nhất trước"""
+    threshold = N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+    offenders = {}
+    for rerun in recent_reruns() if reruns is None else reruns:
+        for name, stats in rerun["functions"].items():
+            if stats["calls"] < threshold:
+                continue
+            key = (rerun["page"], name)
+            row = offenders.setdefault(key, {
+                "page": rerun["page"], "function": name, "reruns": 0,
+                "max_calls": 0, "calls": 0, "seconds": 0.0,
+            })
+            row["reruns"] += 1
+            row["calls"] += stats["calls"]
+            row["seconds"] += stats["seconds"]
+            row["max_calls"] = max(row["max_calls"], stats["calls"])
+    result = []
+    for row in offenders.values():
+        result.append({
+            "page": row["page"],
+            "function": row["function"],
+            "reruns": row["reruns"],
+            "max_calls_per_rerun": row["max_calls"],
+            "avg_calls_per_rerun": row["calls"] / row["reruns"],
+            "avg_seconds_per_rerun": row["seconds"] / row["reruns"],
+        })
+    result.sort(key=lambda row: (row["max_calls_per_rerun"], row["avg_seconds_per_rerun"]), reverse=True)
+    return result
+
+
+def function_summary(reruns=None):
+    """Tổng theo từng hàm trên mọi rerun, tốn thời gian nhất trước"""
+    functions = {}
+    for rerun in recent_reruns() if reruns is None else reruns:
+        for name, stats in rerun["functions"].items():
+            row = functions.setdefault(name, {"function": name, "calls": 0, "rows": 0, "bytes": 0, "seconds": 0.0})
+            row["calls"] += stats["calls"]
+            row["rows"] += stats["rows"]
+            row["bytes"] += stats["bytes"]
+            row["seconds"] += stats["seconds"]
+    result = sorted(functions.values(), key=lambda row: row["seconds"], reverse=True)
+    for row in result:
+        row["avg_ms"] = row["seconds"] / row["calls"] * 1000 if row["calls"] else 0.0
+    return result
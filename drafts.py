@@ -0,0 +1,186 @@
+"""Lưu nháp bài đang làm theo kiểu write-behind.
+
+Form làm bài gửi bản nháp của lượt hiện tại (câu trả lời đã nhận được, trang
+đang xem) vào bộ đệm trong bộ nhớ bằng ``save_draft`` - không truy vấn
+database. Một luồng nền ghi các bản nháp đang chờ thành từng lô (một lệnh RPC
+save_submission_drafts, sql/006_submission_drafts.sql) mỗi
+``DRAFT_FLUSH_INTERVAL`` giây:
+
+- Nhiều lần lưu của cùng một học viên giữa hai lần ghi được gộp lại, chỉ bản
+  mới nhất được ghi.
+- Bản nháp giống hệt bản đã ghi trước đó được bỏ qua.
+- Nộp bài thành công => ``discard_draft``: bản nháp bị xóa trong lần ghi sau.
+- Lô ghi lỗi (mất kết nối...) được giữ lại để ghi lần sau, trừ khi học viên đã
+  có bản nháp mới hơn.
+
+Khi học viên quay lại (trình duyệt mất kết nối, mở phiên mới), ``load_draft``
+trả về bản nháp đang chờ trong bộ nhớ hoặc bản đã ghi trong database.
+
+Tắt bằng biến môi trường ``DRAFT_AUTOSAVE=0``.
+"""
+import atexit
+import os
+import threading
+import time
+
+import database_helper
+
+# Số giây giữa hai lần ghi các bản nháp đang chờ
+DRAFT_FLUSH_INTERVAL = float(os.environ.get("DRAFT_FLUSH_INTERVAL", "10"))
+# Số bản nháp tối đa mỗi lệnh ghi
+DRAFT_FLUSH_BATCH_SIZE = int(os.environ.get("DRAFT_FLUSH_BATCH_SIZE", "200"))
+
+_state = {"enabled": os.environ.get("DRAFT_AUTOSAVE", "1").strip().lower() not in ("0", "false", "no", "off")}
+_lock = threading.Lock()
+# email -> bản nháp chờ ghi, hoặc None (chờ xóa)
+_pending = {}
+# email -> dấu vân tay bản nháp đã ghi gần nhất (bỏ qua bản giống hệt)
+_written = {}
+_stats = {"saved": 0, "coalesced": 0, "unchanged": 0, "flushes": 0, "written": 0, "deleted": 0, "errors": 0}
+_flusher = {"thread": None}
+# Chỉ một lần ghi tại một thời điểm (luồng nền, flush() khi thoát)
+_flush_lock = threading.Lock()
+
+
+def is_enabled():
+    return _state["enabled"] and database_helper.submission_drafts_available()
+
+
+def set_enabled(enabled):
+    """Bật/tắt lưu nháp (áp dụng cho toàn bộ tiến trình)"""
+    _state["enabled"] = bool(enabled)
+
+
+def _fingerprint(draft):
+    return hash((draft["attempt_index"], draft["page"],
+                 tuple(sorted((q_id, tuple(answer)) for q_id, answer in draft["responses"].items()))))
+
+
+def save_draft(email, attempt_index, responses, page=0):
+    """Đưa bản nháp của lượt làm bài hiện tại vào hàng chờ ghi (không truy vấn database)
+
+    Args:
+        responses: {question_id: list câu trả lời}, chỉ cần các câu đã trả lời
+    """
+    if not is_enabled():
+        return
+    draft = {
+        "user_email": email,
+        "attempt_index": attempt_index,
+        "page": page,
+        "responses": {q_id: list(answer) for q_id, answer in responses.items()},
+    }
+    with _lock:
+        if _pending.get(email) is not None:
+            _stats["coalesced"] += 1
+        _pending[email] = draft
+        _stats["saved"] += 1
+    _ensure_flusher()
+
+
+def discard_draft(email):
+    """Xóa bản nháp của học viên (sau khi nộp bài) trong lần ghi sau"""
+    if not is_enabled():
+        return
+    with _lock:
+        _pending[email] = None
+    _ensure_flusher()
+
+
+def load_draft(email):
+    """Bản nháp gần nhất của học viên (dict attempt_index, page, responses) hoặc None"""
+    if not is_enabled():
+        return None
+    with _lock:
+        if email in _pending:
+            return _pending[email]
+    return database_helper.get_submission_draft(email)
+
+
+def flush():
+    """Ghi ngay mọi bản nháp đang chờ; trả về số bản nháp đã ghi"""
+    with _flush_lock:
+        with _lock:
+            batch = dict(_pending)
+            _pending.clear()
+            if batch:
+                _stats["flushes"] += 1
+
+        drafts = []
+        deleted = []
+        unchanged = 0
+        for email, draft in batch.items():
+            if draft is None:
+                deleted.append(email)
+            elif _written.get(email) == _fingerprint(draft):
+                unchanged += 1
+            else:
+                drafts.append(draft)
+        if unchanged:
+            with _lock:
+                _stats["unchanged"] += unchanged
+
+        written = 0
+        for start in range(0, max(len(drafts), len(deleted)), DRAFT_FLUSH_BATCH_SIZE):
+            chunk = drafts[start:start + DRAFT_FLUSH_BATCH_SIZE]
+            deleted_chunk = deleted[start:start + DRAFT_FLUSH_BATCH_SIZE]
+            result = database_helper.write_submission_drafts(chunk, deleted_chunk)
+            if result is None:
+                _requeue(chunk, deleted_chunk)
+                continue
+            written += result
+            with _lock:
+                _stats["written"] += len(chunk)
+                _stats["deleted"] += len(deleted_chunk)
+            for draft in chunk:
+                _written[draft["user_email"]] = _fingerprint(draft)
+            for email in deleted_chunk:
+                _written.pop(email, None)
+        return written
+
+
+def _requeue(drafts, deleted):
+    """Giữ lại lô ghi lỗi cho lần sau (bỏ nếu database không có bảng bản nháp)"""
+    with _lock:
+        _stats["errors"] += 1
+        if not database_helper.submission_drafts_available():
+            return
+        # Bản nháp mới hơn (đến trong lúc đang ghi) được ưu tiên
+        for draft in drafts:
+            _pending.setdefault(draft["user_email"], draft)
+        for email in deleted:
+            _pending.setdefault(email, None)
+
+
+def _run():
+    while True:
+        time.sleep(DRAFT_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            print(f"Lỗi khi ghi bản nháp: {type(e).__name__}: {e}")
+
+
+def _ensure_flusher():
+    if _flusher["thread"] is not None:
+        return
+    with _lock:
+        if _flusher["thread"] is None:
+            _flusher["thread"] = threading.Thread(target=_run, name="draft-flusher", daemon=True)
+            _flusher["thread"].start()
+
+
+def get_stats():
+    """Thống kê: số lần lưu, số lần gộp, số bản nháp đã ghi/xóa, số bản đang chờ..."""
+    with _lock:
+        return dict(_stats, pending=len(_pending))
+
+
+def reset_stats():
+    with _lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+# Ghi nốt các bản nháp đang chờ khi tiến trình dừng bình thường
+atexit.register(flush)
@@ -5,8 +5,10 @@ from database_helper import (
     get_supabase_client, 
     get_all_questions, 
     get_all_users,
+    iter_submissions,
     update_submission
 )
+from models import Submission, decode_json_object
 
 def essay_grading_interface():
     """Interface cho giảng viên chấm điểm câu hỏi tự luận"""
@@ -19,10 +21,6 @@ def essay_grading_interface():
             st.error("Không thể kết nối đến database")
             return
             
-        # Lấy tất cả bài nộp có câu hỏi tự luận
-        submissions_result = supabase.table("submissions").select("*").execute()
-        submissions = submissions_result.data if submissions_result.data else []
-        
         questions = get_all_questions()
         students = get_all_users(role="student")
         
@@ -32,6 +30,19 @@ def essay_grading_interface():
         if not essay_questions:
             st.info("Không có câu hỏi tự luận nào trong hệ thống.")
             return
+        
+        # Đọc bài nộp theo trang, chỉ giữ lại các bài có trả lời tự luận
+        # (và chỉ phần responses của câu tự luận) để bộ nhớ không tăng theo cả bảng
+        essay_ids = [str(eq.get("id")) for eq in essay_questions]
+        submissions = []
+        for submission in iter_submissions(
+            columns=("id", "user_email", "timestamp", "responses", "essay_grades", "essay_comments")
+        ):
+            responses = submission.get("responses", {})
+            essay_responses = {eq_id: responses[eq_id] for eq_id in essay_ids if responses.get(eq_id)}
+            if essay_responses:
+                submission["responses"] = essay_responses
+                submissions.append(submission)
             
         if not submissions:
             st.info("Chưa có bài nộp nào để chấm.")
@@ -44,19 +55,9 @@ def essay_grading_interface():
         graded_essays = 0
         
         for submission in submissions:
-            essay_grades = submission.get("essay_grades", {})
-            if isinstance(essay_grades, str):
-                try:
-                    essay_grades = json.loads(essay_grades)
-                except:
-                    essay_grades = {}
+            essay_grades = decode_json_object(submission.get("essay_grades"))
                     
             responses = submission.get("responses", {})
-            if isinstance(responses, str):
-                try:
-                    responses = json.loads(responses)
-                except:
-                    responses = {}
             
             for eq in essay_questions:
                 eq_id = str(eq.get("id"))
@@ -90,19 +91,9 @@ def essay_grading_interface():
         filtered_submissions = []
         
         for submission in submissions:
-            essay_grades = submission.get("essay_grades", {})
-            if isinstance(essay_grades, str):
-                try:
-                    essay_grades = json.loads(essay_grades)
-                except:
-                    essay_grades = {}
+            essay_grades = decode_json_object(submission.get("essay_grades"))
                     
-            responses = submission.get("responses", {})
-            if isinstance(responses, str):
-                try:
-                    responses = json.loads(responses)
-                except:
-                    responses = {}
+            responses = decode_json_object(submission.get("responses"))
             
             for eq in essay_questions:
                 eq_id = str(eq.get("id"))
@@ -176,12 +167,7 @@ def essay_grading_interface():
                 st.write(f"**Điểm tối đa:** {question.get('score', 0)}")
                 
                 # Lấy câu trả lời
-                responses = submission.get("responses", {})
-                if isinstance(responses, str):
-                    try:
-                        responses = json.loads(responses)
-                    except:
-                        responses = {}
+                responses = decode_json_object(submission.get("responses"))
                 
                 q_id = str(question["id"])
                 essay_answer = responses.get(q_id, [""])[0] if responses.get(q_id) else ""
@@ -211,12 +197,7 @@ def essay_grading_interface():
                     
                     with col2:
                         # Lấy nhận xét hiện tại
-                        essay_comments = submission.get("essay_comments", {})
-                        if isinstance(essay_comments, str):
-                            try:
-                                essay_comments = json.loads(essay_comments)
-                            except:
-                                essay_comments = {}
+                        essay_comments = decode_json_object(submission.get("essay_comments"))
                         
                         current_comment = essay_comments.get(q_id, "")
                         
@@ -263,16 +244,11 @@ def update_essay_grade(submission_id, question_id, grade, comment):
             print("❌ Không tìm thấy submission")
             return False
             
-        submission = result.data[0]
+        submission = Submission.from_row(result.data[0])
         print(f"📊 Điểm hiện tại: {submission.get('score', 0)}")
         
         # Cập nhật essay_grades
-        essay_grades = submission.get("essay_grades", {})
-        if isinstance(essay_grades, str):
-            try:
-                essay_grades = json.loads(essay_grades)
-            except:
-                essay_grades = {}
+        essay_grades = submission.essay_grades
         
         # 🔧 SỬA: Đảm bảo grade là số và lưu dưới dạng number trong JSON
         try:
@@ -286,12 +262,7 @@ def update_essay_grade(submission_id, question_id, grade, comment):
         print(f"📝 Cập nhật điểm câu {question_id}: {old_grade} → {grade_number}")
         
         # Cập nhật essay_comments
-        essay_comments = submission.get("essay_comments", {})
-        if isinstance(essay_comments, str):
-            try:
-                essay_comments = json.loads(essay_comments)
-            except:
-                essay_comments = {}
+        essay_comments = submission.essay_comments
         
         essay_comments[question_id] = str(comment)
         
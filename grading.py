@@ -0,0 +1,486 @@
+"""Chấm điểm bài làm bằng khóa đáp án đã biên dịch.
+
+Mỗi câu hỏi được biên dịch một lần thành ``AnswerKey`` (bất biến):
+
+- ``option_index``: ánh xạ nội dung đáp án -> số thứ tự (bắt đầu từ 1)
+- ``correct_mask``: tập đáp án đúng dưới dạng bitmask (bit i-1 <=> đáp án i)
+- ``kind``: loại câu hỏi (Checkbox / Combobox / Essay)
+
+Khi chấm, mỗi đáp án học viên chọn chỉ cần một lần tra dict và một phép OR
+bit (qua ``option_bits``), thay vì ``answers.index(...)`` và dựng lại ``set(correct)`` mỗi lần.
+Quy tắc chấm giữ nguyên như ``check_answer_correctness`` trước đây:
+
+- Checkbox: tập đáp án đã chọn phải trùng khớp tập đáp án đúng
+- Combobox: chọn đúng một đáp án và đáp án đó nằm trong tập đúng
+- Essay: đúng nếu có nội dung (không rỗng)
+
+Kết quả từng câu hỏi của một bài làm (đúng / sai / bỏ qua, điểm đạt được)
+được tính một lần lúc nộp bài (``question_results``) và lưu cùng bài nộp; mỗi
+mục kèm ``tag`` của khóa đáp án lúc chấm nên khi hiển thị lại chỉ những câu
+hỏi đã bị sửa đáp án / điểm mới phải chấm lại (``resolve_question_result``).
+
+Khi cần chấm cả lớp, ``encode_responses`` mã hóa mọi bài làm thành ma trận
+NumPy (mỗi câu Checkbox/Combobox một cột bitmask, mỗi câu Essay một cột cờ
+có nội dung) và ``grade_matrix`` tính đúng/sai, tổng điểm bằng phép toán trên
+cả ma trận. Sửa đáp án đúng thì chỉ cần chấm lại ma trận, không mã hóa lại.
+"""
+import hashlib
+import json
+from types import MappingProxyType
+from typing import NamedTuple, Mapping, Optional
+
+import numpy as np
+
+KIND_UNKNOWN = 0
+KIND_CHECKBOX = 1
+KIND_COMBOBOX = 2
+KIND_ESSAY = 3
+
+_KIND_BY_TYPE = {
+    "Checkbox": KIND_CHECKBOX,
+    "Combobox": KIND_COMBOBOX,
+    "Essay": KIND_ESSAY,
+}
+
+# Bộ đệm khóa đáp án cho câu hỏi dạng dict thường (không qua bộ đệm danh mục)
+_ANSWER_KEY_CACHE_LIMIT = 4096
+_answer_key_cache = {}
+
+
+class AnswerKey(NamedTuple):
+    """Khóa đáp án đã biên dịch của một câu hỏi"""
+    question_key: str
+    kind: int
+    option_index: Mapping[str, int]
+    # Nội dung đáp án -> bit tương ứng (1 << (vị trí - 1)); chỉ đọc, dùng khi chấm
+    option_bits: dict
+    correct_mask: int
+    # True nếu "correct" chứa giá trị không phải số thứ tự hợp lệ (<= 0, chữ...)
+    # => Checkbox không bao giờ khớp, giống so sánh tập hợp trước đây
+    unmatchable: bool
+    score: float
+    # Dấu vân tay nội dung chấm điểm (loại, đáp án, đáp án đúng, điểm): đổi
+    # khi câu hỏi được sửa theo cách làm thay đổi kết quả chấm
+    tag: str
+
+    def selected_mask(self, student_answers):
+        """Bitmask các đáp án (có trong danh sách) mà học viên đã chọn"""
+        option_bits = self.option_bits
+        mask = 0
+        for ans in student_answers:
+            try:
+                mask |= option_bits.get(ans, 0)
+            except TypeError:
+                continue
+        return mask
+
+    def is_correct(self, student_answers):
+        """Kiểm tra câu trả lời của học viên cho câu hỏi này"""
+        if not student_answers:
+            return False
+
+        kind = self.kind
+        if kind == KIND_CHECKBOX:
+            if self.unmatchable:
+                return False
+            return self.selected_mask(student_answers) == self.correct_mask
+
+        if kind == KIND_COMBOBOX:
+            if len(student_answers) != 1:
+                return False
+            try:
+                return bool(self.option_bits.get(student_answers[0], 0) & self.correct_mask)
+            except TypeError:
+                return False
+
+        if kind == KIND_ESSAY:
+            first = student_answers[0]
+            return isinstance(first, str) and first.strip() != ""
+
+        return False
+
+
+def _correct_positions(correct):
+    """Chuyển danh sách đáp án đúng thành (bitmask, unmatchable)"""
+    mask = 0
+    unmatchable = False
+    for value in correct or ():
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if isinstance(value, int) and not isinstance(value, bool) and value >= 1:
+            mask |= 1 << (value - 1)
+        else:
+            unmatchable = True
+    return mask, unmatchable
+
+
+def compile_answer_key(question):
+    """Biên dịch một câu hỏi (dict) thành AnswerKey"""
+    answers = question.get("answers") or ()
+    option_index = {}
+    for position, text in enumerate(answers, start=1):
+        try:
+            # Giữ vị trí xuất hiện đầu tiên, giống answers.index(text)
+            option_index.setdefault(text, position)
+        except TypeError:
+            continue
+
+    correct_mask, unmatchable = _correct_positions(question.get("correct"))
+    kind = _KIND_BY_TYPE.get(question.get("type"), KIND_UNKNOWN)
+    score = question.get("score", 0)
+    return AnswerKey(
+        question_key=str(question.get("id")),
+        kind=kind,
+        option_index=MappingProxyType(option_index),
+        option_bits={text: 1 << (position - 1) for text, position in option_index.items()},
+        correct_mask=correct_mask,
+        unmatchable=unmatchable,
+        score=score,
+        tag=_answer_key_tag(kind, option_index, correct_mask, unmatchable, score),
+    )
+
+
+def _answer_key_tag(kind, option_index, correct_mask, unmatchable, score):
+    """Băm ổn định (giữa các tiến trình) của nội dung chấm điểm, 12 ký tự hex"""
+    try:
+        score = float(score or 0)
+    except (TypeError, ValueError):
+        score = str(score)
+    content = json.dumps([kind, list(option_index.items()), correct_mask, unmatchable, score],
+                         ensure_ascii=False, default=str)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()[:12]
+
+
+def get_answer_key(question) -> Optional[AnswerKey]:
+    """Lấy khóa đáp án của câu hỏi, chỉ biên dịch khi chưa có.
+
+    Câu hỏi từ bộ đệm danh mục (models.Question) mang sẵn khóa đã biên dịch;
+    các dict khác được tra theo nội dung trong một bộ đệm có giới hạn.
+    """
+    answer_key = getattr(question, "answer_key", None)
+    if answer_key is not None:
+        return answer_key
+
+    try:
+        cache_key = (
+            question.get("id"),
+            question.get("type"),
+            tuple(question.get("answers") or ()),
+            tuple(question.get("correct") or ()),
+            question.get("score", 0),
+        )
+        answer_key = _answer_key_cache.get(cache_key)
+    except TypeError:
+        # Dữ liệu không băm được (đáp án lồng nhau...) => biên dịch trực tiếp
+        return compile_answer_key(question)
+
+    if answer_key is None:
+        answer_key = compile_answer_key(question)
+        if len(_answer_key_cache) >= _ANSWER_KEY_CACHE_LIMIT:
+            _answer_key_cache.clear()
+        _answer_key_cache[cache_key] = answer_key
+    return answer_key
+
+
+def compile_answer_keys(questions):
+    """Biên dịch (hoặc lấy lại) khóa đáp án cho cả danh sách câu hỏi"""
+    return [get_answer_key(q) for q in questions]
+
+
+def check_answer_correctness(student_answers, question):
+    """Kiểm tra đáp án có đúng không.
+    - Checkbox: so khớp tập chỉ số đáp án
+    - Combobox: so khớp một đáp án
+    - Essay: tính là đúng nếu có nội dung (không rỗng)
+    """
+    if not student_answers:
+        return False
+    return get_answer_key(question).is_correct(student_answers)
+
+
+def score_responses(responses, answer_keys):
+    """Tính tổng điểm một bài làm từ các khóa đáp án đã biên dịch.
+
+    Vòng lặp nóng khi chấm cả lớp: chỉ gồm tra dict và phép toán bit.
+    """
+    total_score = 0
+    get_answers = responses.get
+    for answer_key in answer_keys:
+        question_key, kind, _, option_bits, correct_mask, unmatchable, score, _ = answer_key
+        student_answers = get_answers(question_key)
+        if not student_answers:
+            continue
+        try:
+            if kind == KIND_CHECKBOX:
+                mask = 0
+                for ans in student_answers:
+                    mask |= option_bits.get(ans, 0)
+                correct = mask == correct_mask and not unmatchable
+            elif kind == KIND_COMBOBOX:
+                correct = len(student_answers) == 1 and option_bits.get(student_answers[0], 0) & correct_mask
+            elif kind == KIND_ESSAY:
+                first = student_answers[0]
+                correct = isinstance(first, str) and first.strip() != ""
+            else:
+                correct = False
+        except TypeError:
+            # Dữ liệu lạ (đáp án không băm được) => bỏ qua các đáp án đó
+            correct = answer_key.is_correct(student_answers)
+        if correct:
+            total_score += score
+    return total_score
+
+
+def calculate_score(responses, questions):
+    """Tính điểm dựa trên đáp án và câu trả lời"""
+    return score_responses(responses, compile_answer_keys(questions))
+
+
+# Kết quả một câu hỏi trong bài làm
+RESULT_CORRECT = "c"
+RESULT_INCORRECT = "i"
+RESULT_SKIPPED = "s"
+
+
+class QuestionResult(NamedTuple):
+    """Kết quả chấm một câu hỏi: trạng thái (RESULT_*) và điểm đạt được"""
+    status: str
+    points: float
+
+    @property
+    def correct(self):
+        return self.status == RESULT_CORRECT
+
+
+def grade_question(student_answers, answer_key):
+    """Chấm một câu hỏi bằng khóa đáp án: bỏ qua nếu không trả lời"""
+    if not student_answers:
+        return QuestionResult(RESULT_SKIPPED, 0)
+    if answer_key.is_correct(student_answers):
+        return QuestionResult(RESULT_CORRECT, answer_key.score)
+    return QuestionResult(RESULT_INCORRECT, 0)
+
+
+def question_results(responses, questions):
+    """Kết quả từng câu hỏi để lưu cùng bài nộp: {question_id: [trạng thái, điểm, tag]}
+
+    Tính cùng lúc với điểm khi nộp bài; ``tag`` là dấu vân tay khóa đáp án lúc chấm.
+    """
+    results = {}
+    for answer_key in compile_answer_keys(questions):
+        status, points = grade_question(responses.get(answer_key.question_key), answer_key)
+        results[answer_key.question_key] = [status, points, answer_key.tag]
+    return results
+
+
+def resolve_question_result(stored, student_answers, question):
+    """Kết quả một câu hỏi từ mục đã lưu (nếu khóa đáp án chưa đổi), ngược lại chấm lại
+
+    Args:
+        stored: mục [trạng thái, điểm, tag] trong question_results của bài nộp (hoặc None)
+    """
+    answer_key = get_answer_key(question)
+    if isinstance(stored, list) and len(stored) == 3 and stored[2] == answer_key.tag:
+        return QuestionResult(stored[0], stored[1])
+    return grade_question(student_answers, answer_key)
+
+
+# Mã hóa bài làm thành ma trận số nguyên (int64), mỗi hàng một bài làm, mỗi
+# cột một câu hỏi:
+#   -1: responses không có khóa của câu hỏi
+#   -2: có khóa nhưng câu trả lời rỗng
+#   Checkbox: bitmask các đáp án đã chọn
+#   Combobox: bit của đáp án nếu chọn đúng một đáp án, ngược lại 0
+#   Essay:    1 nếu có nội dung, ngược lại 0
+# Bitmask dùng tối đa 63 bit; câu hỏi có đáp án ở vị trí > 63 (hoặc loại câu
+# hỏi lạ) được chấm sẵn khi mã hóa: 1 nếu đúng, 0 nếu sai.
+CODE_MISSING = -1
+CODE_EMPTY = -2
+_MASK_BITS = 63
+_ENCODE_PRECOMPUTED = -1
+
+
+def _fits_mask(answer_key):
+    """True nếu mọi đáp án của câu hỏi có bit nằm trong mã int64"""
+    return max(answer_key.option_index.values(), default=0) <= _MASK_BITS
+
+
+def _encoding_kind(answer_key):
+    if answer_key.kind == KIND_ESSAY:
+        return KIND_ESSAY
+    if answer_key.kind in (KIND_CHECKBOX, KIND_COMBOBOX) and _fits_mask(answer_key):
+        return answer_key.kind
+    return _ENCODE_PRECOMPUTED
+
+
+class ResponseMatrix(NamedTuple):
+    """Các bài làm đã mã hóa theo một danh sách câu hỏi"""
+    # Khóa đáp án lúc mã hóa (mã phụ thuộc danh sách đáp án, không phụ thuộc đáp án đúng)
+    answer_keys: tuple
+    codes: np.ndarray
+
+    def is_compatible(self, answer_keys):
+        """True nếu có thể chấm ma trận này với các khóa đáp án mới (vd. sau khi sửa đáp án đúng)"""
+        if len(answer_keys) != len(self.answer_keys):
+            return False
+        for old, new in zip(self.answer_keys, answer_keys):
+            if old.question_key != new.question_key or old.kind != new.kind:
+                return False
+            if dict(old.option_index) != dict(new.option_index):
+                return False
+            # Cột chấm sẵn chỉ dùng lại được khi khóa đáp án không đổi
+            if _encoding_kind(old) == _ENCODE_PRECOMPUTED and old != new:
+                return False
+        return True
+
+
+class CohortGrades(NamedTuple):
+    """Kết quả chấm cả lớp: mỗi hàng một bài làm, mỗi cột một câu hỏi"""
+    question_keys: tuple
+    # True nếu responses có khóa của câu hỏi (kể cả khi trả lời rỗng)
+    answered: np.ndarray
+    # True nếu câu trả lời không rỗng
+    attempted: np.ndarray
+    correct: np.ndarray
+    # Tổng điểm từng bài làm (float64)
+    scores: np.ndarray
+
+    def answered_counts(self):
+        """Số bài làm có trả lời từng câu hỏi"""
+        return self.answered.sum(axis=0)
+
+    def correct_counts(self):
+        """Số bài làm trả lời đúng từng câu hỏi"""
+        return self.correct.sum(axis=0)
+
+
+def encode_responses(responses_list, questions):
+    """Mã hóa các bài làm (list các dict responses) thành ResponseMatrix.
+
+    Duyệt theo hàng (mỗi bài làm một lần) giống score_responses; phần chấm
+    sau đó chạy trên cả ma trận.
+    """
+    answer_keys = tuple(compile_answer_keys(questions))
+    specs = [
+        (answer_key.question_key, _encoding_kind(answer_key), answer_key.option_bits, answer_key)
+        for answer_key in answer_keys
+    ]
+    codes = []
+    append = codes.append
+    for responses in responses_list:
+        get_answers = responses.get
+        for question_key, kind, option_bits, answer_key in specs:
+            student_answers = get_answers(question_key)
+            if not student_answers:
+                if student_answers is None and question_key not in responses:
+                    append(CODE_MISSING)
+                else:
+                    append(CODE_EMPTY)
+                continue
+            try:
+                if kind == KIND_CHECKBOX:
+                    mask = 0
+                    for ans in student_answers:
+                        mask |= option_bits.get(ans, 0)
+                    append(mask)
+                elif kind == KIND_COMBOBOX:
+                    append(option_bits.get(student_answers[0], 0) if len(student_answers) == 1 else 0)
+                elif kind == KIND_ESSAY:
+                    first = student_answers[0]
+                    append(1 if isinstance(first, str) and first.strip() != "" else 0)
+                else:
+                    append(1 if answer_key.is_correct(student_answers) else 0)
+            except TypeError:
+                # Dữ liệu lạ (đáp án không băm được) => bỏ qua các đáp án đó
+                if kind == KIND_CHECKBOX:
+                    append(answer_key.selected_mask(student_answers))
+                else:
+                    append(1 if kind == _ENCODE_PRECOMPUTED and answer_key.is_correct(student_answers) else 0)
+
+    matrix = np.array(codes, dtype=np.int64).reshape(len(responses_list), len(specs))
+    return ResponseMatrix(answer_keys=answer_keys, codes=matrix)
+
+
+def grade_matrix(matrix, questions=None):
+    """Chấm một ResponseMatrix bằng phép toán trên cả ma trận.
+
+    ``questions`` mặc định là danh sách lúc mã hóa; có thể truyền danh sách
+    mới nếu chỉ đáp án đúng / điểm thay đổi (kiểm tra bằng is_compatible).
+    """
+    if questions is None:
+        answer_keys = matrix.answer_keys
+    else:
+        answer_keys = tuple(compile_answer_keys(questions))
+        if not matrix.is_compatible(answer_keys):
+            raise ValueError("Danh sách câu hỏi/đáp án đã thay đổi, cần mã hóa lại bài làm")
+
+    n_cols = len(answer_keys)
+    target = np.ones(n_cols, dtype=np.int64)
+    exact_match = np.zeros(n_cols, dtype=bool)
+    never_correct = np.zeros(n_cols, dtype=bool)
+    score_vector = np.zeros(n_cols, dtype=np.float64)
+    for col, answer_key in enumerate(answer_keys):
+        score_vector[col] = answer_key.score or 0
+        kind = _encoding_kind(answer_key)
+        if kind == KIND_CHECKBOX:
+            exact_match[col] = True
+            # Đáp án đúng ngoài phạm vi mã hóa thì không bao giờ khớp
+            never_correct[col] = answer_key.unmatchable or answer_key.correct_mask >> _MASK_BITS != 0
+            target[col] = answer_key.correct_mask & ((1 << _MASK_BITS) - 1)
+        elif kind == KIND_COMBOBOX:
+            target[col] = answer_key.correct_mask & ((1 << _MASK_BITS) - 1)
+
+    codes = matrix.codes
+    answered = codes != CODE_MISSING
+    present = codes >= 0
+    # Checkbox: bitmask trùng khớp; còn lại: AND với đích khác 0
+    correct = present & np.where(exact_match, codes == target, (codes & target) != 0)
+    correct &= ~never_correct
+    scores = correct @ score_vector
+
+    return CohortGrades(
+        question_keys=tuple(answer_key.question_key for answer_key in answer_keys),
+        answered=answered,
+        attempted=present,
+        correct=correct,
+        scores=scores,
+    )
+
+
+def grade_cohort(responses_list, questions):
+    """Chấm cùng lúc nhiều bài làm (list các dict responses).
+
+    Kết quả giống check_answer_correctness / calculate_score cho từng bài.
+    """
+    return grade_matrix(encode_responses(responses_list, questions))
+
+
+def submission_answer_rows(submission_id, responses, questions):
+    """Các dòng bảng submission_answers của một bài làm (sql/004_submission_answers.sql).
+
+    Mỗi câu hỏi có khóa trong responses một dòng (giống cách question_correct_stats
+    đếm "đã trả lời"): bitmask các đáp án đã chọn (Checkbox/Combobox, None nếu
+    đáp án vượt quá 63 bit), nội dung tự luận (Essay) và đúng/sai theo khóa đáp án.
+    """
+    rows = []
+    for question, answer_key in zip(questions, compile_answer_keys(questions)):
+        question_key = answer_key.question_key
+        if question_key not in responses:
+            continue
+        student_answers = responses[question_key]
+        # Câu trả lời không phải mảng (dữ liệu lỗi) => đã trả lời nhưng không đúng
+        valid = isinstance(student_answers, list)
+        selected_mask = None
+        essay_text = None
+        if valid and answer_key.kind in (KIND_CHECKBOX, KIND_COMBOBOX) and _fits_mask(answer_key):
+            selected_mask = answer_key.selected_mask(student_answers)
+        elif valid and answer_key.kind == KIND_ESSAY and student_answers and isinstance(student_answers[0], str):
+            essay_text = student_answers[0]
+        rows.append({
+            "submission_id": submission_id,
+            "question_id": question["id"],
+            "selected_mask": selected_mask,
+            "essay_text": essay_text,
+            "is_correct": valid and answer_key.is_correct(student_answers),
+        })
+    return rows
@@ -0,0 +1,302 @@
+"""Mô hình dữ liệu dùng chung: câu hỏi (Question) và bài nộp (Submission).
+
+Các cột JSON (answers, correct của câu hỏi; responses, essay_grades,
+essay_comments, question_results của bài nộp) có thể đến dưới dạng JSON string (cột text),
+đã là dict/list (cột jsonb) hoặc hỏng. Các hàm ``decode_*`` bên dưới là
+cách giải mã và sửa dữ liệu duy nhất của ứng dụng; mọi module dùng chúng
+thay vì tự ``json.loads`` rồi bắt lỗi.
+
+- ``Question``: câu hỏi chỉ đọc trong bộ đệm danh mục. answers/correct được
+  giải mã một lần khi tải danh mục và dùng chung cho mọi phiên.
+- ``SurveySnapshot``: dữ liệu dựng sẵn của form làm bài (thứ tự câu hỏi,
+  nội dung hiển thị, lựa chọn, điểm tối đa) cho một phiên bản danh mục, dùng
+  chung chỉ đọc cho mọi phiên.
+- ``Submission``: một dòng bảng submissions, lưu trong ``__slots__`` (không
+  có dict riêng cho mỗi dòng). Cột JSON giữ nguyên giá trị thô cho đến lần
+  đọc đầu tiên, được giải mã đúng một lần rồi thay bằng dict. Submission
+  dùng được như dict (``s["responses"]``, ``s.get(...)``, ``dict(s)``...)
+  nên code cũ không phải sửa.
+"""
+import json
+from collections.abc import Mapping, MutableMapping
+from typing import NamedTuple, Optional
+
+from grading import compile_answer_key, resolve_question_result
+
+
+def decode_json_object(raw):
+    """Giải mã cột JSON dạng object (responses, essay_grades...) thành dict; dữ liệu hỏng => {}"""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except (ValueError, TypeError):
+            return {}
+    return raw if isinstance(raw, dict) else {}
+
+
+def decode_answers(raw):
+    """Giải mã danh sách đáp án của câu hỏi thành list
+
+    Chuỗi không phải JSON được coi là một đáp án duy nhất.
+    """
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return [raw] if raw else []
+    if isinstance(raw, (list, tuple)):
+        return list(raw)
+    # Một giá trị JSON đơn lẻ (vd. "5") là một đáp án
+    return [raw] if isinstance(raw, (str, int, float)) and not isinstance(raw, bool) else []
+
+
+def decode_correct(raw):
+    """Giải mã danh sách đáp án đúng (số thứ tự bắt đầu từ 1) thành list
+
+    Ngoài JSON, chấp nhận dạng "1,2,3" của dữ liệu cũ.
+    """
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            try:
+                return [int(x.strip()) for x in raw.split(",")]
+            except ValueError:
+                return []
+    if isinstance(raw, (list, tuple)):
+        return list(raw)
+    # Một số đơn lẻ (vd. "2") là một đáp án đúng
+    return [raw] if isinstance(raw, int) and not isinstance(raw, bool) else []
+
+
+def normalize_question(q):
+    """Câu hỏi với answers/correct dạng list/tuple
+
+    Trả về chính q nếu đã đúng định dạng (vd. Question trong bộ đệm), nếu
+    không trả về bản sao (dict) đã giải mã - không sửa dữ liệu của bên gọi.
+    """
+    if isinstance(q.get("answers"), (list, tuple)) and isinstance(q.get("correct"), (list, tuple)):
+        return q
+    q = dict(q)
+    q["answers"] = decode_answers(q.get("answers"))
+    q["correct"] = decode_correct(q.get("correct"))
+    return q
+
+
+class Question(dict):
+    """Câu hỏi chỉ đọc trong bộ đệm. Dùng dict(q) để có bản sao sửa được.
+
+    answers/correct là tuple; thuộc tính answer_key giữ khóa đáp án đã biên
+    dịch (grading.AnswerKey).
+    """
+    __slots__ = ("answer_key",)
+
+    @classmethod
+    def from_row(cls, row):
+        """Tạo Question từ một dòng bảng questions (giải mã answers/correct, biên dịch khóa đáp án)"""
+        data = dict(row)
+        data["answers"] = tuple(decode_answers(data.get("answers")))
+        data["correct"] = tuple(decode_correct(data.get("correct")))
+        question = cls(data)
+        question.answer_key = compile_answer_key(question)
+        return question
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Câu hỏi trong bộ đệm là chỉ đọc, hãy dùng dict(q) để tạo bản sao")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        # copy/deepcopy/pickle tạo lại từ dict thường thay vì gán từng khóa
+        return (self.__class__, (dict(self),))
+
+
+class SurveyItem(NamedTuple):
+    """Một câu hỏi trên form làm bài, đã dựng sẵn để hiển thị"""
+    question_key: str
+    # Dòng tiêu đề markdown "**Câu {id}: {nội dung}** *(Điểm: {điểm})*"
+    prompt: str
+    type: str
+    # Lựa chọn của widget: Checkbox là các đáp án, Combobox thêm "" (chưa chọn)
+    # ở đầu, Essay là ()
+    options: tuple
+    answer_template: str
+
+
+class SurveySnapshot(NamedTuple):
+    """Form làm bài dựng sẵn cho một phiên bản danh mục câu hỏi (chỉ đọc, dùng chung)"""
+    # Phiên bản danh mục lúc dựng (None nếu danh mục đổi trong lúc tải => không lưu đệm)
+    version: Optional[int]
+    questions: tuple
+    items: tuple
+    max_score: float
+
+    @classmethod
+    def build(cls, questions, version=None):
+        """Dựng snapshot từ danh sách câu hỏi (giữ nguyên thứ tự)"""
+        questions = tuple(q if isinstance(q, Question) else Question.from_row(q) for q in questions)
+        items = []
+        for q in questions:
+            q_id = q["id"]
+            if q["type"] == "Checkbox":
+                options = q["answers"]
+            elif q["type"] == "Combobox":
+                options = ("",) + q["answers"]
+            else:
+                options = ()
+            items.append(SurveyItem(
+                question_key=str(q_id),
+                prompt=f"**Câu {q_id}: {q['question']}** *(Điểm: {q['score']})*",
+                type=q["type"],
+                options=options,
+                answer_template=q.get("answer_template") or "",
+            ))
+        return cls(version, questions, tuple(items), sum(q["score"] for q in questions))
+
+
+# Cột của bảng submissions được lưu trong slot (các cột khác vào _extra).
+# Cột JSON nằm trong slot có dấu "_" để thuộc tính cùng tên (property) trả về
+# giá trị đã giải mã.
+SUBMISSION_FIELDS = ("id", "user_email", "timestamp", "score",
+                     "responses", "essay_grades", "essay_comments", "question_results", "answers_indexed")
+SUBMISSION_JSON_FIELDS = frozenset(("responses", "essay_grades", "essay_comments", "question_results"))
+_SUBMISSION_SLOTS = {field: f"_{field}" if field in SUBMISSION_JSON_FIELDS else field
+                     for field in SUBMISSION_FIELDS}
+
+
+class Submission(MutableMapping):
+    """Một bài nộp, truy cập như dict; cột JSON được giải mã lười đúng một lần
+
+    Slot chưa gán nghĩa là dòng không có cột đó (vd. khi chỉ select một số
+    cột), nên ``"responses" in s`` và ``s.keys()`` giống dict của dòng gốc.
+    Cột JSON sau khi đọc luôn là dict (dữ liệu hỏng => {}), giống các chỗ
+    sửa dữ liệu trước đây.
+    """
+    __slots__ = tuple(_SUBMISSION_SLOTS.values()) + ("_extra",)
+
+    def __init__(self, row=()):
+        self._extra = None
+        for key, value in (row.items() if isinstance(row, Mapping) else row):
+            self[key] = value
+
+    @classmethod
+    def from_row(cls, row):
+        """Tạo Submission từ dict của một dòng (không giải mã gì)"""
+        submission = cls.__new__(cls)
+        extra = None
+        for key, value in row.items():
+            slot = _SUBMISSION_SLOTS.get(key)
+            if slot is not None:
+                setattr(submission, slot, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        submission._extra = extra
+        return submission
+
+    def __getitem__(self, key):
+        slot = _SUBMISSION_SLOTS.get(key)
+        if slot is not None:
+            try:
+                value = getattr(self, slot)
+            except AttributeError:
+                raise KeyError(key) from None
+            if key in SUBMISSION_JSON_FIELDS and not isinstance(value, dict):
+                value = decode_json_object(value)
+                setattr(self, slot, value)
+            return value
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        slot = _SUBMISSION_SLOTS.get(key)
+        if slot is not None:
+            # Giá trị không phải dict (vd. JSON string) sẽ được giải mã ở lần đọc sau
+            setattr(self, slot, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        slot = _SUBMISSION_SLOTS.get(key)
+        if slot is not None:
+            try:
+                delattr(self, slot)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __contains__(self, key):
+        # Không đọc giá trị => không kích hoạt giải mã
+        slot = _SUBMISSION_SLOTS.get(key)
+        if slot is not None:
+            return hasattr(self, slot)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for key, slot in _SUBMISSION_SLOTS.items():
+            if hasattr(self, slot):
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for slot in _SUBMISSION_SLOTS.values() if hasattr(self, slot)) + len(self._extra or ())
+
+    @property
+    def responses(self):
+        """Câu trả lời {question_id: list đáp án hoặc nội dung tự luận}"""
+        return self.get("responses", {})
+
+    @property
+    def essay_grades(self):
+        """Điểm chấm tay các câu tự luận {question_id: điểm}"""
+        return self.get("essay_grades", {})
+
+    @property
+    def essay_comments(self):
+        """Nhận xét các câu tự luận {question_id: nhận xét}"""
+        return self.get("essay_comments", {})
+
+    @property
+    def question_results(self):
+        """Kết quả từng câu hỏi lúc nộp bài {question_id: [trạng thái, điểm, tag]}"""
+        return self.get("question_results", {})
+
+    def to_row(self):
+        """dict của dòng với giá trị đang giữ (cột JSON chưa đọc vẫn ở dạng thô)"""
+        row = {key: getattr(self, slot) for key, slot in _SUBMISSION_SLOTS.items() if hasattr(self, slot)}
+        if self._extra:
+            row.update(self._extra)
+        return row
+
+    def copy(self):
+        """Bản sao nông (như dict.copy)"""
+        return self.from_row(self.to_row())
+
+    def __reduce__(self):
+        return (self.__class__, (self.to_row(),))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.to_row()!r})"
+
+
+def question_result(submission, question, student_answers=None):
+    """Kết quả (grading.QuestionResult) của một câu hỏi trong bài nộp
+
+    Dùng kết quả đã lưu lúc nộp bài (cột question_results) nếu khóa đáp án của
+    câu hỏi chưa đổi; ngược lại (bài nộp cũ, câu hỏi đã sửa) chấm lại từ
+    student_answers (mặc định lấy từ responses của bài nộp).
+    """
+    q_id = str(question.get("id"))
+    if student_answers is None:
+        student_answers = decode_json_object(submission.get("responses")).get(q_id)
+    stored = decode_json_object(submission.get("question_results")).get(q_id)
+    return resolve_question_result(stored, student_answers, question)
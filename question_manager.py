@@ -1,6 +1,6 @@
 import streamlit as st
-from database_helper import save_question, get_all_questions, get_question_by_id, update_question, delete_question
-import json
+from database_helper import save_question, get_all_questions, get_question_by_id, update_question, delete_question, regrade_question_submissions
+from models import decode_answers, decode_correct
 
 def manage_questions():
     st.title("Quản lý câu hỏi")
@@ -27,6 +27,11 @@ def manage_questions():
     if "question_to_delete" not in st.session_state:
         st.session_state.question_to_delete = None
 
+    # Kết quả chấm lại bài nộp sau lần sửa câu hỏi trước (hiển thị một lần sau st.rerun)
+    regrade_notice = st.session_state.pop("regrade_notice", None)
+    if regrade_notice:
+        st.info(regrade_notice)
+
     # Ba tab: Thêm câu hỏi mới, Danh sách câu hỏi, và Chỉnh sửa câu hỏi
     tabs = ["Thêm câu hỏi mới", "Danh sách câu hỏi"]
     
@@ -168,24 +173,9 @@ def list_questions():
                 # Hiển thị theo loại câu hỏi
                 if q['type'] in ["Checkbox", "Combobox"]:
                     st.write("**Các đáp án:**")
-                    # Đảm bảo answers là list
-                    answers = q["answers"]
-                    if isinstance(answers, str):
-                        try:
-                            answers = json.loads(answers)
-                        except:
-                            answers = [answers]
-                    
-                    # Đảm bảo correct là list
-                    correct = q["correct"]
-                    if isinstance(correct, str):
-                        try:
-                            correct = json.loads(correct)
-                        except:
-                            try:
-                                correct = [int(x.strip()) for x in correct.split(",")]
-                            except:
-                                correct = []
+                    # Đảm bảo answers và correct là list
+                    answers = decode_answers(q["answers"])
+                    correct = decode_correct(q["correct"])
                     
                     for j, ans in enumerate(answers):
                         is_correct = (j + 1) in correct
@@ -233,36 +223,13 @@ def edit_question():
     
     # Sao chép danh sách đáp án để có thể chỉnh sửa
     if "edited_answers" not in st.session_state:
-        # Đảm bảo q["answers"] là danh sách
-        if isinstance(q["answers"], str):
-            try:
-                # Nếu là JSON string, thử chuyển đổi thành list
-                answers_list = json.loads(q["answers"])
-                st.session_state.edited_answers = answers_list
-            except:
-                # Nếu không thể parse JSON, tạo list từ string
-                st.session_state.edited_answers = [q["answers"]]
-        else:
-            # Nếu đã là list, sao chép nó
-            st.session_state.edited_answers = list(q["answers"])
+        # Đảm bảo q["answers"] là danh sách (bản sao mới)
+        st.session_state.edited_answers = decode_answers(q["answers"])
     
     # Sao chép đáp án đúng
     if "edited_correct" not in st.session_state:
-        # Đảm bảo q["correct"] là danh sách
-        if isinstance(q["correct"], str):
-            try:
-                # Nếu là JSON string, thử chuyển đổi thành list
-                correct_list = json.loads(q["correct"])
-                st.session_state.edited_correct = correct_list
-            except:
-                # Nếu không thể parse JSON, thử chuyển đổi từ dạng "1,2,3" thành [1,2,3]
-                try:
-                    st.session_state.edited_correct = [int(x.strip()) for x in q["correct"].split(",")]
-                except:
-                    st.session_state.edited_correct = []
-        else:
-            # Nếu đã là list, sao chép nó
-            st.session_state.edited_correct = list(q["correct"])
+        # Đảm bảo q["correct"] là danh sách (bản sao mới)
+        st.session_state.edited_correct = decode_correct(q["correct"])
     
     # Chỉ hiển thị quản lý đáp án cho câu hỏi Checkbox và Combobox
     if edited_type in ["Checkbox", "Combobox"]:
@@ -388,8 +355,15 @@ def save_edited_question(q_id, edited_question, edited_type, edited_score):
         updated_data["correct"] = []
         updated_data["answer_template"] = st.session_state.edited_answer_template
     
+    # Giữ bản trước khi sửa để tính chênh lệch điểm khi chấm lại
+    old_question = get_question_by_id(q_id)
+    
     # Lưu thay đổi vào database
     if update_question(q_id, updated_data):
+        # Đáp án/điểm thay đổi => chấm lại các bài nộp đã trả lời câu hỏi này
+        if old_question:
+            regrade_edited_question(old_question, dict(updated_data, id=q_id))
+        
         # Xóa dữ liệu chỉnh sửa
         st.session_state.editing_question = None
         if "edited_answers" in st.session_state:
@@ -406,6 +380,29 @@ def save_edited_question(q_id, edited_question, edited_type, edited_score):
     else:
         st.error("❌ Có lỗi xảy ra khi cập nhật câu hỏi!")
 
+def regrade_edited_question(old_question, new_question):
+    """Chấm lại bài nộp sau khi sửa câu hỏi, hiển thị tiến độ theo từng lô"""
+    progress_bar = None
+    
+    def report(processed, total, updated):
+        nonlocal progress_bar
+        if progress_bar is None:
+            progress_bar = st.progress(0.0)
+        fraction = min(processed / total, 1.0) if total else 1.0
+        progress_bar.progress(fraction, text=f"Đang chấm lại bài nộp: {processed}/{total} (đã cập nhật điểm {updated} bài)")
+    
+    result = regrade_question_submissions(old_question, new_question, progress=report)
+    if result and result["scanned"]:
+        st.session_state.regrade_notice = (
+            f"🔄 Đã chấm lại {result['scanned']} bài nộp có trả lời câu hỏi #{new_question['id']}: "
+            f"cập nhật điểm {result['updated']} bài."
+        )
+        # Có bài đổi điểm nhưng không ghi được (điểm bị sửa ở nơi khác trong lúc chấm)
+        if result["updated"] < result["changed"]:
+            st.session_state.regrade_notice += (
+                f" {result['changed'] - result['updated']} bài không cập nhật được do điểm đã bị sửa trong lúc chấm lại."
+            )
+
 def delete_confirmation():
     """Hiển thị hộp xác nhận xóa câu hỏi"""
     q = st.session_state.question_to_delete
@@ -5,8 +5,8 @@ import io
 import base64
 from datetime import datetime
 import numpy as np
-import json
 import sys
+from collections.abc import Mapping
 import traceback
 import os
 
@@ -25,71 +25,19 @@ except Exception:
 
 from database_helper import get_supabase_client
 
+from grading import grade_cohort
+from submission_stats import group_submissions_by_email
+# Giải mã cột JSON của câu hỏi / bài nộp (xem models.py)
+from models import decode_answers, decode_correct, decode_json_object, normalize_question, question_result
+# Tải song song các dữ liệu độc lập của trang báo cáo
+from db_async import (fetch_concurrently, get_all_questions_async, get_all_students_async,
+                      get_all_users_async, get_all_submissions_async, get_user_submissions_async)
+
 # Giả lập database_helper nếu không có
 try:
-    from database_helper import check_answer_correctness, get_all_questions, get_all_users, get_user_submissions, get_all_submissions
+    from database_helper import get_all_questions, get_all_users, get_user_submissions, get_all_submissions
 except ImportError:
     # Mock functions để tránh lỗi khi không có module
-    def check_answer_correctness(user_ans, q):
-        """Mock function - nên sử dụng hàm từ database_helper"""
-        if not user_ans:
-            return False
-        
-        q_type = q.get("type", "")
-        
-        # Câu hỏi tự luận (Essay): tính đúng nếu có nội dung
-        if q_type == "Essay":
-            return bool(user_ans) and isinstance(user_ans[0], str) and user_ans[0].strip() != ""
-        
-        # Câu hỏi Combobox: chọn một đáp án
-        if q_type == "Combobox":
-            if len(user_ans) == 1:
-                answer_text = user_ans[0]
-                answers = q.get("answers", [])
-                correct = q.get("correct", [])
-                if isinstance(answers, str):
-                    try:
-                        answers = json.loads(answers)
-                    except:
-                        answers = [answers]
-                if isinstance(correct, str):
-                    try:
-                        correct = json.loads(correct)
-                    except:
-                        try:
-                            correct = [int(x.strip()) for x in correct.split(",")]
-                        except:
-                            correct = []
-                answer_index = answers.index(answer_text) + 1 if answer_text in answers else -1
-                return answer_index in correct
-            return False
-        
-        # Câu hỏi Checkbox: nhiều lựa chọn
-        if q_type == "Checkbox":
-            answers = q.get("answers", [])
-            if isinstance(answers, str):
-                try:
-                    answers = json.loads(answers)
-                except:
-                    answers = [answers]
-            correct = q.get("correct", [])
-            if isinstance(correct, str):
-                try:
-                    correct = json.loads(correct)
-                except:
-                    try:
-                        correct = [int(x.strip()) for x in correct.split(",")]
-                    except:
-                        correct = []
-            correct_set = set(correct)
-            selected_indices = []
-            for ans in user_ans:
-                if ans in answers:
-                    selected_indices.append(answers.index(ans) + 1)
-            return set(selected_indices) == correct_set
-        
-        return False
-    
     def get_all_questions():
         return []
     
@@ -406,6 +354,20 @@ def sanitize_sheet_name(name):
     
     return cleaned
 
+def _cohort_responses(submissions):
+    """Responses của các bài nộp (dict, mỗi câu trả lời là list) để chấm cùng lúc bằng grade_cohort"""
+    cohort = []
+    for s in submissions:
+        responses = decode_json_object(s.get("responses"))
+        # Câu trả lời không phải list được coi là một đáp án (None => không trả lời)
+        if not all(isinstance(ans, list) for ans in responses.values()):
+            responses = {
+                q_id: ans if isinstance(ans, list) else ([ans] if ans is not None else [])
+                for q_id, ans in responses.items()
+            }
+        cohort.append(responses)
+    return cohort
+
 def export_to_excel(dataframes, sheet_names, filename, include_summary=True, questions=None, submissions=None):
     """Tạo file Excel với nhiều sheet từ các DataFrame, bao gồm phần tổng hợp điểm và tự động căn chỉnh"""
     try:
@@ -495,43 +457,23 @@ def export_to_excel(dataframes, sheet_names, filename, include_summary=True, que
                     total_score = 0
                     correct_answers = {}
 
-                    # Tính từ các submissions
+                    # Tính từ các submissions - chấm tất cả bài nộp cùng lúc
                     try:
-                        for s in submissions:
-                            responses = s.get("responses", {})
-                            if isinstance(responses, str):
-                                try:
-                                    responses = json.loads(responses)
-                                except:
-                                    responses = {}
-                            if not isinstance(responses, dict):
-                                responses = {}
-
-                            total_score += s.get("score", 0)
-
-                            for q in questions:
-                                q_id = str(q.get("id", ""))
-                                q_type = q.get("type", "")
-                                user_ans = responses.get(q_id, [])
-                                if not isinstance(user_ans, list):
-                                    user_ans = [user_ans] if user_ans is not None else []
-
-                                try:
-                                    from database_helper import check_answer_correctness as db_check_answer
-                                    is_correct = db_check_answer(user_ans, q)
-                                except ImportError:
-                                    is_correct = check_answer_correctness(user_ans, q)
-
-                                if is_correct:
-                                    if q_id not in correct_answers:
-                                        correct_answers[q_id] = 0
-                                    correct_answers[q_id] += 1
-
-                                    points = q.get("score", 0)
-                                    if q_type in ["Checkbox", "Combobox"]:
-                                        total_multiple_choice += points
-                                    elif q_type == "Essay":
-                                        total_essay += points
+                        total_score = sum(s.get("score", 0) for s in submissions)
+                        grades = grade_cohort(_cohort_responses(submissions), questions)
+                        
+                        for q, count in zip(questions, grades.correct_counts().tolist()):
+                            if not count:
+                                continue
+                            q_id = str(q.get("id", ""))
+                            q_type = q.get("type", "")
+                            correct_answers[q_id] = correct_answers.get(q_id, 0) + count
+                            
+                            points = q.get("score", 0) * count
+                            if q_type in ["Checkbox", "Combobox"]:
+                                total_multiple_choice += points
+                            elif q_type == "Essay":
+                                total_essay += points
                     except Exception as calc_error:
                         print(f"Lỗi khi tính tổng hợp điểm trong Excel: {calc_error}")
 
@@ -1517,39 +1459,10 @@ def create_student_report_pdf_reportlab(student_name, student_email, student_cla
         story.append(Paragraph("<b>Chi tiết câu trả lời</b>", styles['Heading2']))
         
         # Đảm bảo responses đúng định dạng
-        responses = submission.get("responses", {})
-        if isinstance(responses, str):
-            try:
-                responses = json.loads(responses)
-            except:
-                responses = {}
-        if not isinstance(responses, dict):
-            responses = {}
+        responses = decode_json_object(submission.get("responses"))
         
         # Validate questions
-        normalized_questions = []
-        for q in questions:
-            if not isinstance(q, dict):
-                continue
-            if isinstance(q.get("answers"), str):
-                try:
-                    q["answers"] = json.loads(q["answers"])
-                except:
-                    q["answers"] = [q["answers"]] if q.get("answers") else []
-            if isinstance(q.get("correct"), str):
-                try:
-                    q["correct"] = json.loads(q["correct"])
-                except:
-                    try:
-                        q["correct"] = [int(x.strip()) for x in q["correct"].split(",")]
-                    except:
-                        q["correct"] = []
-            if not isinstance(q.get("answers"), list):
-                q["answers"] = []
-            if not isinstance(q.get("correct"), list):
-                q["correct"] = []
-            normalized_questions.append(q)
-        questions = normalized_questions
+        questions = [normalize_question(q) for q in questions if isinstance(q, dict)]
         
         # Tính toán điểm
         total_correct = 0
@@ -1594,11 +1507,7 @@ def create_student_report_pdf_reportlab(student_name, student_email, student_cla
             if not isinstance(user_ans, list):
                 user_ans = [user_ans] if user_ans is not None else []
             
-            try:
-                from database_helper import check_answer_correctness as db_check_answer
-                is_correct = db_check_answer(user_ans, q)
-            except ImportError:
-                is_correct = check_answer_correctness(user_ans, q)
+            is_correct = question_result(submission, q, user_ans).correct
             
             q_type = q.get("type", "")
             if is_correct:
@@ -1897,58 +1806,10 @@ def create_student_report_docx(student_name, student_email, student_class, submi
             cell._tc.get_or_add_tcPr().append(shading_elm)
         
         # Đảm bảo responses đúng định dạng - parse từ JSON string nếu cần
-        responses = submission.get("responses", {})
-        if isinstance(responses, str):
-            try:
-                responses = json.loads(responses)
-            except json.JSONDecodeError as e:
-                print(f"Lỗi khi parse responses JSON: {e}")
-                responses = {}
-        
-        # Đảm bảo responses là dict
-        if not isinstance(responses, dict):
-            print(f"Warning: responses không phải dict, type: {type(responses)}")
-            responses = {}
+        responses = decode_json_object(submission.get("responses"))
         
         # Validate và normalize questions trước khi xử lý
-        normalized_questions = []
-        for q in questions:
-            # Đảm bảo q là dict và có các trường cần thiết
-            if not isinstance(q, dict):
-                continue
-            
-            # Parse answers nếu là string
-            if isinstance(q.get("answers"), str):
-                try:
-                    q["answers"] = json.loads(q["answers"])
-                except:
-                    try:
-                        # Fallback: nếu không phải JSON, giữ nguyên
-                        q["answers"] = [q["answers"]]
-                    except:
-                        q["answers"] = []
-            
-            # Parse correct nếu là string
-            if isinstance(q.get("correct"), str):
-                try:
-                    q["correct"] = json.loads(q["correct"])
-                except:
-                    try:
-                        # Thử parse dạng "1,2,3"
-                        q["correct"] = [int(x.strip()) for x in q["correct"].split(",")]
-                    except:
-                        q["correct"] = []
-            
-            # Đảm bảo answers và correct là list
-            if not isinstance(q.get("answers"), list):
-                q["answers"] = []
-            if not isinstance(q.get("correct"), list):
-                q["correct"] = []
-            
-            normalized_questions.append(q)
-        
-        # Sử dụng questions đã được normalize
-        questions = normalized_questions
+        questions = [normalize_question(q) for q in questions if isinstance(q, dict)]
         
         # Thêm dữ liệu câu trả lời với định dạng cải thiện
         for q in questions:
@@ -1964,15 +1825,8 @@ def create_student_report_docx(student_name, student_email, student_class, submi
                 else:
                     user_ans = []
             
-            # Kiểm tra đúng/sai sử dụng hàm từ database_helper (không dùng mock)
-            # Đảm bảo import đúng hàm từ database_helper
-            try:
-                from database_helper import check_answer_correctness as db_check_answer
-                is_correct = db_check_answer(user_ans, q)
-            except ImportError:
-                # Fallback nếu không import được - nhưng nên có cảnh báo
-                print("Warning: Không thể import check_answer_correctness từ database_helper, sử dụng mock function")
-            is_correct = check_answer_correctness(user_ans, q)
+            # Kết quả đã chấm lúc nộp bài (chấm lại nếu câu hỏi đã được sửa)
+            is_correct = question_result(submission, q, user_ans).correct
             
             # Tính điểm cho câu hỏi này theo từng loại
             q_type = q.get("type", "")
@@ -2022,23 +1876,8 @@ def create_student_report_docx(student_name, student_email, student_class, submi
                 row_cells[1].text = ", ".join([str(a) for a in user_ans]) if user_ans else "Không trả lời"
                 
                 # Chuẩn bị đáp án đúng
-                q_correct = q.get("correct", [])
-                q_answers = q.get("answers", [])
-                
-                if isinstance(q_correct, str):
-                    try:
-                        q_correct = json.loads(q_correct)
-                    except:
-                        try:
-                            q_correct = [int(x.strip()) for x in q_correct.split(",")]
-                        except:
-                            q_correct = []
-                
-                if isinstance(q_answers, str):
-                    try:
-                        q_answers = json.loads(q_answers)
-                    except:
-                        q_answers = [q_answers]
+                q_correct = decode_correct(q.get("correct"))
+                q_answers = decode_answers(q.get("answers"))
                 
                 try:
                     expected = [q_answers[i - 1] for i in q_correct]
@@ -2230,56 +2069,10 @@ def create_student_report_pdf_fpdf(student_name, student_email, student_class, s
         essay_questions = 0  # Số câu tự luận
         
         # Đảm bảo responses đúng định dạng - parse từ JSON string nếu cần
-        responses = submission.get("responses", {})
-        if isinstance(responses, str):
-            try:
-                responses = json.loads(responses)
-            except json.JSONDecodeError as e:
-                print(f"Lỗi khi parse responses JSON trong PDF: {e}")
-                responses = {}
-        
-        # Đảm bảo responses là dict
-        if not isinstance(responses, dict):
-            print(f"Warning: responses không phải dict trong PDF, type: {type(responses)}")
-            responses = {}
+        responses = decode_json_object(submission.get("responses"))
         
         # Validate và normalize questions trước khi xử lý
-        normalized_questions = []
-        for q in questions:
-            # Đảm bảo q là dict và có các trường cần thiết
-            if not isinstance(q, dict):
-                continue
-            
-            # Parse answers nếu là string
-            if isinstance(q.get("answers"), str):
-                try:
-                    q["answers"] = json.loads(q["answers"])
-                except:
-                    try:
-                        q["answers"] = [q["answers"]]
-                    except:
-                        q["answers"] = []
-            
-            # Parse correct nếu là string
-            if isinstance(q.get("correct"), str):
-                try:
-                    q["correct"] = json.loads(q["correct"])
-                except:
-                    try:
-                        q["correct"] = [int(x.strip()) for x in q["correct"].split(",")]
-                    except:
-                        q["correct"] = []
-            
-            # Đảm bảo answers và correct là list
-            if not isinstance(q.get("answers"), list):
-                q["answers"] = []
-            if not isinstance(q.get("correct"), list):
-                q["correct"] = []
-            
-            normalized_questions.append(q)
-        
-        # Sử dụng questions đã được normalize
-        questions = normalized_questions
+        questions = [normalize_question(q) for q in questions if isinstance(q, dict)]
         
         # Xử lý timestamp
         submission_time = "Không xác định"
@@ -2392,14 +2185,8 @@ def create_student_report_pdf_fpdf(student_name, student_email, student_class, s
                 else:
                     user_ans = []
             
-            # Kiểm tra đúng/sai sử dụng hàm từ database_helper (không dùng mock)
-            try:
-                from database_helper import check_answer_correctness as db_check_answer
-                is_correct = db_check_answer(user_ans, q)
-            except ImportError:
-                # Fallback nếu không import được - nhưng nên có cảnh báo
-                print("Warning: Không thể import check_answer_correctness từ database_helper, sử dụng mock function")
-            is_correct = check_answer_correctness(user_ans, q)
+            # Kết quả đã chấm lúc nộp bài (chấm lại nếu câu hỏi đã được sửa)
+            is_correct = question_result(submission, q, user_ans).correct
             
             # Tính điểm cho câu hỏi này theo từng loại
             q_type = q.get("type", "")
@@ -2449,23 +2236,8 @@ def create_student_report_pdf_fpdf(student_name, student_email, student_class, s
                 user_answer_text = safe_text_pdf(", ".join([str(a) for a in user_ans]) if user_ans else "Không trả lời")
                 
                 # Chuẩn bị đáp án đúng
-                q_correct = q.get("correct", [])
-                q_answers = q.get("answers", [])
-                
-                if isinstance(q_correct, str):
-                    try:
-                        q_correct = json.loads(q_correct)
-                    except:
-                        try:
-                            q_correct = [int(x.strip()) for x in q_correct.split(",")]
-                        except:
-                            q_correct = []
-                
-                if isinstance(q_answers, str):
-                    try:
-                        q_answers = json.loads(q_answers)
-                    except:
-                        q_answers = [q_answers]
+                q_correct = decode_correct(q.get("correct"))
+                q_answers = decode_answers(q.get("answers"))
                 
                 try:
                     expected = [q_answers[i - 1] for i in q_correct]
@@ -2910,12 +2682,7 @@ def display_student_tab(submissions=None, students=None, questions=None, max_pos
                     student_detail_data = []
                     
                     # Đảm bảo responses đúng định dạng
-                    responses = submission.get("responses", {})
-                    if isinstance(responses, str):
-                        try:
-                            responses = json.loads(responses)
-                        except:
-                            responses = {}
+                    responses = decode_json_object(submission.get("responses"))
                     
                     # Hiển thị câu trả lời chi tiết
                     for q in questions:
@@ -2933,35 +2700,16 @@ def display_student_tab(submissions=None, students=None, questions=None, max_pos
                                 user_ans = []
                         
                         # Chuẩn bị dữ liệu đáp án đúng - parse JSON nếu cần
-                        q_correct = q.get("correct", [])
-                        q_answers = q.get("answers", [])
-                        
-                        if isinstance(q_correct, str):
-                            try:
-                                q_correct = json.loads(q_correct)
-                            except:
-                                try:
-                                    q_correct = [int(x.strip()) for x in q_correct.split(",")]
-                                except:
-                                    q_correct = []
-                        
-                        if isinstance(q_answers, str):
-                            try:
-                                q_answers = json.loads(q_answers)
-                            except:
-                                q_answers = [q_answers]
+                        q_correct = decode_correct(q.get("correct"))
+                        q_answers = decode_answers(q.get("answers"))
                         
                         try:
                             expected = [q_answers[i - 1] for i in q_correct]
                         except (IndexError, TypeError):
                             expected = ["Lỗi đáp án"]
                         
-                        # Kiểm tra đúng/sai - sử dụng hàm từ database_helper (không dùng mock)
-                        try:
-                            from database_helper import check_answer_correctness as db_check_answer
-                            is_correct = db_check_answer(user_ans, q)
-                        except ImportError:
-                            is_correct = check_answer_correctness(user_ans, q)
+                        # Kết quả đã chấm lúc nộp bài (chấm lại nếu câu hỏi đã được sửa)
+                        is_correct = question_result(submission, q, user_ans).correct
                         if is_correct:
                             total_correct += 1
                         
@@ -3080,47 +2828,17 @@ def display_question_tab(submissions=None, questions=None):
         
     st.subheader("Phân tích theo câu hỏi")
     
-    # Thống kê tỷ lệ đúng/sai cho từng câu hỏi
+    # Thống kê tỷ lệ đúng/sai cho từng câu hỏi - chấm tất cả bài nộp cùng lúc
     question_stats = {}
+    grades = grade_cohort(_cohort_responses(submissions), questions)
+    attempted_counts = grades.attempted.sum(axis=0).tolist()
+    correct_counts = grades.correct_counts().tolist()
     
-    for q in questions:
+    for position, q in enumerate(questions):
         q_id = str(q.get("id", ""))
-        correct_count = 0
-        wrong_count = 0
-        skip_count = 0
-        
-        for s in submissions:
-            # Đảm bảo responses đúng định dạng
-            responses = s.get("responses", {})
-            if isinstance(responses, str):
-                try:
-                    responses = json.loads(responses)
-                except:
-                    responses = {}
-            
-            user_ans = responses.get(q_id, [])
-            
-            # Đảm bảo user_ans là list
-            if not isinstance(user_ans, list):
-                if user_ans is not None:
-                    user_ans = [user_ans]
-                else:
-                    user_ans = []
-            
-            if not user_ans:
-                skip_count += 1
-            else:
-                # Sử dụng hàm từ database_helper (không dùng mock)
-                try:
-                    from database_helper import check_answer_correctness as db_check_answer
-                    is_correct = db_check_answer(user_ans, q)
-                except ImportError:
-                    is_correct = check_answer_correctness(user_ans, q)
-                
-                if is_correct:
-                    correct_count += 1
-                else:
-                    wrong_count += 1
+        correct_count = correct_counts[position]
+        wrong_count = attempted_counts[position] - correct_count
+        skip_count = len(submissions) - attempted_counts[position]
         
         question_stats[q_id] = {
             "question": q.get("question", ""),
@@ -3330,23 +3048,8 @@ def display_question_tab(submissions=None, questions=None):
                             st.write("**Đáp án đúng:**")
                             
                             # Chuẩn bị dữ liệu đáp án đúng
-                            q_correct = q_detail.get("correct", [])
-                            q_answers = q_detail.get("answers", [])
-                            
-                            if isinstance(q_correct, str):
-                                try:
-                                    q_correct = json.loads(q_correct)
-                                except:
-                                    try:
-                                        q_correct = [int(x.strip()) for x in q_correct.split(",")]
-                                    except:
-                                        q_correct = []
-                            
-                            if isinstance(q_answers, str):
-                                try:
-                                    q_answers = json.loads(q_answers)
-                                except:
-                                    q_answers = [q_answers]
+                            q_correct = decode_correct(q_detail.get("correct"))
+                            q_answers = decode_answers(q_detail.get("answers"))
                             
                             try:
                                 for i in q_correct:
@@ -3403,6 +3106,8 @@ def display_student_list_tab(submissions=None, students=None, max_possible=0):
     st.info(f"📋 Tổng số users: {len(students)} ({role_info})")
     
     # Chuẩn bị dữ liệu - Đảm bảo HIỂN THỊ TẤT CẢ học viên (kể cả chưa làm bài)
+    # Gom bài nộp theo email một lần thay vì lọc cả danh sách cho từng học viên
+    submissions_by_email = group_submissions_by_email(submissions)
     student_data = []
     for student in students:
         try:
@@ -3411,7 +3116,7 @@ def display_student_list_tab(submissions=None, students=None, max_possible=0):
             if not student_email:
                 continue  # Bỏ qua nếu không có email
                 
-            student_submissions = [s for s in submissions if s.get("user_email") == student_email]
+            student_submissions = submissions_by_email.get(student_email, [])
             submission_count = len(student_submissions)
             
             # Tìm điểm cao nhất
@@ -3791,17 +3496,7 @@ def display_export_tab(df_all_submissions=None, df_questions=None, df_students_l
                                 pass
                         
                         # Đảm bảo responses đúng định dạng - parse từ JSON string từ database
-                        responses = submission.get("responses", {})
-                        if isinstance(responses, str):
-                            try:
-                                responses = json.loads(responses)
-                            except json.JSONDecodeError as e:
-                                print(f"Lỗi khi parse responses JSON trong display_export_tab: {e}")
-                                responses = {}
-                        
-                        # Đảm bảo responses là dict
-                        if not isinstance(responses, dict):
-                            responses = {}
+                        responses = decode_json_object(submission.get("responses"))
                         
                         # Tính số câu trả lời đúng - sử dụng dữ liệu thực từ database
                         correct_count = 0
@@ -3816,12 +3511,8 @@ def display_export_tab(df_all_submissions=None, df_questions=None, df_students_l
                                 else:
                                     user_ans = []
                             
-                            # Sử dụng hàm từ database_helper (không dùng mock)
-                            try:
-                                from database_helper import check_answer_correctness as db_check_answer
-                                is_correct = db_check_answer(user_ans, q)
-                            except ImportError:
-                                is_correct = check_answer_correctness(user_ans, q)
+                            # Kết quả đã chấm lúc nộp bài (chấm lại nếu câu hỏi đã được sửa)
+                            is_correct = question_result(submission, q, user_ans).correct
                             
                             if is_correct:
                                 correct_count += 1
@@ -3842,7 +3533,7 @@ def display_export_tab(df_all_submissions=None, df_questions=None, df_students_l
                         for q in questions:
                             q_id = str(q.get("id", ""))
                             user_ans = responses.get(q_id, [])
-                            is_correct = check_answer_correctness(user_ans, q)
+                            is_correct = question_result(submission, q, user_ans).correct
                             
                             entry[f"Câu {q_id}"] = ", ".join([str(a) for a in user_ans]) if user_ans else "Không trả lời"
                             entry[f"Câu {q_id} - Kết quả"] = "Đúng" if is_correct else "Sai"
@@ -3928,14 +3619,7 @@ def display_export_tab(df_all_submissions=None, df_questions=None, df_students_l
                                         pass
                                 
                                 # Đảm bảo responses đúng định dạng
-                                responses = submission.get("responses", {})
-                                if isinstance(responses, str):
-                                    try:
-                                        responses = json.loads(responses)
-                                    except:
-                                        responses = {}
-                                if not isinstance(responses, dict):
-                                    responses = {}
+                                responses = decode_json_object(submission.get("responses"))
                                 
                                 # Tính toán chi tiết
                                 for q in questions:
@@ -3944,11 +3628,7 @@ def display_export_tab(df_all_submissions=None, df_questions=None, df_students_l
                                     if not isinstance(user_ans, list):
                                         user_ans = [user_ans] if user_ans is not None else []
                                     
-                                    try:
-                                        from database_helper import check_answer_correctness as db_check_answer
-                                        is_correct = db_check_answer(user_ans, q)
-                                    except ImportError:
-                                        is_correct = check_answer_correctness(user_ans, q)
+                                    is_correct = question_result(submission, q, user_ans).correct
                                     
                                     row_data = {
                                         "Câu hỏi ID": q_id,
@@ -4033,14 +3713,7 @@ def display_export_tab(df_all_submissions=None, df_questions=None, df_students_l
                                     submission_data = []
                                     
                                     # Xử lý responses
-                                    responses = submission.get("responses", {})
-                                    if isinstance(responses, str):
-                                        try:
-                                            responses = json.loads(responses)
-                                        except:
-                                            responses = {}
-                                    if not isinstance(responses, dict):
-                                        responses = {}
+                                    responses = decode_json_object(submission.get("responses"))
                                     
                                     for q in questions:
                                         q_id = str(q.get("id", ""))
@@ -4048,11 +3721,7 @@ def display_export_tab(df_all_submissions=None, df_questions=None, df_students_l
                                         if not isinstance(user_ans, list):
                                             user_ans = [user_ans] if user_ans is not None else []
                                         
-                                        try:
-                                            from database_helper import check_answer_correctness as db_check_answer
-                                            is_correct = db_check_answer(user_ans, q)
-                                        except ImportError:
-                                            is_correct = check_answer_correctness(user_ans, q)
+                                        is_correct = question_result(submission, q, user_ans).correct
                                         
                                         row_data = {
                                             "Câu hỏi ID": q_id,
@@ -4083,6 +3752,84 @@ def display_export_tab(df_all_submissions=None, df_questions=None, df_students_l
         except Exception as e:
             st.error(f"Lỗi khi xử lý báo cáo theo học viên: {str(e)}")
 
+def build_submissions_dataframe(submissions, students, questions, max_possible):
+    """Bảng tất cả bài nộp: thông tin học viên, điểm, câu trả lời và đúng/sai từng câu"""
+    all_submission_data = []
+    # Tra cứu học viên theo email (thay vì duyệt cả danh sách cho mỗi bài nộp)
+    students_by_email = {}
+    for student in students:
+        students_by_email.setdefault(student.get("email"), student)
+    
+    for s in submissions:
+        try:
+            # Tìm thông tin học viên
+            student_info = students_by_email.get(s.get("user_email"))
+            full_name = student_info.get("full_name", "Không xác định") if student_info else "Không xác định"
+            class_name = student_info.get("class", "Không xác định") if student_info else "Không xác định"
+            
+            # Chuyển đổi timestamp sang định dạng đọc được
+            submission_time = "Không xác định"
+            if isinstance(s.get("timestamp"), (int, float)):
+                try:
+                    submission_time = datetime.fromtimestamp(s.get("timestamp")).strftime("%d/%m/%Y %H:%M:%S")
+                except:
+                    pass
+            else:
+                try:
+                    dt = datetime.fromisoformat(s.get("timestamp", "").replace("Z", "+00:00"))
+                    submission_time = dt.strftime("%d/%m/%Y %H:%M:%S")
+                except:
+                    pass
+            
+            # Thêm thông tin cơ bản
+            submission_data = {
+                "ID": s.get("id", ""),
+                "Email": s.get("user_email", ""),
+                "Họ và tên": full_name,
+                "Lớp": class_name,
+                "Thời gian nộp": submission_time,
+                "Điểm số": s.get("score", 0),
+                "Điểm tối đa": max_possible,
+                "Tỷ lệ đúng": f"{(s.get('score', 0)/max_possible*100):.1f}%" if max_possible > 0 else "N/A"
+            }
+            
+            # Chuyển đổi responses từ JSON string thành dict từ database
+            responses = decode_json_object(s.get("responses"))
+            
+            # Thêm câu trả lời của từng câu hỏi - sử dụng dữ liệu thực từ database
+            for q in questions:
+                q_id = str(q.get("id", ""))
+                user_ans = responses.get(q_id, [])
+                
+                # Đảm bảo user_ans là list
+                if not isinstance(user_ans, list):
+                    if user_ans is not None:
+                        user_ans = [user_ans]
+                    else:
+                        user_ans = []
+                
+                # Đảm bảo q["correct"] và q["answers"] có định dạng đúng (đã được normalize ở trên)
+                q_correct = decode_correct(q.get("correct"))
+                q_answers = decode_answers(q.get("answers"))
+                
+                try:
+                    expected = [q_answers[i - 1] for i in q_correct]
+                except (IndexError, TypeError):
+                    expected = ["Lỗi đáp án"]
+                    
+                # Kết quả đã chấm lúc nộp bài (chấm lại nếu câu hỏi đã được sửa)
+                is_correct = question_result(s, q, user_ans).correct
+                
+                # Thêm thông tin câu hỏi
+                submission_data[f"Câu {q_id}: {q.get('question', '')}"] = ", ".join([str(a) for a in user_ans]) if user_ans else "Không trả lời"
+                submission_data[f"Câu {q_id} - Đúng/Sai"] = "Đúng" if is_correct else "Sai"
+            
+            all_submission_data.append(submission_data)
+        except Exception as e:
+            st.error(f"Lỗi khi xử lý submission ID {s.get('id', '')}: {str(e)}")
+    
+    return pd.DataFrame(all_submission_data) if all_submission_data else pd.DataFrame()
+
 def view_statistics():
     """Hiển thị trang thống kê và báo cáo"""
     st.title("📊 Báo cáo & thống kê")
@@ -4098,70 +3845,47 @@ def view_statistics():
     df_all_submissions = pd.DataFrame()
     
     try:
-        # Lấy dữ liệu THỰC từ database - KHÔNG dùng mock/fake data
-        # Đảm bảo import từ database_helper (nơi có hàm thực)
-        try:
-            from database_helper import get_all_questions as db_get_all_questions
-            questions = db_get_all_questions()
-            print(f"✓ Đã load {len(questions)} câu hỏi từ database (database_helper)")
-        except ImportError:
-            print("⚠️ Warning: Không thể import get_all_questions từ database_helper, dùng fallback")
-            questions = get_all_questions()  # Fallback to mock (chỉ khi không có database_helper)
+        # Thông tin số users được điền sau khi tải, nhưng vẫn nằm trên form tìm kiếm
+        users_info = st.sidebar.empty()
+        
+        # Tạo form tìm kiếm email nếu muốn xem báo cáo theo học viên cụ thể
+        with st.sidebar:
+            st.subheader("Tìm kiếm học viên")
+            search_email = st.text_input("Nhập email học viên:", key="search_email_stats")
+            search_button = st.button("Tìm kiếm", key="search_button_stats")
+        searching = bool(search_button and search_email)
+        
+        # Lấy dữ liệu THỰC từ database - KHÔNG dùng mock/fake data.
+        # Câu hỏi, users và bài nộp độc lập nhau nên được tải song song:
+        # thời gian chờ ≈ truy vấn chậm nhất thay vì tổng các truy vấn
+        from database_helper import SUBMISSION_REPORT_COLUMNS
+        loaded = fetch_concurrently(
+            questions=get_all_questions_async(),
+            # Lấy TẤT CẢ users từ database (bao gồm "Học viên", "student", "admin")
+            students=get_all_students_async(),
+            # Báo cáo chỉ dùng các cột này - không tải essay_grades/essay_comments
+            submissions=(get_user_submissions_async(search_email) if searching
+                         else get_all_submissions_async(columns=SUBMISSION_REPORT_COLUMNS)),
+        )
+        questions = loaded["questions"]
+        students = loaded["students"]
+        submissions = loaded["submissions"]
+        print(f"✓ Đã load {len(questions)} câu hỏi, {len(students)} users, {len(submissions)} bài nộp từ database")
         
         # Validate và normalize questions - đảm bảo parse JSON đúng cách
-        validated_questions = []
-        for q in questions:
-            if not isinstance(q, dict):
-                print(f"Warning: Bỏ qua câu hỏi không hợp lệ (không phải dict)")
-                continue
-            
-            # Parse answers từ JSON string nếu cần (từ database)
-            if isinstance(q.get("answers"), str):
-                try:
-                    q["answers"] = json.loads(q["answers"])
-                except:
-                    try:
-                        q["answers"] = [q["answers"]]
-                    except:
-                        q["answers"] = []
-            
-            # Parse correct từ JSON string nếu cần (từ database)
-            if isinstance(q.get("correct"), str):
-                try:
-                    q["correct"] = json.loads(q["correct"])
-                except:
-                    try:
-                        q["correct"] = [int(x.strip()) for x in q["correct"].split(",")]
-                    except:
-                        q["correct"] = []
-            
-            # Đảm bảo là list
-            if not isinstance(q.get("answers"), list):
-                q["answers"] = []
-            if not isinstance(q.get("correct"), list):
-                q["correct"] = []
-            
-            validated_questions.append(q)
-        questions = validated_questions
+        questions = [normalize_question(q) for q in questions if isinstance(q, dict)]
         
         if not questions:
             st.warning("⚠️ Không có câu hỏi nào được load từ database. Kiểm tra kết nối Supabase.")
         
-        # Lấy TẤT CẢ users từ database (bao gồm "Học viên", "student", "admin")
-        try:
-            from database_helper import get_all_students
-            students = get_all_students()
-            print(f"✓ Đã load {len(students)} users từ database (get_all_students)")
-        except ImportError:
-            # Fallback nếu hàm chưa có
-            students = get_all_users(role=["Học viên", "student", "admin"])
-            print(f"✓ Đã load {len(students)} users từ database (get_all_users - fallback)")
         if not students:
-            # Thử load từng role riêng
-            students_hv = get_all_users(role="Học viên") if 'get_all_users' in globals() else []
-            students_st = get_all_users(role="student") if 'get_all_users' in globals() else []
-            students_ad = get_all_users(role="admin") if 'get_all_users' in globals() else []
-            students = students_hv + students_st + students_ad
+            # Thử load từng role riêng (song song)
+            by_role = fetch_concurrently(
+                students_hv=get_all_users_async(role="Học viên"),
+                students_st=get_all_users_async(role="student"),
+                students_ad=get_all_users_async(role="admin"),
+            )
+            students = by_role["students_hv"] + by_role["students_st"] + by_role["students_ad"]
         
         # Debug: hiển thị số lượng users được load
         if students:
@@ -4170,81 +3894,19 @@ def view_statistics():
                 role = s.get("role", "Unknown")
                 role_counts[role] = role_counts.get(role, 0) + 1
             role_info = ", ".join([f"{r}: {c}" for r, c in role_counts.items()])
-            st.sidebar.info(f"📊 Đã load {len(students)} users từ database ({role_info})")
+            users_info.info(f"📊 Đã load {len(students)} users từ database ({role_info})")
         else:
-            st.sidebar.warning("⚠️ Không tìm thấy users nào trong database")
-        
-        # Tạo form tìm kiếm email nếu muốn xem báo cáo theo học viên cụ thể
-        with st.sidebar:
-            st.subheader("Tìm kiếm học viên")
-            search_email = st.text_input("Nhập email học viên:", key="search_email_stats")
-            search_button = st.button("Tìm kiếm", key="search_button_stats")
+            users_info.warning("⚠️ Không tìm thấy users nào trong database")
         
-        if search_button and search_email:
-            submissions = get_user_submissions(search_email)
+        if searching:
             if not submissions:
                 st.warning(f"Không tìm thấy bài nộp của học viên: {search_email}")
                 return
         else:
-            # Lấy tất cả bài nộp trực tiếp từ database (hiệu quả hơn) - KHÔNG dùng mock
-            try:
-                # Đảm bảo import từ database_helper
-                try:
-                    from database_helper import get_all_submissions as db_get_all_submissions
-                    submissions = db_get_all_submissions()
-                    print(f"✓ Đã load {len(submissions)} bài nộp từ database (database_helper)")
-                except ImportError:
-                    print("⚠️ Warning: Không thể import get_all_submissions từ database_helper")
-                    submissions = get_all_submissions()  # Fallback
-                
-                # Validate và parse responses từ JSON cho mỗi submission
-                validated_submissions = []
-                for s in submissions:
-                    if not isinstance(s, dict):
-                        continue
-                    
-                    # Parse responses từ JSON string nếu cần (từ database)
-                    if isinstance(s.get("responses"), str):
-                        try:
-                            s["responses"] = json.loads(s["responses"])
-                        except json.JSONDecodeError as e:
-                            print(f"Warning: Lỗi parse responses cho submission {s.get('id', 'N/A')}: {e}")
-                            s["responses"] = {}
-                    
-                    # Đảm bảo responses là dict
-                    if not isinstance(s.get("responses"), dict):
-                        s["responses"] = {}
-                    
-                    validated_submissions.append(s)
-                
-                submissions = validated_submissions
-                
-            except Exception as e:
-                st.error(f"Lỗi khi lấy dữ liệu bài nộp từ Supabase: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                # Fallback: thử lấy từng học viên nếu lỗi
-                st.info("Đang thử cách khác...")
-                submissions = []
-                for student in students:
-                    try:
-                        try:
-                            from database_helper import get_user_submissions as db_get_user_submissions
-                            student_submissions = db_get_user_submissions(student.get("email", ""))
-                        except ImportError:
-                            student_submissions = get_user_submissions(student.get("email", ""))
-
-                        if student_submissions:
-                            # Validate responses cho mỗi submission
-                            for sub in student_submissions:
-                                if isinstance(sub.get("responses"), str):
-                                    try:
-                                        sub["responses"] = json.loads(sub["responses"])
-                                    except:
-                                        sub["responses"] = {}
-                            submissions.extend(student_submissions)
-                    except Exception as ex:
-                        print(f"Lỗi khi lấy dữ liệu của học viên {student.get('email', '')}: {str(ex)}")
+            # Tất cả bài nộp đã được tải ở trên - KHÔNG dùng mock. Bài nộp là
+            # models.Submission: responses được giải mã (dict, dữ liệu lỗi
+            # thành {}) khi đọc lần đầu
+            submissions = [s for s in submissions if isinstance(s, Mapping)]
         
         if not questions:
             st.warning("⚠️ Chưa có dữ liệu câu hỏi nào trong hệ thống. Vui lòng thêm câu hỏi trước.")
@@ -4285,109 +3947,8 @@ def view_statistics():
         # Tính tổng điểm tối đa
         max_possible = sum([q.get("score", 0) for q in questions])
         
-        # Chuẩn bị dữ liệu cho tất cả các submissions
-        all_submission_data = []
-        
-        for s in submissions:
-            try:
-                # Tìm thông tin học viên
-                student_info = next((student for student in students if student.get("email") == s.get("user_email")), None)
-                full_name = student_info.get("full_name", "Không xác định") if student_info else "Không xác định"
-                class_name = student_info.get("class", "Không xác định") if student_info else "Không xác định"
-                
-                # Chuyển đổi timestamp sang định dạng đọc được
-                submission_time = "Không xác định"
-                if isinstance(s.get("timestamp"), (int, float)):
-                    try:
-                        submission_time = datetime.fromtimestamp(s.get("timestamp")).strftime("%d/%m/%Y %H:%M:%S")
-                    except:
-                        pass
-                else:
-                    try:
-                        dt = datetime.fromisoformat(s.get("timestamp", "").replace("Z", "+00:00"))
-                        submission_time = dt.strftime("%d/%m/%Y %H:%M:%S")
-                    except:
-                        pass
-                
-                # Thêm thông tin cơ bản
-                submission_data = {
-                    "ID": s.get("id", ""),
-                    "Email": s.get("user_email", ""),
-                    "Họ và tên": full_name,
-                    "Lớp": class_name,
-                    "Thời gian nộp": submission_time,
-                    "Điểm số": s.get("score", 0),
-                    "Điểm tối đa": max_possible,
-                    "Tỷ lệ đúng": f"{(s.get('score', 0)/max_possible*100):.1f}%" if max_possible > 0 else "N/A"
-                }
-                
-                # Chuyển đổi responses từ JSON string thành dict từ database
-                responses = s.get("responses", {})
-                if isinstance(responses, str):
-                    try:
-                        responses = json.loads(responses)
-                    except json.JSONDecodeError as e:
-                        print(f"Lỗi parse responses cho submission {s.get('id', 'N/A')}: {e}")
-                        responses = {}
-                
-                # Đảm bảo responses là dict
-                if not isinstance(responses, dict):
-                    responses = {}
-                
-                # Thêm câu trả lời của từng câu hỏi - sử dụng dữ liệu thực từ database
-                for q in questions:
-                    q_id = str(q.get("id", ""))
-                    user_ans = responses.get(q_id, [])
-                    
-                    # Đảm bảo user_ans là list
-                    if not isinstance(user_ans, list):
-                        if user_ans is not None:
-                            user_ans = [user_ans]
-                        else:
-                            user_ans = []
-                    
-                    # Đảm bảo q["correct"] và q["answers"] có định dạng đúng (đã được normalize ở trên)
-                    q_correct = q.get("correct", [])
-                    q_answers = q.get("answers", [])
-                    
-                    # Parse nếu chưa được normalize (backup)
-                    if isinstance(q_correct, str):
-                        try:
-                            q_correct = json.loads(q_correct)
-                        except:
-                            try:
-                                q_correct = [int(x.strip()) for x in q_correct.split(",")]
-                            except:
-                                q_correct = []
-                    
-                    if isinstance(q_answers, str):
-                        try:
-                            q_answers = json.loads(q_answers)
-                        except:
-                            q_answers = [q_answers]
-                    
-                    try:
-                        expected = [q_answers[i - 1] for i in q_correct]
-                    except (IndexError, TypeError):
-                        expected = ["Lỗi đáp án"]
-                        
-                    # Sử dụng hàm từ database_helper (không dùng mock)
-                    try:
-                        from database_helper import check_answer_correctness as db_check_answer
-                        is_correct = db_check_answer(user_ans, q)
-                    except ImportError:
-                        is_correct = check_answer_correctness(user_ans, q)
-                    
-                    # Thêm thông tin câu hỏi
-                    submission_data[f"Câu {q_id}: {q.get('question', '')}"] = ", ".join([str(a) for a in user_ans]) if user_ans else "Không trả lời"
-                    submission_data[f"Câu {q_id} - Đúng/Sai"] = "Đúng" if is_correct else "Sai"
-                
-                all_submission_data.append(submission_data)
-            except Exception as e:
-                st.error(f"Lỗi khi xử lý submission ID {s.get('id', '')}: {str(e)}")
-        
         # DataFrame chứa tất cả bài nộp
-        df_all_submissions = pd.DataFrame(all_submission_data) if all_submission_data else pd.DataFrame()
+        df_all_submissions = build_submissions_dataframe(submissions, students, questions, max_possible)
         
         with tab1:
             display_overview_tab(submissions, students, questions, max_possible)
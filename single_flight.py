@@ -0,0 +1,125 @@
+"""Gộp các lần đọc giống nhau đang chạy đồng thời (single-flight).
+
+Khi nhiều phiên Streamlit (mỗi phiên một luồng) cùng cần một dữ liệu - vd. lúc
+bắt đầu thi hàng trăm học viên đăng nhập cùng lúc và đều tải danh mục câu hỏi -
+chỉ luồng đầu tiên gửi truy vấn tới database; các luồng đến sau với cùng khóa
+chờ và nhận chung kết quả (hoặc chung lỗi) của lần gọi đó.
+
+Chỉ gộp các lần gọi *đang chạy*: khi lần gọi kết thúc, lần gọi sau với cùng
+khóa lại truy vấn database. Kết quả được dùng chung giữa các phiên nên hàm
+truyền vào nên trả về dữ liệu chỉ đọc (tuple, models.Question...) hoặc bên gọi
+phải tự sao chép trước khi sửa.
+
+Tắt bằng biến môi trường ``SINGLE_FLIGHT=0``.
+"""
+import os
+import threading
+
+_state = {"enabled": os.environ.get("SINGLE_FLIGHT", "1").strip().lower() not in ("0", "false", "no", "off")}
+_groups = []
+_groups_lock = threading.Lock()
+
+
+def is_enabled():
+    return _state["enabled"]
+
+
+def set_enabled(enabled):
+    """Bật/tắt gộp truy vấn (áp dụng cho toàn bộ tiến trình)"""
+    _state["enabled"] = bool(enabled)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "abandoned", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Một nhóm gộp truy vấn; mỗi loại dữ liệu (câu hỏi, người dùng...) dùng một nhóm riêng"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"calls": 0, "executions": 0, "collapsed": 0, "errors": 0, "max_waiters": 0}
+        with _groups_lock:
+            _groups.append(self)
+
+    def do(self, key, func):
+        """Gọi func() hoặc chờ lần gọi cùng khóa đang chạy; trả về kết quả dùng chung"""
+        if not _state["enabled"]:
+            with self._lock:
+                self._stats["calls"] += 1
+                self._stats["executions"] += 1
+            return func()
+
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats["collapsed"] += 1
+                self._stats["max_waiters"] = max(self._stats["max_waiters"], call.waiters)
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._stats["executions"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.abandoned:
+                # Luồng dẫn bị dừng giữa chừng (vd. phiên Streamlit bị dừng/rerun):
+                # không có kết quả để dùng chung, tự gọi lại
+                return self.do(key, func)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        except BaseException:
+            call.abandoned = True
+            raise
+        finally:
+            # Bỏ khỏi danh sách trước khi báo xong: lần gọi sau sẽ truy vấn mới
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(name=self.name, **self._stats, in_flight=len(self._calls))
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            for field in self._stats:
+                self._stats[field] = 0
+
+
+def all_stats():
+    """Thống kê của mọi nhóm: calls (số lần gọi), executions (số truy vấn thật),
+    collapsed (số lần gọi được gộp vào truy vấn đang chạy)"""
+    with _groups_lock:
+        groups = list(_groups)
+    return [group.stats() for group in groups]
+
+
+def reset_stats():
+    with _groups_lock:
+        groups = list(_groups)
+    for group in groups:
+        group.reset_stats()
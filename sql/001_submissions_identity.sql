@@ -0,0 +1,27 @@
+-- Để database tự sinh submissions.id (identity) thay cho cách "max(id) + 1"
+-- phía ứng dụng. Nhiều học viên nộp bài cùng lúc sẽ không còn trùng khóa,
+-- và mỗi lần nộp chỉ cần một lệnh INSERT ... RETURNING.
+--
+-- Chạy một lần trong Supabase SQL Editor. Có thể chạy lại an toàn.
+
+do $$
+declare
+    next_id bigint;
+begin
+    if not exists (
+        select 1
+        from information_schema.columns
+        where table_schema = 'public'
+          and table_name = 'submissions'
+          and column_name = 'id'
+          and is_identity = 'YES'
+    ) then
+        alter table public.submissions alter column id drop default;
+        alter table public.submissions alter column id add generated by default as identity;
+    end if;
+
+    -- Bắt đầu sau id lớn nhất hiện có để không đụng dữ liệu cũ
+    select coalesce(max(id), 0) + 1 into next_id from public.submissions;
+    execute format('alter table public.submissions alter column id restart with %s', next_id);
+end
+$$;
@@ -0,0 +1,131 @@
+-- Thống kê bài nộp tính ngay trên database (dùng cho get_submission_statistics).
+-- Ứng dụng chỉ đọc vài dòng tổng hợp thay vì tải toàn bộ bảng submissions:
+--
+--   submission_summary      1 dòng: tổng số bài, số học viên, tổng điểm
+--   submission_daily_counts mỗi ngày 1 dòng: số bài nộp
+--   question_correct_stats  mỗi câu hỏi 1 dòng: số người trả lời, số trả lời đúng
+--
+-- Quy tắc chấm giống grading.py:
+--   Checkbox: tập đáp án đã chọn trùng khớp tập đáp án đúng
+--   Combobox: chọn đúng một đáp án và đáp án đó nằm trong tập đúng
+--   Essay:    có nội dung (không rỗng)
+--
+-- Chạy trong Supabase SQL Editor sau 001. Có thể chạy lại an toàn.
+-- Bản tương đương cho SQLite (chạy thử cục bộ): sql/sqlite/002_submission_statistics_views.sql
+
+-- JSON lưu dạng text (json.dumps) => đổi sang jsonb, dữ liệu hỏng trả về NULL
+create or replace function public.try_jsonb(value text)
+returns jsonb
+language plpgsql
+immutable
+as $$
+begin
+    return value::jsonb;
+exception when others then
+    return null;
+end;
+$$;
+
+-- Số thứ tự (bắt đầu từ 1) của lần xuất hiện đầu tiên của answer trong options
+create or replace function public.answer_position(options jsonb, answer jsonb)
+returns integer
+language sql
+immutable
+as $$
+    select min(o.position)::integer
+    from jsonb_array_elements(case when jsonb_typeof(options) = 'array' then options else '[]'::jsonb end)
+        with ordinality as o(value, position)
+    where o.value = answer
+$$;
+
+-- Kiểm tra một câu trả lời (mảng JSON) theo loại câu hỏi
+create or replace function public.answer_is_correct(question_type text, options jsonb, correct jsonb, answers jsonb)
+returns boolean
+language sql
+immutable
+as $$
+    with correct_values as (
+        select case when jsonb_typeof(c.value) = 'number' then (c.value #>> '{}')::numeric end as number
+        from jsonb_array_elements(case when jsonb_typeof(correct) = 'array' then correct else '[]'::jsonb end) as c(value)
+    ),
+    valid_correct as (
+        -- Đáp án đúng hợp lệ: số nguyên >= 1 (1.0 cũng được, chữ hay true/false thì không)
+        select distinct number::integer as position
+        from correct_values
+        where number >= 1 and number = trunc(number)
+    ),
+    selected as (
+        select distinct public.answer_position(options, a.value) as position
+        from jsonb_array_elements(case when jsonb_typeof(answers) = 'array' then answers else '[]'::jsonb end) as a(value)
+    )
+    select case
+        when jsonb_typeof(answers) is distinct from 'array' then false
+        when jsonb_array_length(answers) = 0 then false
+        when question_type = 'Checkbox' then
+            -- Có giá trị không hợp lệ trong "correct" thì không bao giờ khớp
+            not exists (
+                select 1 from correct_values
+                where number is null or number < 1 or number <> trunc(number)
+            )
+            and array(select position from selected where position is not null order by 1)
+                = array(select position from valid_correct order by 1)
+        when question_type = 'Combobox' then
+            jsonb_array_length(answers) = 1
+            and coalesce(public.answer_position(options, answers -> 0) in (select position from valid_correct), false)
+        when question_type = 'Essay' then
+            jsonb_typeof(answers -> 0) = 'string' and (answers ->> 0) ~ '\S'
+        else false
+    end
+$$;
+
+create or replace view public.submission_summary
+with (security_invoker = on) as
+select
+    count(*) as total_submissions,
+    count(distinct user_email) as student_count,
+    coalesce(sum(score), 0) as score_sum
+from public.submissions;
+
+create or replace view public.submission_daily_counts
+with (security_invoker = on) as
+select
+    case
+        -- Dữ liệu cũ lưu Unix timestamp
+        when "timestamp"::text ~ '^[0-9]+(\.[0-9]+)?$'
+            then to_char(to_timestamp("timestamp"::text::double precision), 'YYYY-MM-DD')
+        else coalesce(left("timestamp"::text, 10), to_char(current_date, 'YYYY-MM-DD'))
+    end as day,
+    count(*) as submission_count
+from public.submissions
+group by 1;
+
+create or replace view public.question_correct_stats
+with (security_invoker = on) as
+with q as (
+    select
+        id,
+        type,
+        -- Giống _normalize_question: answers không phải JSON => một đáp án duy nhất,
+        -- correct dạng "1,2" => [1, 2]
+        coalesce(public.try_jsonb(answers::text), jsonb_build_array(answers::text)) as options,
+        coalesce(public.try_jsonb(correct::text), public.try_jsonb('[' || correct::text || ']')) as correct
+    from public.questions
+),
+s as (
+    select id, public.try_jsonb(responses::text) as responses
+    from public.submissions
+)
+select
+    q.id as question_id,
+    count(s.id) as total_answers,
+    count(s.id) filter (
+        where public.answer_is_correct(q.type, q.options, q.correct, s.responses -> q.id::text)
+    ) as correct_count
+from q
+left join s
+    on jsonb_typeof(s.responses) = 'object'
+   and s.responses ? q.id::text
+group by q.id;
+
+grant select on public.submission_summary, public.submission_daily_counts, public.question_correct_stats
+    to anon, authenticated;
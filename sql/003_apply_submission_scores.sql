@@ -0,0 +1,28 @@
+-- Ghi điểm mới cho nhiều bài nộp trong một lệnh (dùng khi chấm lại bài nộp
+-- sau khi sửa đáp án / điểm câu hỏi, xem regrade_question_submissions).
+--
+--   updates: mảng JSON [{"id": 1, "old_score": 7, "score": 8}, ...]
+--
+-- Bài nộp chỉ được cập nhật nếu điểm hiện tại vẫn là old_score, để không ghi
+-- đè điểm vừa bị sửa ở nơi khác (vd. chấm tự luận) trong lúc đang chấm lại.
+-- Trả về số bài đã cập nhật.
+--
+-- Chạy trong Supabase SQL Editor sau 002. Có thể chạy lại an toàn.
+
+create or replace function public.apply_submission_scores(updates jsonb)
+returns integer
+language sql
+security invoker
+as $$
+    with changed as (
+        update public.submissions s
+        set score = (u.value ->> 'score')::numeric
+        from jsonb_array_elements(updates) as u(value)
+        where s.id = (u.value ->> 'id')::bigint
+          and s.score is not distinct from (u.value ->> 'old_score')::numeric
+        returning s.id
+    )
+    select count(*)::integer from changed;
+$$;
+
+grant execute on function public.apply_submission_scores(jsonb) to anon, authenticated;
@@ -0,0 +1,95 @@
+-- Lưu từng câu trả lời thành một dòng (bên cạnh submissions.responses) để
+-- thống kê theo câu hỏi chỉ cần đọc index, không phải tải và giải mã JSON
+-- của mọi bài nộp:
+--
+--   submission_answers          mỗi (bài nộp, câu hỏi đã trả lời) 1 dòng:
+--                               bitmask đáp án đã chọn (bit i-1 <=> đáp án i),
+--                               nội dung tự luận, đúng/sai
+--   question_answer_stats       như question_correct_stats nhưng tính từ submission_answers
+--   submission_answers_coverage số bài nộp chưa có dòng trong submission_answers
+--
+-- Ứng dụng ghi các dòng khi nộp bài (index_submission_answers) và cập nhật lại
+-- khi chấm lại một câu hỏi đã sửa. Bài nộp cũ được bổ sung bằng
+-- ``python backfill_submission_answers.py``; get_submission_statistics chỉ dùng
+-- question_answer_stats khi không còn bài nộp nào chưa có dòng.
+--
+-- Chạy trong Supabase SQL Editor sau 003. Có thể chạy lại an toàn.
+-- Bản tương đương cho SQLite: sql/sqlite/004_submission_answers.sql
+
+alter table public.submissions
+    add column if not exists answers_indexed boolean not null default false;
+
+-- Tìm bài nộp chưa có dòng (bổ sung dữ liệu cũ, submission_answers_coverage)
+create index if not exists submissions_answers_pending_idx
+    on public.submissions (id) where not answers_indexed;
+
+create table if not exists public.submission_answers (
+    submission_id bigint not null references public.submissions (id) on delete cascade,
+    question_id bigint not null,
+    -- NULL với câu tự luận, hoặc khi câu hỏi có hơn 63 đáp án
+    selected_mask bigint,
+    essay_text text,
+    is_correct boolean not null default false,
+    primary key (submission_id, question_id)
+);
+
+-- Thống kê theo câu hỏi chỉ đọc index (index-only scan)
+create index if not exists submission_answers_question_correct_idx
+    on public.submission_answers (question_id, is_correct);
+
+-- Ghi (hoặc ghi đè) các dòng câu trả lời và đánh dấu các bài nộp đã có đủ dòng.
+--
+--   answers:     [{"submission_id", "question_id", "selected_mask", "essay_text", "is_correct"}, ...]
+--   indexed_ids: id các bài nộp vừa được ghi đủ mọi câu trả lời ([] khi chỉ
+--                cập nhật một câu hỏi, vd. lúc chấm lại)
+--
+-- Trả về số dòng đã ghi.
+create or replace function public.index_submission_answers(answers jsonb, indexed_ids jsonb default '[]'::jsonb)
+returns integer
+language sql
+security invoker
+as $$
+    with written as (
+        insert into public.submission_answers (submission_id, question_id, selected_mask, essay_text, is_correct)
+        select
+            (a.value ->> 'submission_id')::bigint,
+            (a.value ->> 'question_id')::bigint,
+            (a.value ->> 'selected_mask')::bigint,
+            a.value ->> 'essay_text',
+            coalesce((a.value ->> 'is_correct')::boolean, false)
+        from jsonb_array_elements(answers) as a(value)
+        on conflict (submission_id, question_id) do update
+            set selected_mask = excluded.selected_mask,
+                essay_text = excluded.essay_text,
+                is_correct = excluded.is_correct
+        returning 1
+    ),
+    marked as (
+        update public.submissions
+        set answers_indexed = true
+        where id in (select value::bigint from jsonb_array_elements_text(indexed_ids))
+        returning 1
+    )
+    select count(*)::integer from written;
+$$;
+
+grant execute on function public.index_submission_answers(jsonb, jsonb) to anon, authenticated;
+grant select, insert, update on public.submission_answers to anon, authenticated;
+
+create or replace view public.question_answer_stats
+with (security_invoker = on) as
+select
+    question_id,
+    count(*) as total_answers,
+    count(*) filter (where is_correct) as correct_count
+from public.submission_answers
+group by question_id;
+
+create or replace view public.submission_answers_coverage
+with (security_invoker = on) as
+select count(*) as pending_submissions
+from public.submissions
+where not answers_indexed;
+
+grant select on public.question_answer_stats, public.submission_answers_coverage
+    to anon, authenticated;
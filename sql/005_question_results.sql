@@ -0,0 +1,17 @@
+-- Kết quả từng câu hỏi của bài nộp, tính một lần lúc nộp bài để các màn hình
+-- lịch sử / báo cáo không phải chấm lại mỗi lần hiển thị:
+--
+--   question_results  JSON text {question_id: [trạng thái, điểm đạt được, tag]}
+--                     trạng thái: "c" đúng, "i" sai, "s" bỏ qua
+--                     tag: dấu vân tay khóa đáp án lúc chấm (grading.AnswerKey.tag)
+--
+-- Ứng dụng chỉ dùng mục có tag trùng với khóa đáp án hiện tại; câu hỏi đã bị
+-- sửa đáp án / điểm và bài nộp cũ (NULL) được chấm lại khi hiển thị như trước.
+-- Lưu dạng text như cột responses.
+--
+-- Chạy trong Supabase SQL Editor. Có thể chạy lại an toàn. Database chưa có
+-- cột này thì ứng dụng vẫn lưu / đọc bài nộp bình thường (không có kết quả lưu sẵn).
+-- SQLite: cột được thêm khi mở database (sqlite_backend.ADDED_COLUMNS).
+
+alter table public.submissions
+    add column if not exists question_results text;
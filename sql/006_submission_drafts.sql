@@ -0,0 +1,60 @@
+-- Bản nháp bài đang làm: mỗi học viên tối đa một bản (lượt làm bài hiện tại),
+-- để khôi phục câu trả lời khi trình duyệt mất kết nối giữa giờ thi:
+--
+--   submission_drafts        user_email, lượt làm bài, trang đang xem,
+--                            câu trả lời (JSON text như submissions.responses)
+--   save_submission_drafts   ghi đè một lô bản nháp và xóa bản nháp của các
+--                            học viên vừa nộp bài, trong một lệnh
+--
+-- Ứng dụng gom bản nháp trong bộ nhớ và ghi theo lô (drafts.py), không ghi
+-- mỗi lần học viên thao tác. Database chưa có bảng này thì ứng dụng chạy như
+-- trước (không lưu nháp).
+--
+-- Chạy trong Supabase SQL Editor. Có thể chạy lại an toàn.
+-- Bản tương đương cho SQLite: sql/sqlite/006_submission_drafts.sql
+
+create table if not exists public.submission_drafts (
+    user_email text primary key,
+    attempt_index integer not null,
+    page integer not null default 0,
+    responses text not null,
+    updated_at timestamptz not null default now()
+);
+
+-- Ghi (hoặc ghi đè) bản nháp và xóa bản nháp.
+--
+--   drafts:  [{"user_email", "attempt_index", "page", "responses"}, ...]
+--   deleted: ["email", ...] (không trùng với email trong drafts)
+--
+-- Trả về số bản nháp đã ghi.
+create or replace function public.save_submission_drafts(drafts jsonb, deleted jsonb default '[]'::jsonb)
+returns integer
+language sql
+security invoker
+as $$
+    with removed as (
+        delete from public.submission_drafts
+        where user_email in (select value from jsonb_array_elements_text(deleted))
+        returning 1
+    ),
+    written as (
+        insert into public.submission_drafts (user_email, attempt_index, page, responses, updated_at)
+        select
+            d.value ->> 'user_email',
+            (d.value ->> 'attempt_index')::integer,
+            coalesce((d.value ->> 'page')::integer, 0),
+            d.value ->> 'responses',
+            now()
+        from jsonb_array_elements(drafts) as d(value)
+        on conflict (user_email) do update
+            set attempt_index = excluded.attempt_index,
+                page = excluded.page,
+                responses = excluded.responses,
+                updated_at = excluded.updated_at
+        returning 1
+    )
+    select count(*)::integer from written;
+$$;
+
+grant execute on function public.save_submission_drafts(jsonb, jsonb) to anon, authenticated;
+grant select, insert, update, delete on public.submission_drafts to anon, authenticated;
@@ -0,0 +1,45 @@
+-- Mã nộp bài (idempotency token): mỗi lượt làm bài mang một mã do ứng dụng
+-- sinh; database bảo đảm mỗi mã chỉ có một bài nộp. Nộp lại cùng một lượt
+-- (bấm "Gửi đáp án" hai lần, rerun của Streamlit, luồng spool ghi lại một lô
+-- đã ghi nhưng mất phản hồi) không tạo dòng mới mà trả về bài nộp đã có:
+--
+--   submissions.submit_token   mã nộp bài (NULL với bài nộp cũ), unique
+--   insert_submissions         ghi một lô bài nộp; bài có mã đã tồn tại
+--                              không bị ghi lại, trả về dòng đã có
+--
+-- Chạy trong Supabase SQL Editor sau 005. Có thể chạy lại an toàn. Database
+-- chưa có hàm này thì ứng dụng ghi bài nộp như trước (không chống trùng).
+-- SQLite: cột được thêm khi mở database (sqlite_backend.ADDED_COLUMNS), index
+-- trong sql/sqlite/007_submit_tokens.sql, hàm: SqliteClient._rpc_insert_submissions.
+
+alter table public.submissions
+    add column if not exists submit_token text;
+
+-- Unique cho phép nhiều NULL (bài nộp cũ)
+create unique index if not exists submissions_submit_token_key
+    on public.submissions (submit_token);
+
+-- Ghi một lô bài nộp (mỗi mã nộp bài tối đa một lần trong lô).
+--
+--   submissions: [{"user_email", "responses", "score", "timestamp",
+--                  "question_results", "submit_token"}, ...]
+--
+-- Trả về các dòng bài nộp (kèm id): dòng vừa ghi, hoặc dòng đã có nếu mã nộp
+-- bài đã tồn tại (do update không đổi giá trị nào, RETURNING trả về dòng cũ).
+create or replace function public.insert_submissions(submissions jsonb)
+returns setof public.submissions
+language sql
+security invoker
+as $$
+    insert into public.submissions (user_email, responses, score, "timestamp", question_results, submit_token)
+    select s.user_email, s.responses, s.score, s."timestamp", s.question_results, s.submit_token
+    from jsonb_array_elements(submissions) with ordinality as e(submission, position)
+    cross join lateral jsonb_populate_record(null::public.submissions, e.submission) as s
+    -- Ghi (và trả về) theo thứ tự của lô
+    order by e.position
+    on conflict (submit_token) do update
+        set submit_token = excluded.submit_token
+    returning *;
+$$;
+
+grant execute on function public.insert_submissions(jsonb) to anon, authenticated;
@@ -0,0 +1,34 @@
+-- Ghi điểm mới cùng kết quả từng câu hỏi cho nhiều bài nộp trong một lệnh
+-- (dùng khi chấm lại bài nộp sau khi sửa đáp án / điểm câu hỏi, xem
+-- regrade_question_submissions).
+--
+--   updates: mảng JSON [{"id": 1, "old_score": 7, "score": 8,
+--                        "question_results": "{...}"}, ...]
+--
+-- Giống apply_submission_scores (003) nhưng ghi cả question_results (005) -
+-- mục của câu hỏi vừa chấm lại mang tag của khóa đáp án mới - trong cùng một
+-- lệnh UPDATE, nên chấm lại lần nữa không cộng điểm lần hai. Bài nộp chỉ được
+-- cập nhật nếu điểm hiện tại vẫn là old_score. Trả về số bài đã cập nhật.
+--
+-- Chạy trong Supabase SQL Editor sau 005. Có thể chạy lại an toàn. Database
+-- chưa có hàm này thì ứng dụng cập nhật từng bài nộp.
+-- SQLite: SqliteClient._rpc_apply_submission_results.
+
+create or replace function public.apply_submission_results(updates jsonb)
+returns integer
+language sql
+security invoker
+as $$
+    with changed as (
+        update public.submissions s
+        set score = (u.value ->> 'score')::numeric,
+            question_results = u.value ->> 'question_results'
+        from jsonb_array_elements(updates) as u(value)
+        where s.id = (u.value ->> 'id')::bigint
+          and s.score is not distinct from (u.value ->> 'old_score')::numeric
+        returning s.id
+    )
+    select count(*)::integer from changed;
+$$;
+
+grant execute on function public.apply_submission_results(jsonb) to anon, authenticated;
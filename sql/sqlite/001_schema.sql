@@ -0,0 +1,33 @@
+-- Lược đồ SQLite tương đương các bảng trên Supabase, dùng để chạy thử cục bộ
+-- (backend SQLite, các view thống kê, benchmark) mà không cần kết nối database thật.
+-- JSON (answers, correct, responses...) được lưu dạng text như trên Supabase.
+
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    question TEXT NOT NULL,
+    type TEXT NOT NULL,
+    answers TEXT NOT NULL DEFAULT '[]',
+    correct TEXT NOT NULL DEFAULT '[]',
+    score REAL NOT NULL DEFAULT 0,
+    answer_template TEXT
+);
+
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_email TEXT,
+    responses TEXT,
+    score REAL,
+    timestamp TEXT,
+    essay_grades TEXT,
+    essay_comments TEXT
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    password TEXT,
+    full_name TEXT,
+    role TEXT,
+    class TEXT,
+    registration_date TEXT,
+    first_login INTEGER DEFAULT 0
+);
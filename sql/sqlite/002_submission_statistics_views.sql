@@ -0,0 +1,125 @@
+-- Bản SQLite của sql/002_submission_statistics_views.sql: cùng tên view, cùng cột
+-- và cùng quy tắc chấm, để chạy thử get_submission_statistics cục bộ.
+-- Cần SQLite có hàm JSON (json_each, json_type...), có sẵn từ SQLite 3.38.
+
+DROP VIEW IF EXISTS submission_summary;
+CREATE VIEW submission_summary AS
+SELECT
+    count(*) AS total_submissions,
+    count(DISTINCT user_email) AS student_count,
+    coalesce(sum(score), 0) AS score_sum
+FROM submissions;
+
+DROP VIEW IF EXISTS submission_daily_counts;
+CREATE VIEW submission_daily_counts AS
+SELECT
+    CASE
+        -- Dữ liệu cũ lưu Unix timestamp
+        WHEN typeof(timestamp) IN ('integer', 'real')
+          OR (timestamp <> '' AND timestamp NOT GLOB '*[^0-9.]*')
+            THEN date(CAST(timestamp AS REAL), 'unixepoch', 'localtime')
+        ELSE coalesce(substr(timestamp, 1, 10), date('now', 'localtime'))
+    END AS day,
+    count(*) AS submission_count
+FROM submissions
+GROUP BY 1;
+
+DROP VIEW IF EXISTS question_correct_stats;
+CREATE VIEW question_correct_stats AS
+WITH q AS (
+    -- Giống _normalize_question: answers không phải JSON => một đáp án duy nhất,
+    -- correct dạng "1,2" => [1, 2]
+    SELECT
+        id,
+        type,
+        CASE WHEN json_valid(answers) AND json_type(answers) = 'array' THEN answers
+             ELSE json_array(answers) END AS options,
+        CASE WHEN json_valid(correct) AND json_type(correct) = 'array' THEN correct
+             WHEN json_valid('[' || correct || ']') THEN '[' || correct || ']'
+             ELSE '[]' END AS correct
+    FROM questions
+),
+options AS MATERIALIZED (
+    -- Số thứ tự (từ 1) của lần xuất hiện đầu tiên của mỗi đáp án
+    SELECT q.id AS question_id, o.type, o.value, min(o.key) + 1 AS position
+    FROM q, json_each(q.options) o
+    GROUP BY q.id, o.type, o.value
+),
+correct_values AS MATERIALIZED (
+    SELECT
+        q.id AS question_id,
+        c.type IN ('integer', 'real') AND c.value >= 1 AND c.value = CAST(c.value AS INTEGER) AS is_valid,
+        CAST(c.value AS INTEGER) AS position
+    FROM q, json_each(q.correct) c
+),
+valid_correct AS MATERIALIZED (
+    -- Đáp án đúng hợp lệ: số nguyên >= 1 (1.0 cũng được, chữ hay true/false thì không)
+    SELECT DISTINCT question_id, position FROM correct_values WHERE is_valid
+),
+answer_keys AS MATERIALIZED (
+    SELECT
+        q.id AS question_id,
+        CAST(q.id AS TEXT) AS question_key,
+        q.type,
+        (SELECT count(*) FROM valid_correct v WHERE v.question_id = q.id) AS correct_count,
+        -- Có giá trị không hợp lệ trong "correct" thì Checkbox không bao giờ khớp
+        EXISTS (SELECT 1 FROM correct_values c WHERE c.question_id = q.id AND NOT c.is_valid) AS unmatchable
+    FROM q
+),
+answered AS MATERIALIZED (
+    -- Mỗi (câu hỏi, bài nộp) có khóa câu hỏi trong responses
+    SELECT
+        k.question_id,
+        s.id AS submission_id,
+        r.type AS answers_type,
+        r.value AS answers
+    -- CROSS JOIN giữ thứ tự duyệt: mỗi responses chỉ được phân tích JSON một lần
+    FROM submissions s
+    CROSS JOIN json_each(CASE WHEN json_valid(s.responses) AND json_type(s.responses) = 'object'
+                              THEN s.responses ELSE '{}' END) r
+    CROSS JOIN answer_keys k ON k.question_key = r.key
+),
+selections AS MATERIALIZED (
+    -- Số đáp án (khác nhau, có trong danh sách) đã chọn và số đáp án đúng trong đó
+    SELECT
+        a.question_id,
+        a.submission_id,
+        count(DISTINCT o.position) AS selected_count,
+        count(DISTINCT v.position) AS selected_correct_count
+    FROM answered a
+    CROSS JOIN json_each(a.answers) x
+    CROSS JOIN options o ON o.question_id = a.question_id AND o.type = x.type AND o.value = x.value
+    LEFT JOIN valid_correct v ON v.question_id = a.question_id AND v.position = o.position
+    WHERE a.answers_type = 'array'
+    GROUP BY a.question_id, a.submission_id
+),
+graded AS (
+    SELECT
+        a.question_id,
+        a.submission_id,
+        CASE
+            -- Có khóa nhưng không phải mảng (null...) hoặc mảng rỗng: đã trả lời, không đúng
+            WHEN a.answers_type <> 'array' OR json_array_length(a.answers) = 0 THEN 0
+            WHEN k.type = 'Checkbox' THEN
+                NOT k.unmatchable
+                AND coalesce(sel.selected_count, 0) = k.correct_count
+                AND coalesce(sel.selected_correct_count, 0) = coalesce(sel.selected_count, 0)
+            WHEN k.type = 'Combobox' THEN
+                json_array_length(a.answers) = 1
+                AND coalesce(sel.selected_correct_count, 0) = 1
+            WHEN k.type = 'Essay' THEN
+                json_type(a.answers, '$[0]') = 'text'
+                AND trim(json_extract(a.answers, '$[0]'), ' ' || char(9, 10, 11, 12, 13)) <> ''
+            ELSE 0
+        END AS is_correct
+    FROM answered a
+    JOIN answer_keys k ON k.question_id = a.question_id
+    LEFT JOIN selections sel ON sel.question_id = a.question_id AND sel.submission_id = a.submission_id
+)
+SELECT
+    k.question_id,
+    count(g.submission_id) AS total_answers,
+    coalesce(sum(g.is_correct), 0) AS correct_count
+FROM answer_keys k
+LEFT JOIN graded g ON g.question_id = k.question_id
+GROUP BY k.question_id;
@@ -0,0 +1,14 @@
+-- Index cho các truy vấn thường dùng của ứng dụng khi chạy trên backend SQLite
+-- (sqlite_backend.py). Khóa chính submissions.id đã phục vụ việc đọc bài nộp
+-- theo trang (iter_submissions: order id giảm dần, lọc id < id cuối trang).
+
+-- Bài làm của một học viên, mới nhất trước (get_user_submissions, đếm số lần làm bài)
+CREATE INDEX IF NOT EXISTS submissions_user_email_timestamp_idx
+    ON submissions (user_email, timestamp DESC);
+
+-- Danh sách người dùng theo vai trò (get_all_users(role=...))
+CREATE INDEX IF NOT EXISTS users_role_idx ON users (role);
+
+-- Đăng nhập (get_user): email là khóa chính nên đã có index
+
+-- Câu hỏi sắp xếp theo id (get_all_questions): khóa chính
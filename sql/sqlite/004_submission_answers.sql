@@ -0,0 +1,34 @@
+-- Bản SQLite của sql/004_submission_answers.sql: bảng submission_answers và
+-- các view question_answer_stats, submission_answers_coverage (cùng tên, cùng cột).
+-- Cột submissions.answers_indexed được thêm khi mở database (sqlite_backend.ADDED_COLUMNS).
+-- Hàm index_submission_answers: SqliteClient._rpc_index_submission_answers.
+
+CREATE INDEX IF NOT EXISTS submissions_answers_pending_idx
+    ON submissions (id) WHERE NOT answers_indexed;
+
+CREATE TABLE IF NOT EXISTS submission_answers (
+    submission_id INTEGER NOT NULL REFERENCES submissions (id) ON DELETE CASCADE,
+    question_id INTEGER NOT NULL,
+    selected_mask INTEGER,
+    essay_text TEXT,
+    is_correct INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (submission_id, question_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS submission_answers_question_correct_idx
+    ON submission_answers (question_id, is_correct);
+
+DROP VIEW IF EXISTS question_answer_stats;
+CREATE VIEW question_answer_stats AS
+SELECT
+    question_id,
+    count(*) AS total_answers,
+    sum(is_correct) AS correct_count
+FROM submission_answers
+GROUP BY question_id;
+
+DROP VIEW IF EXISTS submission_answers_coverage;
+CREATE VIEW submission_answers_coverage AS
+SELECT count(*) AS pending_submissions
+FROM submissions
+WHERE NOT answers_indexed;
@@ -0,0 +1,10 @@
+-- Bản SQLite của sql/006_submission_drafts.sql: bảng submission_drafts.
+-- Hàm save_submission_drafts: SqliteClient._rpc_save_submission_drafts.
+
+CREATE TABLE IF NOT EXISTS submission_drafts (
+    user_email TEXT PRIMARY KEY,
+    attempt_index INTEGER NOT NULL,
+    page INTEGER NOT NULL DEFAULT 0,
+    responses TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+) WITHOUT ROWID;
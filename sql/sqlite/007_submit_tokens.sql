@@ -0,0 +1,6 @@
+-- Bản SQLite của sql/007_submit_tokens.sql: mỗi mã nộp bài tối đa một bài nộp.
+-- Cột submissions.submit_token được thêm khi mở database (sqlite_backend.ADDED_COLUMNS).
+-- Hàm insert_submissions: SqliteClient._rpc_insert_submissions.
+
+CREATE UNIQUE INDEX IF NOT EXISTS submissions_submit_token_key
+    ON submissions (submit_token);
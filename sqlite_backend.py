@@ -0,0 +1,465 @@
+"""Backend lưu trữ SQLite cục bộ, dùng thay Supabase khi ``STORAGE_BACKEND=sqlite``.
+
+Mọi truy cập dữ liệu trong ứng dụng đi qua client trả về từ
+``database_helper.get_supabase_client()`` và chuỗi truy vấn kiểu supabase-py::
+
+    client.table("submissions").select("id,score", count="exact").eq("user_email", email).execute()
+
+``SqliteClient`` cài đặt lại đúng phần giao diện đó (select/insert/update/delete,
+eq/neq/lt/lte/gt/gte/in_/like/is_, order, limit, rpc) trên ``sqlite3``, nên
+toàn bộ ứng dụng (đăng nhập, làm bài, báo cáo, thống kê) chạy được mà không
+cần project Supabase: dùng cho benchmark, kiểm thử tải và chạy offline.
+
+- Lược đồ, view thống kê và index lấy từ ``sql/sqlite/*.sql`` (tạo khi mở database).
+- Database ở chế độ WAL: nhiều phiên đọc song song trong khi một phiên ghi.
+- Mỗi lệnh mượn một kết nối từ pool nhỏ (an toàn đa luồng như client Supabase dùng chung).
+- Giá trị list/dict được lưu dạng JSON text giống cách ứng dụng lưu trên Supabase;
+  kết quả trả về là list các dict như ``APIResponse.data`` của postgrest.
+"""
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, NamedTuple, Optional
+
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql", "sqlite")
+SCHEMA_FILES = (
+    "001_schema.sql",
+    "002_submission_statistics_views.sql",
+    "003_indexes.sql",
+    "004_submission_answers.sql",
+    "006_submission_drafts.sql",
+    "007_submit_tokens.sql",
+)
+
+# Cột thêm vào bảng đã có (ALTER TABLE của các migration trong sql/), chạy
+# ngay sau 001_schema.sql nếu database cũ chưa có: {bảng: ((cột, định nghĩa), ...)}
+ADDED_COLUMNS = {
+    "submissions": (
+        ("answers_indexed", "INTEGER NOT NULL DEFAULT 0"),
+        ("question_results", "TEXT"),  # sql/005_question_results.sql
+        ("submit_token", "TEXT"),  # sql/007_submit_tokens.sql
+    ),
+}
+
+# Cột boolean (SQLite lưu 0/1) => trả về True/False như Supabase
+BOOLEAN_COLUMNS = {
+    "users": frozenset({"first_login"}),
+    "submissions": frozenset({"answers_indexed"}),
+    "submission_answers": frozenset({"is_correct"}),
+}
+
+# Số kết nối rảnh giữ lại trong pool
+POOL_SIZE = 8
+
+
+class SqliteAPIError(Exception):
+    """Lỗi truy vấn (tương đương postgrest.exceptions.APIError)"""
+
+
+class SqliteResponse(NamedTuple):
+    """Kết quả execute(): data (list dict hoặc giá trị RPC) và count (khi select count="exact")"""
+    data: Any
+    count: Optional[int] = None
+
+
+def _to_db_value(value):
+    """Giá trị Python -> giá trị lưu trong SQLite"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _like_to_glob(pattern):
+    """Mẫu like() của PostgREST (*, %, _) -> mẫu GLOB (phân biệt hoa thường như LIKE của Postgres)"""
+    glob = []
+    for ch in pattern:
+        if ch in "*%":
+            glob.append("*")
+        elif ch == "_":
+            glob.append("?")
+        elif ch in "[?":
+            glob.append(f"[{ch}]")
+        else:
+            glob.append(ch)
+    return "".join(glob)
+
+
+class SqliteQuery:
+    """Truy vấn trên một bảng/view, dựng dần như SyncRequestBuilder của postgrest"""
+
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._operation = "select"
+        self._columns = "*"
+        self._count = None
+        self._payload = None
+        self._conditions = []
+        self._params = []
+        self._order = []
+        self._limit = None
+
+    # --- Thao tác ---
+
+    def select(self, *columns, count=None):
+        self._operation = "select"
+        self._columns = ",".join(columns) if columns else "*"
+        self._count = count
+        return self
+
+    def insert(self, data, **kwargs):
+        self._operation = "insert"
+        self._payload = data if isinstance(data, list) else [data]
+        return self
+
+    def update(self, data, **kwargs):
+        self._operation = "update"
+        self._payload = data
+        return self
+
+    def delete(self, **kwargs):
+        self._operation = "delete"
+        return self
+
+    # --- Bộ lọc ---
+
+    def _where(self, column, sql, *params):
+        self._client.check_column(self._table, column)
+        self._conditions.append(sql.format(column=f'"{column}"'))
+        self._params.extend(params)
+        return self
+
+    def eq(self, column, value):
+        return self._where(column, "{column} = ?", _to_db_value(value))
+
+    def neq(self, column, value):
+        return self._where(column, "{column} <> ?", _to_db_value(value))
+
+    def lt(self, column, value):
+        return self._where(column, "{column} < ?", _to_db_value(value))
+
+    def lte(self, column, value):
+        return self._where(column, "{column} <= ?", _to_db_value(value))
+
+    def gt(self, column, value):
+        return self._where(column, "{column} > ?", _to_db_value(value))
+
+    def gte(self, column, value):
+        return self._where(column, "{column} >= ?", _to_db_value(value))
+
+    def in_(self, column, values):
+        values = [_to_db_value(v) for v in values]
+        if not values:
+            self._conditions.append("0")
+            return self
+        return self._where(column, "{column} IN (" + ", ".join("?" * len(values)) + ")", *values)
+
+    def like(self, column, pattern):
+        return self._where(column, "{column} GLOB ?", _like_to_glob(pattern))
+
+    def is_(self, column, value):
+        value = str(value).lower()
+        if value == "null":
+            return self._where(column, "{column} IS NULL")
+        if value in ("true", "false"):
+            return self._where(column, "{column} = ?", int(value == "true"))
+        raise SqliteAPIError(f"Giá trị không hợp lệ cho is_: {value}")
+
+    def order(self, column, *, desc=False, nullsfirst=False, **kwargs):
+        self._client.check_column(self._table, column)
+        # Giống Postgres: mặc định NULL đứng cuối khi tăng dần, đứng đầu khi giảm dần
+        nulls = "FIRST" if nullsfirst or desc else "LAST"
+        self._order.append(f'"{column}" {"DESC" if desc else "ASC"} NULLS {nulls}')
+        return self
+
+    def limit(self, size, **kwargs):
+        self._limit = int(size)
+        return self
+
+    # --- Thực thi ---
+
+    def _where_sql(self):
+        return " WHERE " + " AND ".join(self._conditions) if self._conditions else ""
+
+    def _select_sql(self):
+        if self._columns.strip() == "*":
+            return "*"
+        parts = []
+        for column in (c.strip() for c in self._columns.split(",")):
+            if not column:
+                continue
+            if column == "count" and not self._client.has_column(self._table, column):
+                parts.append("count(*) AS count")
+                continue
+            self._client.check_column(self._table, column)
+            parts.append(f'"{column}"')
+        return ", ".join(parts) or "*"
+
+    def execute(self):
+        return self._client.run(self)
+
+    def _execute(self, conn):
+        table = f'"{self._table}"'
+        where = self._where_sql()
+
+        if self._operation == "select":
+            sql = f"SELECT {self._select_sql()} FROM {table}{where}"
+            if self._order:
+                sql += " ORDER BY " + ", ".join(self._order)
+            if self._limit is not None:
+                sql += f" LIMIT {self._limit}"
+            rows = conn.execute(sql, self._params).fetchall()
+            count = None
+            if self._count:
+                count = conn.execute(f"SELECT count(*) FROM {table}{where}", self._params).fetchone()[0]
+            return SqliteResponse(self._client.to_dicts(self._table, rows), count)
+
+        if self._operation == "insert":
+            inserted = []
+            with self._client.transaction(conn):
+                for item in self._payload:
+                    columns = list(item)
+                    for column in columns:
+                        self._client.check_column(self._table, column)
+                    if columns:
+                        sql = (
+                            f"INSERT INTO {table} (" + ", ".join(f'"{c}"' for c in columns) + ") "
+                            "VALUES (" + ", ".join("?" * len(columns)) + ") RETURNING *"
+                        )
+                    else:
+                        sql = f"INSERT INTO {table} DEFAULT VALUES RETURNING *"
+                    inserted.extend(conn.execute(sql, [_to_db_value(item[c]) for c in columns]).fetchall())
+            return SqliteResponse(self._client.to_dicts(self._table, inserted))
+
+        if self._operation == "update":
+            columns = list(self._payload)
+            for column in columns:
+                self._client.check_column(self._table, column)
+            sql = f"UPDATE {table} SET " + ", ".join(f'"{c}" = ?' for c in columns) + f"{where} RETURNING *"
+            params = [_to_db_value(self._payload[c]) for c in columns] + self._params
+            rows = conn.execute(sql, params).fetchall()
+            return SqliteResponse(self._client.to_dicts(self._table, rows))
+
+        if self._operation == "delete":
+            rows = conn.execute(f"DELETE FROM {table}{where} RETURNING *", self._params).fetchall()
+            return SqliteResponse(self._client.to_dicts(self._table, rows))
+
+        raise SqliteAPIError(f"Thao tác không hỗ trợ: {self._operation}")
+
+
+class SqliteRpc:
+    """Lời gọi hàm RPC (tương đương client.rpc(...) của Supabase)"""
+
+    def __init__(self, client, function, params):
+        self._client = client
+        self._function = function
+        self._params = params or {}
+
+    def execute(self):
+        return self._client.run(self)
+
+    def _execute(self, conn):
+        handler = getattr(self._client, f"_rpc_{self._function}", None)
+        if handler is None:
+            raise SqliteAPIError(f"Không có hàm RPC: {self._function}")
+        return SqliteResponse(handler(conn, **self._params))
+
+
+class SqliteClient:
+    """Client SQLite có cùng giao diện table()/rpc() với Supabase client"""
+
+    def __init__(self, path):
+        self.path = path
+        self._pool = []
+        self._pool_lock = threading.Lock()
+        self._columns = {}
+        self._closed = False
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            for name in SCHEMA_FILES:
+                with open(os.path.join(SCHEMA_DIR, name), encoding="utf-8") as f:
+                    conn.executescript(f.read())
+                if name == SCHEMA_FILES[0]:
+                    self._add_columns(conn)
+        finally:
+            self._release(conn)
+
+    def _add_columns(self, conn):
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {row["name"] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+            for column, definition in columns:
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {definition}')
+
+    # --- Kết nối ---
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        # WAL + NORMAL: vẫn an toàn khi ứng dụng bị dừng đột ngột, ít fsync hơn FULL
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def _acquire(self):
+        with self._pool_lock:
+            if self._closed:
+                raise SqliteAPIError("Client SQLite đã đóng")
+            if self._pool:
+                return self._pool.pop()
+        return self._connect()
+
+    def _release(self, conn):
+        with self._pool_lock:
+            if not self._closed and len(self._pool) < POOL_SIZE:
+                self._pool.append(conn)
+                return
+        conn.close()
+
+    def run(self, request):
+        """Chạy một truy vấn/RPC trên một kết nối mượn từ pool"""
+        conn = self._acquire()
+        try:
+            return request._execute(conn)
+        except sqlite3.Error as e:
+            raise SqliteAPIError(str(e)) from e
+        finally:
+            self._release(conn)
+
+    def transaction(self, conn):
+        """Ngữ cảnh BEGIN IMMEDIATE ... COMMIT (ROLLBACK nếu lỗi)"""
+        return _Transaction(conn)
+
+    def close(self):
+        """Đóng mọi kết nối trong pool"""
+        with self._pool_lock:
+            self._closed = True
+            pool, self._pool = self._pool, []
+        for conn in pool:
+            conn.close()
+
+    # --- Giao diện giống Supabase client ---
+
+    def table(self, name):
+        return SqliteQuery(self, name)
+
+    def rpc(self, function, params):
+        return SqliteRpc(self, function, params)
+
+    # --- Cột và kết quả ---
+
+    def _table_columns(self, table):
+        columns = self._columns.get(table)
+        if columns is None:
+            conn = self._acquire()
+            try:
+                rows = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+            finally:
+                self._release(conn)
+            if not rows:
+                raise SqliteAPIError(f"Không có bảng hoặc view: {table}")
+            columns = frozenset(row["name"] for row in rows)
+            self._columns[table] = columns
+        return columns
+
+    def has_column(self, table, column):
+        return column in self._table_columns(table)
+
+    def check_column(self, table, column):
+        if not self.has_column(table, column):
+            raise SqliteAPIError(f"Cột {column} không tồn tại trong {table}")
+
+    def to_dicts(self, table, rows):
+        boolean_columns = BOOLEAN_COLUMNS.get(table, ())
+        result = []
+        for row in rows:
+            item = dict(row)
+            for column in boolean_columns:
+                if item.get(column) is not None:
+                    item[column] = bool(item[column])
+            result.append(item)
+        return result
+
+    # --- Hàm RPC (tương đương các hàm trong sql/*.sql) ---
+
+    def _rpc_apply_submission_scores(self, conn, updates):
+        """sql/003_apply_submission_scores.sql: ghi điểm nếu điểm hiện tại vẫn là old_score"""
+        with self.transaction(conn):
+            cursor = conn.executemany(
+                "UPDATE submissions SET score = ? WHERE id = ? AND score IS ?",
+                [(u["score"], u["id"], u["old_score"]) for u in updates],
+            )
+        return cursor.rowcount
+
+    def _rpc_apply_submission_results(self, conn, updates):
+        """sql/008_apply_submission_results.sql: ghi điểm và question_results nếu điểm hiện tại vẫn là old_score"""
+        with self.transaction(conn):
+            cursor = conn.executemany(
+                "UPDATE submissions SET score = ?, question_results = ? WHERE id = ? AND score IS ?",
+                [(u["score"], u["question_results"], u["id"], u["old_score"]) for u in updates],
+            )
+        return cursor.rowcount
+
+    def _rpc_index_submission_answers(self, conn, answers, indexed_ids=()):
+        """sql/004_submission_answers.sql: ghi đè các dòng câu trả lời, đánh dấu bài nộp đã đủ dòng"""
+        with self.transaction(conn):
+            cursor = conn.executemany(
+                "INSERT INTO submission_answers (submission_id, question_id, selected_mask, essay_text, is_correct) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (submission_id, question_id) DO UPDATE SET "
+                "selected_mask = excluded.selected_mask, essay_text = excluded.essay_text, "
+                "is_correct = excluded.is_correct",
+                [(a["submission_id"], a["question_id"], a.get("selected_mask"), a.get("essay_text"),
+                  int(bool(a.get("is_correct")))) for a in answers],
+            )
+            written = cursor.rowcount
+            conn.executemany("UPDATE submissions SET answers_indexed = 1 WHERE id = ?",
+                             [(submission_id,) for submission_id in indexed_ids])
+        return written
+
+    def _rpc_insert_submissions(self, conn, submissions):
+        """sql/007_submit_tokens.sql: ghi một lô bài nộp, mã nộp bài đã có => trả về dòng đã có"""
+        columns = ("user_email", "responses", "score", "timestamp", "question_results", "submit_token")
+        sql = (
+            "INSERT INTO submissions (" + ", ".join(f'"{c}"' for c in columns) + ") "
+            "VALUES (" + ", ".join("?" * len(columns)) + ") "
+            "ON CONFLICT (submit_token) DO UPDATE SET submit_token = excluded.submit_token RETURNING *"
+        )
+        rows = []
+        with self.transaction(conn):
+            for submission in submissions:
+                rows.extend(conn.execute(sql, [_to_db_value(submission.get(c)) for c in columns]).fetchall())
+        return self.to_dicts("submissions", rows)
+
+    def _rpc_save_submission_drafts(self, conn, drafts, deleted=()):
+        """sql/006_submission_drafts.sql: ghi đè một lô bản nháp, xóa bản nháp của deleted"""
+        with self.transaction(conn):
+            conn.executemany("DELETE FROM submission_drafts WHERE user_email = ?",
+                             [(email,) for email in deleted])
+            cursor = conn.executemany(
+                "INSERT INTO submission_drafts (user_email, attempt_index, page, responses, updated_at) "
+                "VALUES (?, ?, ?, ?, strftime('%Y-%m-%dT%H:%M:%fZ', 'now')) ON CONFLICT (user_email) DO UPDATE SET "
+                "attempt_index = excluded.attempt_index, page = excluded.page, "
+                "responses = excluded.responses, updated_at = excluded.updated_at",
+                [(d["user_email"], d["attempt_index"], d.get("page") or 0, d["responses"]) for d in drafts],
+            )
+        return cursor.rowcount
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -1,11 +1,11 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
-import json
 from datetime import datetime
 
 # Import từ các module khác
-from database_helper import get_all_questions, get_user_submissions, get_submission_statistics, check_answer_correctness
+from database_helper import get_all_questions, get_user_submissions, get_submission_statistics
+from models import decode_json_object, normalize_question, question_result
 
 def stats_dashboard():
     """Hiển thị trang thống kê và báo cáo"""
@@ -43,6 +43,7 @@ def general_statistics(stats):
     # Tạo biểu đồ số lượng bài nộp theo ngày
     st.write("### Số lượng bài nộp theo ngày")
     
+    # Đếm sẵn trên database (view submission_daily_counts) nếu đã chạy sql/002
     daily_counts = stats["daily_counts"]
     
     if daily_counts:
@@ -263,12 +264,7 @@ def student_data_analysis():
                 
                 with st.expander(f"Lần {idx + 1}: {submission_time} - Điểm: {s.get('score', 0)}/{max_score} ({score_percent:.1f}%)"):
                     # Đảm bảo responses đúng định dạng
-                    responses = s.get("responses", {})
-                    if isinstance(responses, str):
-                        try:
-                            responses = json.loads(responses)
-                        except:
-                            responses = {}
+                    responses = decode_json_object(s.get("responses"))
                     
                     # Phân tích câu trả lời
                     correct_count = 0
@@ -277,23 +273,10 @@ def student_data_analysis():
                         student_answers = responses.get(q_id, [])
                         
                         # Đảm bảo câu hỏi có định dạng đúng
-                        if isinstance(q.get("answers"), str):
-                            try:
-                                q["answers"] = json.loads(q.get("answers"))
-                            except:
-                                q["answers"] = [q.get("answers")]
-                        
-                        if isinstance(q.get("correct"), str):
-                            try:
-                                q["correct"] = json.loads(q.get("correct"))
-                            except:
-                                try:
-                                    q["correct"] = [int(x.strip()) for x in q.get("correct", "").split(",")]
-                                except:
-                                    q["correct"] = []
+                        q = normalize_question(q)
                         
-                        # Kiểm tra tính đúng đắn
-                        is_correct = check_answer_correctness(student_answers, q)
+                        # Kiểm tra tính đúng đắn (kết quả đã lưu lúc nộp bài nếu câu hỏi chưa sửa)
+                        is_correct = question_result(s, q, student_answers).correct
                         if is_correct:
                             correct_count += 1
                         
@@ -334,8 +317,8 @@ def student_data_analysis():
         # Nếu chưa tìm kiếm, hiển thị một số thống kê chung về học viên
         st.info("Nhập email học viên và nhấn Tìm kiếm để xem chi tiết bài làm.")
         
-        # Hiển thị tổng số học viên đã làm bài
-        stats = get_submission_statistics()
+        # Hiển thị tổng số học viên đã làm bài - không cần thống kê từng câu hỏi
+        stats = get_submission_statistics(include_question_stats=False)
         if stats:
             st.write(f"**Tổng số học viên đã làm bài:** {stats.get('student_count', 0)}")
             st.write(f"**Điểm trung bình của tất cả học viên:** {stats.get('avg_score', 0):.1f}/{stats.get('total_possible_score', 0)} ({stats.get('avg_percentage', 0):.1f}%)")
@@ -0,0 +1,377 @@
+"""Hàng đợi bài nộp bền vững (spool) và luồng nền ghi bài nộp vào database theo lô.
+
+Bật bằng biến môi trường ``SUBMISSION_SPOOL=1``. Khi bật, nộp bài không chờ
+database nữa: bài nộp được chấm điểm (danh mục câu hỏi trong bộ đệm) rồi ghi
+vào một file SQLite cục bộ (``SUBMISSION_SPOOL_PATH``, chế độ WAL,
+synchronous=FULL - dữ liệu đã xuống đĩa trước khi học viên nhận xác nhận).
+Học viên nhận ngay điểm và mã biên nhận ("S" + số thứ tự trong spool).
+
+Luồng nền lấy từng lô (``SUBMISSION_SPOOL_BATCH_SIZE`` bài) và ghi bằng
+``database_helper.insert_submissions`` (một lệnh INSERT). Lô ghi lỗi (backend
+chậm / tạm thời không truy cập được) được thử lại sau khoảng chờ tăng dần
+(1s, 2s, 4s... tối đa ``SUBMISSION_SPOOL_MAX_BACKOFF`` giây); bài nộp chỉ bị
+xóa khỏi spool sau khi database đã ghi xong. Mỗi lô được "giữ chỗ" trong
+``SUBMISSION_SPOOL_LEASE`` giây nên nhiều tiến trình dùng chung một file spool
+không ghi trùng, và tiến trình dừng giữa chừng thì lô được ghi lại sau khi hết
+hạn giữ chỗ.
+
+Lô đã lỗi ``SUBMISSION_SPOOL_SPLIT_AFTER`` lần được ghi từng bài, để một bài
+luôn lỗi (dữ liệu hỏng, vi phạm ràng buộc) không giữ các bài khác lại. Bài
+vẫn lỗi khi ghi riêng trong lúc database vẫn truy cập được sẽ bị chuyển sang
+trạng thái lỗi (dead letter) sau ``SUBMISSION_SPOOL_MAX_ATTEMPTS`` lần: bài
+vẫn nằm trong file spool, không được ghi tự động nữa, và có thể đưa lại vào
+hàng chờ bằng ``requeue_dead`` (nút trên trang quản trị) sau khi sửa nguyên nhân.
+
+Bài nộp còn trong spool (kể cả bài lỗi) vẫn được tính vào số lần làm bài
+(``pending_summary``). Số bài đang chờ / bị lỗi hiển thị trong tab "Hiệu năng
+database" của trang quản trị.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+
+import database_helper
+
+SPOOL_BATCH_SIZE = int(os.environ.get("SUBMISSION_SPOOL_BATCH_SIZE", "100"))
+SPOOL_MAX_BACKOFF = float(os.environ.get("SUBMISSION_SPOOL_MAX_BACKOFF", "60"))
+SPOOL_LEASE = float(os.environ.get("SUBMISSION_SPOOL_LEASE", "120"))
+# Số lần lô lỗi trước khi ghi từng bài; số lần lỗi của một bài trước khi chuyển sang trạng thái lỗi
+SPOOL_SPLIT_AFTER = int(os.environ.get("SUBMISSION_SPOOL_SPLIT_AFTER", "3"))
+SPOOL_MAX_ATTEMPTS = int(os.environ.get("SUBMISSION_SPOOL_MAX_ATTEMPTS", "10"))
+# Luồng nền kiểm tra spool ít nhất mỗi ngần này giây (ngoài lúc được đánh thức khi có bài mới)
+SPOOL_POLL_INTERVAL = 1.0
+
+_state = {"enabled": os.environ.get("SUBMISSION_SPOOL", "0").strip().lower() in ("1", "true", "yes", "on")}
+_spool = {"instance": None, "worker": None}
+_spool_lock = threading.Lock()
+_wakeup = threading.Event()
+_stats = {"enqueued": 0, "written": 0, "batches": 0, "failures": 0, "dead_lettered": 0, "last_failure_at": None}
+_stats_lock = threading.Lock()
+
+
+def is_enabled():
+    return _state["enabled"]
+
+
+def set_enabled(enabled):
+    """Bật/tắt ghi bài nộp qua spool (áp dụng cho toàn bộ tiến trình)"""
+    _state["enabled"] = bool(enabled)
+
+
+def get_spool_path():
+    """Đường dẫn file spool"""
+    return os.environ.get("SUBMISSION_SPOOL_PATH", "submission_spool.db")
+
+
+class SubmissionSpool:
+    """Bảng spool trong một file SQLite; mọi thao tác dùng chung một kết nối (có khóa)"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " user_email TEXT NOT NULL,"
+            " submission TEXT NOT NULL,"
+            " enqueued_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " available_at REAL NOT NULL DEFAULT 0,"
+            " last_error TEXT,"
+            " dead_at REAL)"
+        )
+        # File spool tạo trước khi có trạng thái lỗi
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(spool)")}
+        if "dead_at" not in columns:
+            self._conn.execute("ALTER TABLE spool ADD COLUMN dead_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS spool_available_idx ON spool (available_at, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS spool_email_idx ON spool (user_email)")
+
+    def append(self, submission):
+        """Ghi bài nộp (dòng từ database_helper.build_submission) xuống đĩa; trả về số thứ tự"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO spool (user_email, submission, enqueued_at) VALUES (?, ?, ?)",
+                (submission["user_email"], json.dumps(submission, ensure_ascii=False), time.time()),
+            )
+            return cursor.lastrowid
+
+    def claim(self, limit, lease):
+        """Lấy tối đa limit bài đến hạn ghi và giữ chỗ trong lease giây: [(id, attempts, submission)]"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, attempts, submission FROM spool"
+                    " WHERE dead_at IS NULL AND available_at <= ? ORDER BY id LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                self._conn.executemany("UPDATE spool SET available_at = ? WHERE id = ?",
+                                       [(now + lease, row[0]) for row in rows])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [(spool_id, attempts, json.loads(submission)) for spool_id, attempts, submission in rows]
+
+    def remove(self, ids):
+        """Xóa các bài đã ghi vào database"""
+        with self._lock:
+            self._conn.executemany("DELETE FROM spool WHERE id = ?", [(spool_id,) for spool_id in ids])
+
+    def retry_later(self, ids, delay, error):
+        """Đánh dấu lô ghi lỗi: thử lại sau delay giây"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE spool SET attempts = attempts + 1, available_at = ?, last_error = ? WHERE id = ?",
+                [(time.time() + delay, error, spool_id) for spool_id in ids],
+            )
+
+    def mark_dead(self, ids, error):
+        """Chuyển các bài sang trạng thái lỗi: không ghi tự động nữa"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE spool SET attempts = attempts + 1, dead_at = ?, last_error = ? WHERE id = ?",
+                [(time.time(), error, spool_id) for spool_id in ids],
+            )
+
+    def requeue_dead(self):
+        """Đưa mọi bài đang ở trạng thái lỗi trở lại hàng chờ; trả về số bài"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE spool SET dead_at = NULL, attempts = 0, available_at = 0 WHERE dead_at IS NOT NULL"
+            )
+            return cursor.rowcount
+
+    def pending_for(self, email):
+        """Các bài nộp của học viên còn trong spool (cùng submit_token chỉ tính một lần)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT submission FROM spool WHERE user_email = ? ORDER BY id",
+                                      (email,)).fetchall()
+        submissions = []
+        tokens = set()
+        for row in rows:
+            submission = json.loads(row[0])
+            token = submission.get("submit_token")
+            if token:
+                # Bấm gửi hai lần trong chế độ spool: chỉ một bài được ghi vào database
+                if token in tokens:
+                    continue
+                tokens.add(token)
+            submissions.append(submission)
+        return submissions
+
+    def find(self, email, submit_token):
+        """Bài nộp của học viên còn trong spool với mã nộp bài này: (id, bài nộp) hoặc None"""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, submission FROM spool WHERE user_email = ? ORDER BY id",
+                                      (email,)).fetchall()
+        for spool_id, raw in rows:
+            submission = json.loads(raw)
+            if submission.get("submit_token") == submit_token:
+                return spool_id, submission
+        return None
+
+    def depth(self):
+        """Số bài đang chờ, đang chờ thử lại, bị lỗi; tuổi bài chờ cũ nhất (giây), lỗi gần nhất"""
+        with self._lock:
+            pending, retrying, oldest = self._conn.execute(
+                "SELECT count(*), coalesce(sum(attempts > 0), 0), min(enqueued_at) FROM spool WHERE dead_at IS NULL"
+            ).fetchone()
+            dead = self._conn.execute("SELECT count(*) FROM spool WHERE dead_at IS NOT NULL").fetchone()[0]
+            last_error = self._conn.execute(
+                "SELECT last_error FROM spool WHERE last_error IS NOT NULL ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        return {
+            "pending": pending,
+            "retrying": retrying,
+            "dead": dead,
+            "oldest_age_seconds": round(time.time() - oldest, 1) if oldest is not None else 0.0,
+            "last_error": last_error[0] if last_error else None,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_spool():
+    """Spool dùng chung của tiến trình (mở file ở lần gọi đầu) và luồng ghi nền"""
+    with _spool_lock:
+        if _spool["instance"] is None:
+            _spool["instance"] = SubmissionSpool(get_spool_path())
+        if _spool["worker"] is None:
+            _spool["worker"] = threading.Thread(target=_run, name="submission-spool", daemon=True)
+            _spool["worker"].start()
+        return _spool["instance"]
+
+
+def enqueue_submission(email, responses, submit_token=None):
+    """Chấm điểm và ghi bài nộp vào spool; trả về kết quả như save_submission (id là mã biên nhận)
+
+    submit_token đi cùng bài nộp trong spool: lô được ghi lại (thử lại sau lỗi,
+    hết hạn giữ chỗ) hay học viên bấm nộp hai lần vẫn chỉ tạo một bài nộp.
+
+    Returns:
+        dict id ("S" + số thứ tự), email, responses, score, timestamp,
+        question_results, spooled=True; None nếu không ghi được vào spool
+    """
+    # Danh mục câu hỏi thường đã có trong bộ đệm; không chấm bài khi không tải được
+    questions = database_helper.get_all_questions()
+    if not questions:
+        st.error("Không tải được danh mục câu hỏi để chấm bài, vui lòng thử lại!")
+        return None
+    try:
+        submission = database_helper.build_submission(email, responses, questions, submit_token)
+        spool_id = get_spool().append(submission)
+    except Exception as e:
+        st.error(f"Lỗi khi lưu bài làm: {e}")
+        return None
+    with _stats_lock:
+        _stats["enqueued"] += 1
+    _wakeup.set()
+    return _receipt(spool_id, email, submission)
+
+
+def _receipt(spool_id, email, submission):
+    """Kết quả bài làm của một bài trong spool (như enqueue_submission trả về)"""
+    return {
+        "id": f"S{spool_id}",
+        "email": email,
+        "responses": submission["responses"],
+        "score": submission["score"],
+        "timestamp": submission["timestamp"],
+        "question_results": submission["question_results"],
+        "submit_token": submission.get("submit_token"),
+        "spooled": True,
+    }
+
+
+def find_submission(email, submit_token):
+    """Bài nộp đã nhận với mã nộp bài này: còn trong spool hoặc đã ghi vào database; None nếu chưa có"""
+    if not submit_token:
+        return None
+    if _spool["instance"] is not None or os.path.exists(get_spool_path()):
+        found = get_spool().find(email, submit_token)
+        if found:
+            return _receipt(found[0], email, found[1])
+    return database_helper.get_submission_by_token(email, submit_token)
+
+
+def pending_summary(email):
+    """Số bài nộp còn trong spool và điểm cao nhất của chúng (để tính số lần làm bài)"""
+    if _spool["instance"] is None and not os.path.exists(get_spool_path()):
+        return {"count": 0, "best_score": None}
+    scores = [s["score"] for s in get_spool().pending_for(email)]
+    return {"count": len(scores), "best_score": max(scores) if scores else None}
+
+
+def flush_once(spool=None):
+    """Ghi một lô bài nộp đến hạn; trả về số bài đã ghi (0 nếu không có bài nào hoặc lỗi)"""
+    spool = spool or get_spool()
+    batch = spool.claim(SPOOL_BATCH_SIZE, SPOOL_LEASE)
+    if not batch:
+        return 0
+    if max(attempts for _, attempts, _ in batch) >= SPOOL_SPLIT_AFTER:
+        # Lô đã lỗi nhiều lần: có thể chỉ một vài bài lỗi => ghi từng bài
+        return _flush_rows(spool, batch)
+    try:
+        database_helper.insert_submissions([submission for _, _, submission in batch])
+    except Exception as e:
+        _retry_later(spool, batch, e)
+        return 0
+    _written(spool, [spool_id for spool_id, _, _ in batch])
+    return len(batch)
+
+
+def _flush_rows(spool, batch):
+    """Ghi từng bài của lô; bài lỗi khi database vẫn truy cập được chỉ giữ lại riêng bài đó"""
+    written = 0
+    reachable = None
+    for index, (spool_id, attempts, submission) in enumerate(batch):
+        try:
+            database_helper.insert_submissions([submission])
+        except Exception as e:
+            if not written and reachable is None:
+                reachable = database_helper.test_supabase_connection()[0]
+            if not written and not reachable:
+                # Backend không truy cập được: cả phần còn lại thử lại sau
+                _retry_later(spool, batch[index:], e)
+                break
+            if attempts + 1 >= SPOOL_MAX_ATTEMPTS:
+                _mark_dead(spool, spool_id, e)
+            else:
+                _retry_later(spool, [(spool_id, attempts, submission)], e)
+            continue
+        _written(spool, [spool_id])
+        written += 1
+    return written
+
+
+def _written(spool, ids):
+    spool.remove(ids)
+    with _stats_lock:
+        _stats["written"] += len(ids)
+        _stats["batches"] += 1
+
+
+def _retry_later(spool, batch, error):
+    """Thử lại các bài sau khoảng chờ tăng dần theo số lần lỗi"""
+    attempts = max(attempts for _, attempts, _ in batch)
+    delay = min(SPOOL_MAX_BACKOFF, 2 ** attempts)
+    error = f"{type(error).__name__}: {error}"
+    spool.retry_later([spool_id for spool_id, _, _ in batch], delay, error)
+    with _stats_lock:
+        _stats["failures"] += 1
+        _stats["last_failure_at"] = time.time()
+    print(f"Lỗi khi ghi {len(batch)} bài nộp từ spool (thử lại sau {delay:.0f}s): {error}")
+
+
+def _mark_dead(spool, spool_id, error):
+    error = f"{type(error).__name__}: {error}"
+    spool.mark_dead([spool_id], error)
+    with _stats_lock:
+        _stats["dead_lettered"] += 1
+        _stats["last_failure_at"] = time.time()
+    print(f"Bài nộp S{spool_id} trong spool lỗi {SPOOL_MAX_ATTEMPTS} lần, ngừng ghi tự động: {error}")
+
+
+def requeue_dead():
+    """Đưa các bài nộp bị lỗi trong spool trở lại hàng chờ ghi; trả về số bài"""
+    count = get_spool().requeue_dead()
+    if count:
+        _wakeup.set()
+    return count
+
+
+def _run():
+    while True:
+        try:
+            if flush_once():
+                # Còn bài thì ghi tiếp ngay
+                continue
+        except Exception as e:
+            print(f"Lỗi spool bài nộp: {type(e).__name__}: {e}")
+        _wakeup.wait(SPOOL_POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def get_stats():
+    """Độ sâu spool (SubmissionSpool.depth) và số liệu của luồng ghi trong tiến trình này"""
+    with _stats_lock:
+        stats = dict(_stats)
+    if _spool["instance"] is not None or os.path.exists(get_spool_path()):
+        stats.update(get_spool().depth())
+    else:
+        stats.update(pending=0, retrying=0, dead=0, oldest_age_seconds=0.0, last_error=None)
+    return stats
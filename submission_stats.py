@@ -0,0 +1,174 @@
+"""Tổng hợp thống kê bài nộp trong một lượt duyệt.
+
+Mỗi bài nộp chỉ được giải mã ``responses`` một lần, sau đó cập nhật đồng
+thời mọi bộ đếm: số bài, tổng điểm, tập học viên, số bài theo ngày và số
+trả lời / trả lời đúng của từng câu hỏi. Vì chỉ giữ các bộ đếm, bộ tổng hợp
+có thể nhận một iterator bài nộp (đọc theo trang) mà không cần cả bảng
+trong bộ nhớ.
+
+Khi database đã có các view thống kê (sql/002_submission_statistics_views.sql),
+``statistics_from_aggregates`` dựng cùng định dạng kết quả từ các dòng tổng hợp.
+"""
+from datetime import datetime
+
+from grading import compile_answer_keys
+from models import decode_json_object
+
+
+def group_submissions_by_email(submissions):
+    """Gom bài nộp theo user_email trong một lượt duyệt: {email: [bài nộp, ...]}
+
+    Thứ tự bài nộp trong từng nhóm giữ nguyên như đầu vào.
+    """
+    groups = {}
+    for s in submissions:
+        groups.setdefault(s.get("user_email"), []).append(s)
+    return groups
+
+
+def submission_date(timestamp):
+    """Ngày nộp bài dạng YYYY-MM-DD (hỗ trợ ISO string, datetime, Unix timestamp)"""
+    if isinstance(timestamp, datetime):
+        dt = timestamp
+    elif isinstance(timestamp, str):
+        try:
+            dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        except ValueError:
+            dt = datetime.now()  # Giá trị mặc định nếu không thể parse
+    else:
+        # Dữ liệu cũ lưu dạng Unix timestamp
+        try:
+            dt = datetime.fromtimestamp(timestamp)
+        except (TypeError, ValueError, OverflowError, OSError):
+            dt = datetime.now()
+    return dt.strftime("%Y-%m-%d")
+
+
+class SubmissionStatsAggregator:
+    """Bộ tổng hợp thống kê tăng dần cho một danh sách câu hỏi cố định"""
+
+    def __init__(self, questions):
+        self.questions = list(questions)
+        self.answer_keys = compile_answer_keys(self.questions)
+
+        self.total_submissions = 0
+        self.score_sum = 0
+        self.students = set()
+        self.daily_counts = {}
+        self.answer_counts = [0] * len(self.questions)
+        self.correct_counts = [0] * len(self.questions)
+
+    def add(self, submission):
+        """Cập nhật các bộ đếm với một bài nộp"""
+        self.total_submissions += 1
+        self.score_sum += submission.get("score") or 0
+        self.students.add(submission.get("user_email"))
+
+        date_str = submission_date(submission.get("timestamp"))
+        self.daily_counts[date_str] = self.daily_counts.get(date_str, 0) + 1
+
+        responses = decode_json_object(submission.get("responses"))
+        if not responses:
+            return
+        answer_counts = self.answer_counts
+        correct_counts = self.correct_counts
+        for position, answer_key in enumerate(self.answer_keys):
+            student_answers = responses.get(answer_key.question_key)
+            if student_answers is None and answer_key.question_key not in responses:
+                continue
+            answer_counts[position] += 1
+            if answer_key.is_correct(student_answers):
+                correct_counts[position] += 1
+
+    def add_many(self, submissions):
+        """Nhận một iterable/iterator bài nộp"""
+        for submission in submissions:
+            self.add(submission)
+        return self
+
+    def result(self):
+        """Trả về dict thống kê (cùng định dạng get_submission_statistics)"""
+        return build_statistics(
+            self.questions,
+            total_submissions=self.total_submissions,
+            student_count=len(self.students),
+            score_sum=self.score_sum,
+            daily_counts=self.daily_counts,
+            answer_counts=self.answer_counts,
+            correct_counts=self.correct_counts,
+        )
+
+
+def build_statistics(questions, total_submissions, student_count, score_sum,
+                     daily_counts, answer_counts, correct_counts):
+    """Dựng dict thống kê từ các bộ đếm (answer_counts/correct_counts theo thứ tự questions)"""
+    total_possible_score = sum(q["score"] for q in questions)
+    if total_submissions == 0:
+        return {
+            "total_submissions": 0,
+            "student_count": 0,
+            "avg_score": 0,
+            "avg_percentage": 0,
+            "total_possible_score": total_possible_score,
+            "question_stats": {},
+            "daily_counts": {}
+        }
+
+    avg_score = score_sum / total_submissions
+    avg_percentage = (avg_score / total_possible_score * 100) if total_possible_score > 0 else 0
+
+    question_stats = {}
+    for position, q in enumerate(questions):
+        total_answers = answer_counts[position]
+        correct_count = correct_counts[position]
+        question_stats[str(q["id"])] = {
+            "question": q["question"],
+            "total_answers": total_answers,
+            "correct_count": correct_count,
+            "correct_percentage": (correct_count / total_answers * 100) if total_answers > 0 else 0
+        }
+
+    return {
+        "total_submissions": total_submissions,
+        "student_count": student_count,
+        "avg_score": avg_score,
+        "avg_percentage": avg_percentage,
+        "total_possible_score": total_possible_score,
+        "question_stats": question_stats,
+        "daily_counts": dict(daily_counts)
+    }
+
+
+def statistics_from_aggregates(questions, summary, daily_rows, question_rows):
+    """Dựng dict thống kê từ kết quả các view thống kê trên database.
+
+    Args:
+        summary: dòng của submission_summary (total_submissions, student_count, score_sum)
+        daily_rows: các dòng của submission_daily_counts (day, submission_count)
+        question_rows: các dòng của question_correct_stats (question_id, total_answers, correct_count)
+    """
+    counts_by_question = {
+        str(row["question_id"]): (row.get("total_answers") or 0, row.get("correct_count") or 0)
+        for row in question_rows
+    }
+    answer_counts = []
+    correct_counts = []
+    for q in questions:
+        total_answers, correct_count = counts_by_question.get(str(q["id"]), (0, 0))
+        answer_counts.append(total_answers)
+        correct_counts.append(correct_count)
+
+    return build_statistics(
+        questions,
+        total_submissions=summary.get("total_submissions") or 0,
+        student_count=summary.get("student_count") or 0,
+        score_sum=summary.get("score_sum") or 0,
+        daily_counts={row["day"]: row["submission_count"] for row in daily_rows},
+        answer_counts=answer_counts,
+        correct_counts=correct_counts,
+    )
+
+
+def aggregate_submission_statistics(submissions, questions):
+    """Tính thống kê bài nộp trong một lượt duyệt (submissions có thể là iterator)"""
+    return SubmissionStatsAggregator(questions).add_many(submissions).result()
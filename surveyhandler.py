@@ -1,9 +1,45 @@
-import json
+import os
+import uuid
 import streamlit as st
 from datetime import datetime
 
 # Import từ các module khác
-from database_helper import get_all_questions, save_submission, get_user_submissions
+from database_helper import get_survey_snapshot, save_submission, get_user_submissions, get_attempt_summary, get_submission_by_token
+from models import question_result
+from drafts import discard_draft, load_draft, save_draft
+import submission_spool
+
+# Số câu hỏi mỗi trang của form làm bài; 0 (mặc định) = một form chứa mọi câu hỏi.
+# Với đề lớn (150+ câu), chia trang để mỗi lần rerun chỉ vẽ lại widget của một trang.
+SURVEY_PAGE_SIZE = int(os.environ.get("SURVEY_PAGE_SIZE", "0"))
+
+def get_session_attempts(email, refresh=False):
+    """Số lần làm bài / điểm cao nhất của học viên, giữ trong session
+    
+    Chỉ hỏi database (một truy vấn đếm, không tải lịch sử) ở lần đầu trong phiên
+    hoặc khi refresh=True; sau mỗi lần nộp thành công bộ đếm được cập nhật tại chỗ
+    (record_session_attempt). Khi nộp bài, database vẫn được kiểm tra lại.
+    """
+    attempts = st.session_state.get("attempt_summary")
+    if refresh or not attempts or attempts.get("email") != email:
+        summary = get_attempt_summary(email)
+        if summary is None:
+            # Lỗi đã được báo; không lưu để lần sau thử lại
+            return {"email": email, "count": 0, "best_score": None}
+        if submission_spool.is_enabled():
+            # Bài đã nộp nhưng còn chờ ghi vào database cũng là một lần làm bài
+            spooled = submission_spool.pending_summary(email)
+            scores = [score for score in (summary["best_score"], spooled["best_score"]) if score is not None]
+            summary = {"count": summary["count"] + spooled["count"], "best_score": max(scores) if scores else None}
+        attempts = st.session_state.attempt_summary = dict(summary, email=email)
+    return attempts
+
+def record_session_attempt(email, score):
+    """Cập nhật bộ đếm trong session sau khi lưu bài thành công"""
+    attempts = get_session_attempts(email)
+    attempts["count"] += 1
+    if attempts["best_score"] is None or score > attempts["best_score"]:
+        attempts["best_score"] = score
 
 def survey_form(email, full_name, class_name):
     st.title("Làm bài khảo sát đánh giá viên nội bộ ISO 50001:2018")
@@ -13,38 +49,21 @@ def survey_form(email, full_name, class_name):
     st.write(f"**Lớp:** {class_name}")
     st.write(f"**Email:** {email}")
     
-    # Lấy danh sách câu hỏi từ database
-    questions = get_all_questions()
+    # Form làm bài dựng sẵn cho phiên bản danh mục hiện tại (dùng chung mọi phiên, chỉ đọc)
+    survey = get_survey_snapshot()
     
-    if not questions:
+    if survey is None:
         st.info("Chưa có câu hỏi nào trong hệ thống.")
         return
     
-    # Đảm bảo định dạng dữ liệu câu hỏi đúng
-    for q in questions:
-        # Đảm bảo answers là list
-        if isinstance(q["answers"], str):
-            try:
-                q["answers"] = json.loads(q["answers"])
-            except:
-                q["answers"] = [q["answers"]]
-        
-        # Đảm bảo correct là list
-        if isinstance(q["correct"], str):
-            try:
-                q["correct"] = json.loads(q["correct"])
-            except:
-                try:
-                    q["correct"] = [int(x.strip()) for x in q["correct"].split(",")]
-                except:
-                    q["correct"] = []
+    questions = survey.questions
     
-    # Lấy lịch sử bài làm của học viên này
-    user_submissions = get_user_submissions(email)
+    # Số lần làm và điểm cao nhất của học viên này (bộ đếm trong session)
+    attempts = get_session_attempts(email)
     
     # Quản lý trạng thái số lần làm và xác nhận hoàn thành
     MAX_ATTEMPTS = 3
-    submission_count = len(user_submissions)
+    submission_count = attempts["count"]
     if "attempt_index" not in st.session_state:
         # Lần tiếp theo theo DB, giới hạn tối đa 3
         st.session_state.attempt_index = min(MAX_ATTEMPTS, submission_count + 1)
@@ -64,8 +83,8 @@ def survey_form(email, full_name, class_name):
         st.write(f"**Số lần đã làm bài:** {submission_count}/{MAX_ATTEMPTS}")
         
         # Hiển thị điểm cao nhất đã đạt được
-        max_score = max([s["score"] for s in user_submissions])
-        max_possible = sum([q["score"] for q in questions])
+        max_score = attempts["best_score"] or 0
+        max_possible = survey.max_score
         
         st.write(f"**Điểm cao nhất đã đạt được:** {max_score}/{max_possible} ({(max_score/max_possible*100):.1f}%)")
     else:
@@ -73,7 +92,7 @@ def survey_form(email, full_name, class_name):
     
     # Hiển thị số lượng câu hỏi và điểm tối đa
     total_questions = len(questions)
-    max_score = sum([q["score"] for q in questions])
+    max_score = survey.max_score
     st.write(f"**Tổng số câu hỏi:** {total_questions}")
     st.write(f"**Điểm tối đa:** {max_score}")
     
@@ -107,68 +126,17 @@ def survey_form(email, full_name, class_name):
 
     # Nếu chưa nộp bài hoặc đang trong quá trình xác nhận tiếp tục/kết thúc
     if st.session_state.submission_result is None and not st.session_state.await_continue_confirm:
-        # Tạo form để lưu trữ câu trả lời
-        with st.form(key="survey_form"):
-            st.subheader("Câu hỏi")
-            
-            # Lưu trữ câu trả lời tạm thời
-            responses = {}
-            
-            for q in questions:
-                q_id = q["id"]
-                st.markdown(f"**Câu {q_id}: {q['question']}** *(Điểm: {q['score']})*")
-                
-                if q["type"] == "Checkbox":
-                    responses[str(q_id)] = st.multiselect(
-                        "Chọn đáp án", 
-                        options=q["answers"], 
-                        key=f"attempt_{st.session_state.attempt_index}_q_{q_id}"
-                    )
-                elif q["type"] == "Combobox":
-                    selected = st.selectbox(
-                        "Chọn 1 đáp án", 
-                        options=[""] + q["answers"], 
-                        key=f"attempt_{st.session_state.attempt_index}_q_{q_id}"
-                    )
-                    responses[str(q_id)] = [selected] if selected else []
-                elif q["type"] == "Essay":
-                    # Hiển thị mẫu câu trả lời nếu có
-                    if q.get("answer_template"):
-                        st.info(f"Gợi ý: {q.get('answer_template')}")
-                    
-                    # Sử dụng text_area để cho phép nhập text tự do
-                    essay_answer = st.text_area(
-                        "Nhập câu trả lời",
-                        height=150,
-                        key=f"attempt_{st.session_state.attempt_index}_q_{q_id}"
-                    )
-                    responses[str(q_id)] = [essay_answer] if essay_answer else []
-                
-                st.divider()
-            
-            # Nút gửi đáp án (trong form)
-            submit_button = st.form_submit_button(label=f"📨 Gửi đáp án (lần {st.session_state.attempt_index})", use_container_width=True)
-            
-            if submit_button:
-                # Kiểm tra lại số lần làm bài (để đảm bảo không vượt quá giới hạn)
-                latest_submissions = get_user_submissions(email)
-                if len(latest_submissions) >= MAX_ATTEMPTS:
-                    st.error("Bạn đã sử dụng hết số lần làm bài cho phép!")
-                    st.session_state.submission_result = None
-                else:
-                    # Lưu câu trả lời vào database với ID duy nhất
-                    result = save_submission(email, responses)
-                    
-                    if result:
-                        # Không hiển thị kết quả ngay; yêu cầu xác nhận tiếp tục/kết thúc
-                        st.session_state.submission_result = result
-                        st.session_state.max_score = max_score
-                        st.session_state.last_submission = result
-                        st.session_state.last_max_score = max_score
-                        st.session_state.await_continue_confirm = True
-                        st.rerun()
-                    else:
-                        st.error("❌ Có lỗi xảy ra khi gửi đáp án, vui lòng thử lại!")
+        state = get_survey_answers(email, st.session_state.attempt_index)
+        if state.pop("restored", False):
+            st.info("Đã khôi phục bài làm dang dở từ bản nháp đã lưu.")
+        
+        if SURVEY_PAGE_SIZE > 0 and len(survey.items) > SURVEY_PAGE_SIZE:
+            responses = paged_survey_form(email, survey, state, SURVEY_PAGE_SIZE)
+        else:
+            responses = single_survey_form(email, survey, state)
+        
+        if responses is not None:
+            submit_survey(email, responses, max_score, MAX_ATTEMPTS, state)
 
     # Sau khi nộp, yêu cầu xác nhận tiếp tục/kết thúc
     if st.session_state.await_continue_confirm and st.session_state.submission_result is not None:
@@ -192,38 +160,191 @@ def survey_form(email, full_name, class_name):
                 st.session_state.await_continue_confirm = False
                 st.rerun()
 
-def check_answer_correctness(student_answers, question):
-    """Kiểm tra đáp án có đúng không, hỗ trợ chọn nhiều đáp án và câu hỏi tự luận."""
-    # Nếu câu trả lời trống, không đúng
-    if not student_answers:
-        return False
+def render_survey_question(item, attempt_index, stored=None):
+    """Vẽ widget của một câu hỏi (models.SurveyItem), trả về câu trả lời dạng list
+    
+    stored: câu trả lời đã lưu của câu hỏi (chế độ chia trang) để hiển thị lại.
+    """
+    key = f"attempt_{attempt_index}_q_{item.question_key}"
+    stored = stored or []
+    st.markdown(item.prompt)
+    answer = []
+    
+    if item.type == "Checkbox":
+        answer = st.multiselect(
+            "Chọn đáp án", 
+            options=item.options, 
+            default=[a for a in stored if a in item.options],
+            key=key
+        )
+    elif item.type == "Combobox":
+        selected = st.selectbox(
+            "Chọn 1 đáp án", 
+            options=item.options, 
+            index=item.options.index(stored[0]) if stored and stored[0] in item.options else 0,
+            key=key
+        )
+        answer = [selected] if selected else []
+    elif item.type == "Essay":
+        # Hiển thị mẫu câu trả lời nếu có
+        if item.answer_template:
+            st.info(f"Gợi ý: {item.answer_template}")
+        
+        # Sử dụng text_area để cho phép nhập text tự do
+        essay_answer = st.text_area(
+            "Nhập câu trả lời",
+            value=stored[0] if stored else "",
+            height=150,
+            key=key
+        )
+        answer = [essay_answer] if essay_answer else []
+    
+    st.divider()
+    return answer
+
+def get_survey_answers(email, attempt_index):
+    """Câu trả lời đang làm của lượt hiện tại, giữ trong session
+    
+    Dict {"attempt", "page", "answers", "submit_token"}; answers chỉ giữ câu đã
+    trả lời. Lần đầu của mỗi lượt (vd. phiên mới sau khi trình duyệt mất kết
+    nối), khôi phục từ bản nháp đã lưu nếu bản nháp thuộc đúng lượt này.
+    submit_token giữ nguyên đến khi nộp thành công: gửi lại cùng lượt (lỗi mạng,
+    bấm nộp lần nữa) không tạo thêm bài nộp; "sent" đánh dấu mã đã được gửi đi.
+    """
+    state = st.session_state.get("survey_answers")
+    if state and state["email"] == email and state["attempt"] == attempt_index:
+        return state
+    
+    state = {"email": email, "attempt": attempt_index, "page": 0, "answers": {}, "submit_token": uuid.uuid4().hex}
+    draft = load_draft(email)
+    if draft and draft.get("attempt_index") == attempt_index and draft.get("responses"):
+        state.update(page=draft.get("page") or 0, answers=dict(draft["responses"]), restored=True)
+    st.session_state.survey_answers = state
+    return state
+
+def store_survey_answers(email, state, form_answers):
+    """Cập nhật câu trả lời trong session bằng giá trị form vừa gửi và lưu nháp (write-behind)"""
+    answers = state["answers"]
+    for q_id, answer in form_answers.items():
+        if answer:
+            answers[q_id] = answer
+        else:
+            answers.pop(q_id, None)
+    save_draft(email, state["attempt"], answers, state["page"])
+
+def single_survey_form(email, survey, state):
+    """Form một trang chứa mọi câu hỏi; trả về responses khi bấm gửi, ngược lại None"""
+    attempt_index = state["attempt"]
+    answers = state["answers"]
+    with st.form(key="survey_form"):
+        st.subheader("Câu hỏi")
+        
+        responses = {item.question_key: render_survey_question(item, attempt_index, answers.get(item.question_key))
+                     for item in survey.items}
+        
+        # Nút gửi đáp án (trong form)
+        submit_button = st.form_submit_button(label=f"📨 Gửi đáp án (lần {attempt_index})", use_container_width=True)
+        # Giá trị trong form chỉ về server khi bấm nút => lưu nháp theo yêu cầu
+        draft_button = st.form_submit_button(label="💾 Lưu nháp", use_container_width=True)
+    
+    if submit_button or draft_button:
+        # Khi gửi cũng lưu nháp: nếu lưu bài lỗi, câu trả lời vẫn còn
+        store_survey_answers(email, state, responses)
+    if draft_button:
+        st.success("Đã lưu nháp. Nếu mất kết nối, câu trả lời sẽ được khôi phục khi bạn quay lại.")
+    return responses if submit_button else None
+
+def paged_survey_form(email, survey, state, page_size):
+    """Form chia trang: mỗi lần rerun chỉ vẽ page_size câu hỏi của trang hiện tại
+    
+    Câu trả lời của các trang khác nằm trong session (get_survey_answers) và
+    được gộp lại khi bấm gửi ở trang cuối; mỗi lần chuyển trang cũng lưu nháp.
+    Trả về responses đủ mọi câu hỏi khi gửi, ngược lại None.
+    """
+    attempt_index = state["attempt"]
+    answers = state["answers"]
+    
+    page_count = -(-len(survey.items) // page_size)
+    # Danh mục có thể ngắn lại giữa chừng (câu hỏi bị xóa)
+    page = min(state["page"], page_count - 1)
+    last_page = page == page_count - 1
+    items = survey.items[page * page_size:(page + 1) * page_size]
+    
+    with st.form(key=f"survey_form_page_{page}"):
+        st.subheader(f"Câu hỏi (trang {page + 1}/{page_count})")
         
-    # Đối với câu hỏi tự luận (Essay), luôn đánh giá là đúng nếu có trả lời
-    if question["type"] == "Essay":
-        # Chỉ cần học viên nhập nội dung vào ô text là tính đúng
-        return len(student_answers) > 0 and student_answers[0].strip() != ""
+        page_answers = {item.question_key: render_survey_question(item, attempt_index, answers.get(item.question_key))
+                        for item in items}
         
-    # Đối với câu hỏi combobox (chỉ chọn một)
-    elif question["type"] == "Combobox":
-        # Nếu có một đáp án và đáp án đó ở vị trí nằm trong danh sách đáp án đúng
-        if len(student_answers) == 1:
-            answer_text = student_answers[0]
-            answer_index = question["answers"].index(answer_text) + 1 if answer_text in question["answers"] else -1
-            return answer_index in question["correct"]
-        return False
-    
-    # Đối với câu hỏi checkbox (nhiều lựa chọn)
-    elif question["type"] == "Checkbox":
-        # Tìm index (vị trí) của các đáp án học viên đã chọn
-        selected_indices = []
-        for ans in student_answers:
-            if ans in question["answers"]:
-                selected_indices.append(question["answers"].index(ans) + 1)
+        answered = sum(1 for item in survey.items if answers.get(item.question_key))
+        st.caption(f"Đã lưu câu trả lời {answered}/{len(survey.items)} câu (lưu khi chuyển trang)")
         
-        # So sánh với danh sách đáp án đúng
-        return set(selected_indices) == set(question["correct"])
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            previous_button = st.form_submit_button("◀ Trang trước", disabled=page == 0, use_container_width=True)
+        with col2:
+            next_button = st.form_submit_button("Trang sau ▶", disabled=last_page, use_container_width=True)
+        with col3:
+            submit_button = st.form_submit_button(label=f"📨 Gửi đáp án (lần {attempt_index})", disabled=not last_page, use_container_width=True)
+    
+    if not (previous_button or next_button or submit_button):
+        return None
+    
+    if submit_button:
+        store_survey_answers(email, state, page_answers)
+        return {item.question_key: answers.get(item.question_key, []) for item in survey.items}
+    
+    # Lưu câu trả lời của trang hiện tại rồi chuyển trang
+    state["page"] = page - 1 if previous_button else page + 1
+    store_survey_answers(email, state, page_answers)
+    st.rerun()
+
+def submit_survey(email, responses, max_score, max_attempts, state):
+    """Lưu bài làm (sau khi kiểm tra lại số lần làm bài) và chuyển sang bước xác nhận
     
-    return False
+    state: câu trả lời đang làm (get_survey_answers), mang submit_token của lượt.
+    """
+    submit_token = state["submit_token"]
+    result = None
+    if state.get("sent"):
+        # Lần gửi trước của lượt này không nhận được kết quả (lỗi mạng...) nhưng
+        # có thể đã được lưu: trả về bài đó, không tính là một lần làm bài mới
+        if submission_spool.is_enabled():
+            result = submission_spool.find_submission(email, submit_token)
+        else:
+            result = get_submission_by_token(email, submit_token)
+    
+    if result is None:
+        # Kiểm tra lại số lần làm bài (để đảm bảo không vượt quá giới hạn).
+        # Database là nơi quyết định: chỉ đếm, không tải lịch sử; đồng bộ
+        # lại bộ đếm trong session (vd. đã nộp từ tab khác)
+        attempts = get_session_attempts(email, refresh=True)
+        if attempts["count"] >= max_attempts:
+            st.error("Bạn đã sử dụng hết số lần làm bài cho phép!")
+            st.session_state.submission_result = None
+            return
+        
+        # Lưu câu trả lời vào database với ID duy nhất (hoặc vào spool, ghi vào database ở luồng nền)
+        state["sent"] = True
+        if submission_spool.is_enabled():
+            result = submission_spool.enqueue_submission(email, responses, submit_token)
+        else:
+            result = save_submission(email, responses, submit_token)
+    
+    if result:
+        record_session_attempt(email, result["score"])
+        # Bài đã nộp: bỏ câu trả lời đang làm và bản nháp
+        st.session_state.pop("survey_answers", None)
+        discard_draft(email)
+        # Không hiển thị kết quả ngay; yêu cầu xác nhận tiếp tục/kết thúc
+        st.session_state.submission_result = result
+        st.session_state.max_score = max_score
+        st.session_state.last_submission = result
+        st.session_state.last_max_score = max_score
+        st.session_state.await_continue_confirm = True
+        st.rerun()
+    else:
+        st.error("❌ Có lỗi xảy ra khi gửi đáp án, vui lòng thử lại!")
 
 def display_submission_details(submission, questions, max_score):
     """Hiển thị chi tiết về bài nộp, bao gồm thông tin điểm và câu trả lời."""
@@ -285,8 +406,9 @@ def display_submission_details(submission, questions, max_score):
             # Lấy câu trả lời của học viên
             student_answers = submission["responses"].get(q_id, [])
             
-            # Kiểm tra tính đúng đắn
-            is_correct = check_answer_correctness(student_answers, q)
+            # Kết quả đã chấm lúc nộp bài (chấm lại nếu câu hỏi đã được sửa)
+            result = question_result(submission, q, student_answers)
+            is_correct = result.correct
             
             # Hiển thị với nền màu khác nhau tùy theo đúng/sai
             background_color = "#e6f7f2" if is_correct else "#ffebee"
@@ -309,7 +431,7 @@ def display_submission_details(submission, questions, max_score):
                     
                     # Đối với câu hỏi tự luận, luôn tính là đúng nếu có trả lời
                     if is_correct:
-                        st.success(f"✅ Đã trả lời (+{q['score']} điểm)")
+                        st.success(f"✅ Đã trả lời (+{result.points} điểm)")
                     else:
                         st.error("❌ Không trả lời (0 điểm)")
                 else:
@@ -328,7 +450,7 @@ def display_submission_details(submission, questions, max_score):
                     
                     # Hiển thị kết quả
                     if is_correct:
-                        st.success(f"✅ Đúng (+{q['score']} điểm)")
+                        st.success(f"✅ Đúng (+{result.points} điểm)")
                     else:
                         st.error("❌ Sai (0 điểm)")
                         st.write("Đáp án đúng:")
@@ -339,9 +461,7 @@ def display_submission_details(submission, questions, max_score):
 
 def check_correct_for_report(submission, question):
     """Kiểm tra xem câu trả lời có đúng không để hiển thị trong báo cáo."""
-    q_id = str(question["id"])
-    student_answers = submission["responses"].get(q_id, [])
-    return check_answer_correctness(student_answers, question)
+    return question_result(submission, question).correct
 
 def display_submission_history(submissions, questions, max_score):
     """Hiển thị lịch sử các lần nộp bài."""
@@ -418,8 +538,9 @@ def display_submission_history(submissions, questions, max_score):
                 # Lấy câu trả lời của học viên
                 student_answers = s["responses"].get(q_id, [])
                 
-                # Kiểm tra tính đúng đắn
-                is_correct = check_answer_correctness(student_answers, q)
+                # Kết quả đã chấm lúc nộp bài (chấm lại nếu câu hỏi đã được sửa)
+                result = question_result(s, q, student_answers)
+                is_correct = result.correct
                 
                 # Hiển thị đáp án người dùng đã chọn
                 st.write(f"**Câu {q['id']}: {q['question']}**")
@@ -433,7 +554,7 @@ def display_submission_history(submissions, questions, max_score):
                     
                     # Đối với câu hỏi tự luận, luôn tính là đúng nếu có trả lời
                     if is_correct:
-                        st.success(f"✅ Đã trả lời (+{q['score']} điểm)")
+                        st.success(f"✅ Đã trả lời (+{result.points} điểm)")
                     else:
                         st.error("❌ Không trả lời (0 điểm)")
                 else:
@@ -447,7 +568,7 @@ def display_submission_history(submissions, questions, max_score):
                     
                     # Hiển thị kết quả
                     if is_correct:
-                        st.success(f"✅ Đúng (+{q['score']} điểm)")
+                        st.success(f"✅ Đúng (+{result.points} điểm)")
                     else:
                         st.error("❌ Sai (0 điểm)")
                         expected_indices = q["correct"]
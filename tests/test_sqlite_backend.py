@@ -0,0 +1,113 @@
+"""Kiểm thử backend SQLite: ghi bài nộp đồng thời từ nhiều luồng
+
+id bài nộp do database sinh (sql/001_submissions_identity.sql, AUTOINCREMENT
+trên SQLite): nhiều phiên nộp bài cùng lúc không được trùng id hay mất bài.
+
+Chạy: python -m pytest tests (hoặc python -m unittest discover tests)
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database_helper  # noqa: E402
+from sqlite_backend import SqliteClient  # noqa: E402
+
+THREADS = 8
+PER_THREAD = 25
+
+
+def run_threads(target):
+    """Chạy target(i) trên THREADS luồng cùng bắt đầu; ném lại lỗi đầu tiên nếu có"""
+    barrier = threading.Barrier(THREADS)
+    errors = []
+
+    def worker(i):
+        try:
+            barrier.wait()
+            target(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+class ConcurrentInsertTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "audit_app.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_client_insert_unique_ids(self):
+        client = SqliteClient(self.path)
+        ids = []
+        lock = threading.Lock()
+
+        def insert(i):
+            for n in range(PER_THREAD):
+                row = {"user_email": f"hv{i}@example.com", "responses": {"1": [str(n)]}, "score": n}
+                data = client.table("submissions").insert(row).execute().data
+                with lock:
+                    ids.extend(r["id"] for r in data)
+
+        try:
+            run_threads(insert)
+            count = client.table("submissions").select("id", count="exact").execute().count
+        finally:
+            client.close()
+        self.assertEqual(len(ids), THREADS * PER_THREAD)
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(count, len(ids))
+
+    def test_save_submission_unique_ids(self):
+        saved_env = {key: os.environ.get(key) for key in ("STORAGE_BACKEND", "SQLITE_PATH")}
+        os.environ.update(STORAGE_BACKEND="sqlite", SQLITE_PATH=self.path)
+        database_helper.reset_supabase_client()
+        database_helper.invalidate_question_cache()
+        try:
+            client = database_helper.get_supabase_client()
+            client.table("questions").insert({
+                "id": 1, "question": "Câu hỏi 1", "type": "Combobox",
+                "answers": ["A", "B"], "correct": [1], "score": 1,
+            }).execute()
+            database_helper.invalidate_question_cache()
+            results = []
+            lock = threading.Lock()
+
+            def submit(i):
+                for n in range(PER_THREAD):
+                    result = database_helper.save_submission(f"hv{i}@example.com", {"1": ["A" if n % 2 else "B"]})
+                    with lock:
+                        results.append(result)
+
+            run_threads(submit)
+            count = client.table("submissions").select("id", count="exact").execute().count
+        finally:
+            database_helper.reset_supabase_client()
+            database_helper.invalidate_question_cache()
+            for key, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+        self.assertNotIn(None, results)
+        ids = [result["id"] for result in results]
+        self.assertEqual(len(set(ids)), THREADS * PER_THREAD)
+        self.assertEqual(count, len(ids))
+
+
+if __name__ == "__main__":
+    unittest.main()